@@ -49,7 +49,7 @@ printf 'Informe de comparaciones\n' > "$INFO_FILE"
 echo "=== Iniciando pipeline completo ==="
 
 echo "[1/8] Scraper y cargar datos en MongoDB..."
-$PYTHON -m src.scraper_mongo --which "$WHICH" --save --name "$JUEGO" || true
+$PYTHON -m src.scraper_mongo --which "$WHICH" --save --name "$JUEGO" --budget 120 || true
 
 echo "[2/8] Ejecutando ETL..."
 $PYTHON -m src.etl --which "$WHICH" --prefix "$JUEGO" --to-mongo
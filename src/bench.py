@@ -0,0 +1,368 @@
+# src/bench.py
+"""
+Benchmarks del pipeline (sin red ni Mongo).
+
+Uso:
+  python -m src.bench parser --rows 100000     # parser por fila vs vectorizado sobre CSV sintético
+  python -m src.bench fechas --n 1000000       # normalización de fechas: escalar vs memo LRU vs vectorizada
+  python -m src.bench docs --rows 200000       # documentos de Mongo: fila a fila vs en bloque (src/ingest.py)
+  python -m src.bench repo --rows 200000 --backend memory file
+                                               # carga / recarga sin cambios / lecturas por backend (src/repository.py);
+                                               # mongo solo si se pide y hay servidor
+  python -m src.bench tables --rows 20000      # html_tables: lxml vs html.parser (misma salida y filas/s);
+                                               # sale con código 1 si difieren
+  python -m src.bench scrape --fixtures data/fixtures/bonoloto --enlarge 20
+                                               # filas/s de cada ruta de parseo sobre respuestas grabadas
+                                               # (--record del scraper) y ampliadas; sin --fixtures usa hojas sintéticas
+"""
+
+import io
+import os
+import re
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+from typing import List
+
+try:
+    from src import scraper_mongo, http_cache, table_parser, fechas, fetcher, http_fixtures, source_planner, ingest
+    from src import repository, html_tables
+    from src.draws import DrawBatch
+except Exception:
+    import ingest
+    import repository
+    import html_tables
+    from draws import DrawBatch
+    import scraper_mongo
+    import http_cache
+    import table_parser
+    import fechas
+    import fetcher
+    import http_fixtures
+    import source_planner
+
+
+# ------------------------- datos sintéticos --------------------------------
+def synthetic_csv(n_rows: int, layout: str = "combinada", seed: int = 42) -> str:
+    """
+    Hoja sintética con n_rows sorteos (más reciente primero).
+      combinada: FECHA, "n1 - n2 - ... - n6", COMP, REINT
+      columnas : FECHA, N1..N6, COMP, REINT
+    """
+    rnd = random.Random(seed)
+    start = date(2025, 1, 1)
+    if layout == "columnas":
+        lines = ["FECHA,N1,N2,N3,N4,N5,N6,COMP,REINT"]
+    else:
+        lines = ["FECHA,COMBINACION GANADORA,COMP,REINT"]
+    for i in range(n_rows):
+        d = start - timedelta(days=i)
+        nums = sorted(rnd.sample(range(1, 50), 7))
+        comp = nums.pop(rnd.randrange(7))
+        reint = rnd.randrange(10)
+        fecha = d.strftime("%d/%m/%Y")
+        if layout == "columnas":
+            lines.append(",".join([fecha] + [str(n) for n in nums] + [str(comp), str(reint)]))
+        else:
+            lines.append(f'{fecha},"{" - ".join(str(n) for n in nums)}",{comp},{reint}')
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_html(n_rows: int, seed: int = 42) -> str:
+    """Tabla HTML equivalente a la hoja publicada (pubhtml) con n_rows sorteos."""
+    lines = synthetic_csv(n_rows, "columnas", seed).strip().split("\n")
+    head = "".join(f"<th>{c}</th>" for c in lines[0].split(","))
+    body = "".join("<tr>" + "".join(f"<td>{c}</td>" for c in ln.split(",")) + "</tr>" for ln in lines[1:])
+    return f"<html><body><table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table></body></html>"
+
+
+def enlarge_csv(text: str, k: int) -> str:
+    """Repite k veces las filas de datos (la cabecera se mantiene)."""
+    lines = text.rstrip("\n").split("\n")
+    return "\n".join([lines[0]] + lines[1:] * k) + "\n"
+
+
+def enlarge_html(text: str, k: int) -> str:
+    """Repite k veces el contenido de cada <tbody>."""
+    return re.sub(r"(<tbody[^>]*>)(.*?)(</tbody>)",
+                  lambda m: m.group(1) + m.group(2) * k + m.group(3), text, flags=re.S | re.I)
+
+
+def synthetic_page(n_rows: int, seed: int = 42) -> str:
+    """
+    Página con varias tablas: menú sin sorteos (más de PROBE_ROWS filas), la de sorteos
+    con una tabla anidada en una celda y otra de sorteos sin </table> al final.
+    """
+    menu = "".join(f"<tr><td>enlace {i}</td></tr>" for i in range(html_tables.PROBE_ROWS + 5))
+    draws = synthetic_html(n_rows, seed)
+    draws = draws.replace("</tbody>", "<tr><td>nota<table><tr><td>1 2</td></tr></table></td></tr></tbody>", 1)
+    body = draws[draws.index("<table>"):draws.rindex("</table>") + len("</table>")]
+    tail = synthetic_html(5, seed + 1)
+    tail = tail[tail.index("<table>"):tail.rindex("</table>")]
+    return f"<html><body><table>{menu}</table>{body}<p>fin</p>{tail}</body></html>"
+
+
+def synthetic_fechas(n: int, seed: int = 42) -> List[str]:
+    """Mezcla realista: dd/mm/yyyy (mayoría), ISO, castellano y seriales de Excel."""
+    rnd = random.Random(seed)
+    start = date(1988, 1, 1)
+    meses = list(fechas.MESES)[:12]
+    out = []
+    for _ in range(n):
+        d = start + timedelta(days=rnd.randrange(365 * 38))
+        p = rnd.random()
+        if p < 0.7:
+            out.append(d.strftime("%d/%m/%Y"))
+        elif p < 0.8:
+            out.append(d.isoformat())
+        elif p < 0.9:
+            mes = meses[d.month - 1] if d.month != 9 else "septiembre"
+            out.append(f"lunes, {d.day} de {mes} de {d.year}")
+        else:
+            out.append(str((d - date(1899, 12, 30)).days))
+    return out
+
+
+def _timeit(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    res = fn(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+def _report(label: str, n_rows: int, secs: float):
+    rate = n_rows / secs if secs > 0 else float("inf")
+    print(f"  {label:<40} {secs:8.3f} s   {rate:12,.0f} filas/s")
+
+
+# ----------------------------- parser --------------------------------------
+def _isolate_state():
+    """Sin caché de parseo y con layouts/estado del planner en temporales (no tocar data/)."""
+    http_cache.set_enabled(False)
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    table_parser.LAYOUTS_FILE = os.path.join(tmp, "layouts.json")
+    table_parser._layouts = {}
+    source_planner.STATE_FILE = os.path.join(tmp, "scraper_state.json")
+
+
+def bench_parser(rows: int, layouts: List[str]):
+    _isolate_state()
+    for layout in layouts:
+        text = synthetic_csv(rows, layout)
+        print(f"[parser] layout={layout} filas={rows:,} bytes={len(text):,}")
+        ref, t_row = _timeit(scraper_mongo._parse_csv_text_rowwise, text, "bench")
+        _report("por fila (iterrows)", rows, t_row)
+        source = f"bench://{layout}"
+        res, t_vec = _timeit(scraper_mongo._parse_csv_text_nocache, text, "bench", source=source)
+        _report("vectorizado (layout nuevo)", rows, t_vec)
+        res2, t_vec2 = _timeit(scraper_mongo._parse_csv_text_nocache, text, "bench", source=source)
+        _report("vectorizado (layout cacheado)", rows, t_vec2)
+        same = res == ref and res2 == ref
+        print(f"  salida idéntica: {same}   speedup: x{t_row / max(t_vec2, 1e-9):.1f}")
+
+
+# ------------------------ scrape (fixtures grabadas) -----------------------
+_CSV_PATHS = [
+    ("csv por fila", scraper_mongo._parse_csv_text_rowwise),
+    ("csv vectorizado", scraper_mongo._parse_csv_text_nocache),
+]
+_HTML_PATHS = [
+    ("html pd.read_html", scraper_mongo._parse_html_pandas_nocache),
+    ("html BeautifulSoup", scraper_mongo._parse_html_soup_nocache),
+    ("html una pasada", scraper_mongo._parse_html_fast_nocache),
+]
+
+
+def _bench_body(label: str, text: str, paths, enlarge: int):
+    for k in ([1, enlarge] if enlarge > 1 else [1]):
+        body = text if k == 1 else (enlarge_csv(text, k) if paths is _CSV_PATHS else enlarge_html(text, k))
+        print(f"[scrape] {label} x{k}  bytes={len(body):,}")
+        for name, fn in paths:
+            res, secs = _timeit(fn, body, "bench")
+            _report(f"{name} ({len(res):,} filas)", len(res), secs)
+
+
+def bench_scrape(fixtures_dir: str = None, enlarge: int = 10, rows: int = 5000):
+    _isolate_state()
+    if not fixtures_dir:
+        _bench_body("csv sintético", synthetic_csv(rows, "columnas"), _CSV_PATHS, enlarge)
+        _bench_body("html sintético", synthetic_html(rows), _HTML_PATHS, enlarge)
+        return
+
+    index = http_fixtures.load_index(fixtures_dir)
+    if not index:
+        print(f"No hay fixtures en {fixtures_dir} (graba con: python -m src.scraper_mongo --record {fixtures_dir})")
+        return
+    main_urls = []
+    for url, info in index.items():
+        if info.get("status_code") != 200:
+            continue
+        resp = http_fixtures.replay(fixtures_dir, url)
+        short = url if len(url) <= 70 else url[:67] + "..."
+        if fetcher.is_csv_response(resp):
+            _bench_body(short, resp.text, _CSV_PATHS, enlarge)
+        elif "<table" in resp.text.lower():
+            main_urls.append(url)
+            _bench_body(short, resp.text, _HTML_PATHS, enlarge)
+
+    # extremo a extremo: el scraper completo sirviendo las respuestas grabadas
+    fetcher.set_mode(replay_dir=fixtures_dir)
+    try:
+        for url in main_urls:
+            report = []
+            res, secs = _timeit(scraper_mongo.obtener_todos_resultados, url, juego="bench", report=report)
+            print(f"[scrape] extremo a extremo (replay) {url[:60]}")
+            _report(f"obtener_todos_resultados ({len(res):,} filas)", len(res), secs)
+    finally:
+        fetcher.set_mode()
+
+
+# ------------------------ html_tables (backends) ---------------------------
+def bench_tables(rows: int) -> bool:
+    """Misma salida con lxml y html.parser sobre una página sintética con varias tablas."""
+    text = synthetic_page(rows)
+    print(f"[tables] filas={rows:,} bytes={len(text):,} lxml={'sí' if html_tables.HAS_LXML else 'no'}")
+    for backend in html_tables.BACKENDS:
+        if backend == "lxml" and not html_tables.HAS_LXML:
+            continue
+        res, secs = _timeit(lambda: list(html_tables.iter_tables(text, backend)))
+        n = sum(len(r) for _, r in res)
+        _report(f"{backend} ({len(res)} tablas, {n:,} filas)", n, secs)
+    check = html_tables.check_backends(text)
+    print(f"  comparación lxml / html.parser: {check}")
+    return check["ok"] is not False
+
+
+# ----------------------------- fechas --------------------------------------
+def bench_fechas(n: int):
+    import pandas as pd
+    valores = synthetic_fechas(n)
+    print(f"[fechas] n={n:,} valores únicos={len(set(valores)):,}")
+    sin_memo = fechas._normalizar_str.__wrapped__
+    ref, t_scalar = _timeit(lambda: [sin_memo(v) for v in valores])
+    _report("escalar sin memo", n, t_scalar)
+    fechas._normalizar_str.cache_clear()
+    memo, t_memo = _timeit(lambda: [fechas.normalizar_fecha(v) for v in valores])
+    _report("escalar + memo LRU", n, t_memo)
+    print(f"  {fechas.cache_info()}")
+    serie = pd.Series(valores)
+    fmt = fechas.detectar_formato(serie)
+    vec, t_vec = _timeit(fechas.normalizar_serie, serie, fmt)
+    _report(f"vectorizada (fmt={fmt})", n, t_vec)
+    same = memo == ref and vec.tolist() == ref
+    print(f"  salida idéntica: {same}   speedup vectorizada: x{t_scalar / max(t_vec, 1e-9):.1f}")
+
+
+# ------------------------- documentos de Mongo -----------------------------
+def synthetic_draws(n: int, seed: int = 42) -> List[dict]:
+    rnd = random.Random(seed)
+    d0 = date(1985, 1, 1)
+    out = []
+    for i in range(n):
+        out.append({
+            "juego": "bench",
+            "fecha": (d0 + timedelta(days=i)).isoformat(),
+            "numeros": sorted(rnd.sample(range(1, 50), 6)),
+            "complementario": rnd.randint(1, 49) if i % 10 else None,
+            "reintegro": rnd.randint(0, 9),
+            "fuente": "bench://sintetico",
+        })
+    return out
+
+
+def bench_docs(rows: int):
+    import pandas as pd
+    draws_l = synthetic_draws(rows)
+    print(f"[docs] filas={rows:,}")
+    fechas._dayfirst_str.cache_clear()
+    ref, t_row = _timeit(lambda: [ingest.doc_from_row(r) for r in draws_l])
+    _report("fila a fila (doc_from_row)", rows, t_row)
+    fechas._dayfirst_str.cache_clear()
+    from_dicts, t_dicts = _timeit(ingest.docs_from_dicts, draws_l)
+    _report("en bloque desde dicts", rows, t_dicts)
+    batch = DrawBatch.from_dicts(draws_l)
+    from_batch, t_batch = _timeit(ingest.docs_from_batch, batch)
+    _report("en bloque desde DrawBatch", rows, t_batch)
+
+    # processed CSV (files_to_mongo): antes to_dicts() + fila a fila, ahora desde las columnas
+    frame = pd.read_csv(io.StringIO(batch.to_frame().to_csv(index=False)), dtype=str)
+    fechas._dayfirst_str.cache_clear()
+    csv_ref, t_csv_row = _timeit(
+        lambda: [ingest.doc_from_row(r) for r in DrawBatch.from_frame(frame, "bench").to_dicts()])
+    _report("CSV to_dicts + fila a fila (antes)", rows, t_csv_row)
+    fechas._dayfirst_str.cache_clear()
+    csv_vec, t_csv_vec = _timeit(ingest.docs_from_frame, frame, "bench")
+    _report("CSV en bloque (from_frame + docs)", rows, t_csv_vec)
+
+    same = from_dicts == ref and from_batch == ref
+    same = same and csv_vec == csv_ref
+    print(f"  salida idéntica: {same}   "
+          f"speedup dicts: x{t_row / max(t_dicts, 1e-9):.1f}   DrawBatch: x{t_row / max(t_batch, 1e-9):.1f}   "
+          f"CSV: x{t_csv_row / max(t_csv_vec, 1e-9):.1f}")
+
+
+# ----------------------------- repositorio ---------------------------------
+def bench_repo(rows: int, backends: List[str]):
+    draws_l = synthetic_draws(rows)
+    batch = DrawBatch.from_dicts(draws_l)
+    fechas_ord = sorted(batch.fechas_iso())
+    desde, hasta = fechas_ord[len(fechas_ord) // 4], fechas_ord[len(fechas_ord) // 2]
+    print(f"[repo] filas={rows:,}")
+    for name in backends:
+        if name == "file":
+            repo = repository.FileRepository(tempfile.mkdtemp(prefix="bench_repo_"))
+        elif name == "memory":
+            repo = repository.MemoryRepository()
+        else:
+            repo = repository.get_repository(name)
+        prefix = "bench_repo"
+        print(f" backend {name}:")
+        res, secs = _timeit(repo.upsert, prefix, batch)
+        _report("carga inicial (upsert)", rows, secs)
+        res2, secs = _timeit(repo.upsert, prefix, draws_l)
+        _report("recarga sin cambios (dicts)", rows, secs)
+        todo, secs = _timeit(repo.read, prefix)
+        _report("lectura completa", len(todo), secs)
+        rango, secs = _timeit(repo.between, prefix, desde, hasta)
+        _report(f"rango {desde}..{hasta}", len(rango), secs)
+        ultimos, secs = _timeit(repo.last, prefix, 100)
+        _report("últimos 100", len(ultimos), secs)
+        print(f"  insertados={res.get('upserted_count')}  sin cambios en la recarga={res2.get('unchanged')}  "
+              f"leídos={len(todo):,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks del pipeline de loterías")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_parser = sub.add_parser("parser", help="parser por fila vs vectorizado (CSV sintético)")
+    p_parser.add_argument("--rows", type=int, default=100000)
+    p_parser.add_argument("--layout", choices=["combinada", "columnas", "todas"], default="todas")
+    p_fechas = sub.add_parser("fechas", help="normalización de fechas (escalar / memo / vectorizada)")
+    p_fechas.add_argument("--n", type=int, default=1000000)
+    p_docs = sub.add_parser("docs", help="documentos de Mongo: fila a fila vs en bloque")
+    p_docs.add_argument("--rows", type=int, default=200000)
+    p_repo = sub.add_parser("repo", help="upsert y lecturas por backend del repositorio de sorteos")
+    p_repo.add_argument("--rows", type=int, default=200000)
+    p_repo.add_argument("--backend", nargs="+", choices=sorted(repository.BACKENDS), default=["memory", "file"])
+    p_tables = sub.add_parser("tables", help="html_tables: lxml vs html.parser sobre una página sintética")
+    p_tables.add_argument("--rows", type=int, default=20000)
+    p_scrape = sub.add_parser("scrape", help="filas/s por ruta de parseo sobre fixtures grabadas o sintéticas")
+    p_scrape.add_argument("--fixtures", default=None, help="directorio grabado con --record")
+    p_scrape.add_argument("--enlarge", type=int, default=10, help="factor de ampliación sintética de cada hoja")
+    p_scrape.add_argument("--rows", type=int, default=5000, help="filas de las hojas sintéticas (sin --fixtures)")
+    args = parser.parse_args()
+
+    if args.cmd == "parser":
+        bench_parser(args.rows, ["combinada", "columnas"] if args.layout == "todas" else [args.layout])
+    elif args.cmd == "fechas":
+        bench_fechas(args.n)
+    elif args.cmd == "docs":
+        bench_docs(args.rows)
+    elif args.cmd == "repo":
+        bench_repo(args.rows, args.backend)
+    elif args.cmd == "tables":
+        if not bench_tables(args.rows):
+            raise SystemExit(1)
+    elif args.cmd == "scrape":
+        bench_scrape(args.fixtures, args.enlarge, args.rows)
@@ -0,0 +1,256 @@
+# src/bulk_writer.py
+"""
+Escritor por lotes para Mongo, común a los tres cargadores (scraper_mongo.upsert_to_mongo,
+etl.files_to_mongo y db_2.insertar_historico).
+- Parte la entrada en lotes de `batch_size` y escribe hasta `workers` lotes a la vez
+  (unordered; con ordered=True un solo hilo y se para en el primer error).
+- Reintenta cada lote ante errores transitorios (red, failover, write concern) con
+  backoff exponencial + jitter.
+- Con `checkpoint` (una clave estable de la carga) guarda en data/bulk_checkpoints.json
+  cuántos elementos del principio están ya confirmados; si la carga se corta, la
+  siguiente ejecución con la misma clave empieza después del último lote confirmado.
+  Claves "familia@huella" (p.ej. files_to_mongo:primitiva@<fichero:mtime:tamaño>): al
+  guardar una se borran las demás de la misma familia (huellas de fuentes anteriores).
+- El resumen incluye elapsed_s y ops_s.
+- Antes de escribir se asegura que la colección tiene sus índices (src/mongo_queries.py).
+Variables de entorno:
+    BULK_BATCH_SIZE (default: 500)
+    BULK_WORKERS    (default: 4)
+    BULK_RETRIES    (default: 3)
+    BULK_CHECKPOINT_FILE (default: data/bulk_checkpoints.json)
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List
+
+from pymongo.errors import (AutoReconnect, BulkWriteError, ConnectionFailure, ExecutionTimeout,
+                            PyMongoError, WTimeoutError)
+
+try:
+    from src import mongo_upsert, mongo_queries
+except Exception:
+    import mongo_upsert
+    import mongo_queries
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 500))
+WORKERS = int(os.environ.get("BULK_WORKERS", 4))
+RETRIES = int(os.environ.get("BULK_RETRIES", 3))
+BACKOFF_S = 0.5
+CHECKPOINT_FILE = os.environ.get("BULK_CHECKPOINT_FILE", os.path.join(BASE, "data", "bulk_checkpoints.json"))
+
+# códigos de error de servidor que se pueden reintentar (failover, interrupciones, timeouts)
+_RETRYABLE_CODES = {6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+_SUM_KEYS = ("n_docs", "n_ops", "unchanged", "matched_count", "modified_count", "upserted_count")
+_LIST_KEYS = ("upserted_ids",)
+
+_ckpt_lock = threading.Lock()
+
+
+# ------------------------------ checkpoint ---------------------------------
+def _load_checkpoints() -> Dict[str, Any]:
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_checkpoints(data: Dict[str, Any]):
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    tmp = f"{CHECKPOINT_FILE}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def get_checkpoint(key: str) -> int:
+    """Elementos del principio de la carga `key` ya confirmados (0 si no hay checkpoint)."""
+    if not key:
+        return 0
+    return int(_load_checkpoints().get(key, {}).get("acked_items", 0))
+
+
+def _family(key: str) -> str:
+    return key.split("@", 1)[0]
+
+
+def set_checkpoint(key: str, acked_items: int):
+    family = _family(key)
+    with _ckpt_lock:
+        data = _load_checkpoints()
+        # una sola huella viva por familia (también las claves antiguas "familia:huella")
+        for k in [k for k in data if k != key and (_family(k) == family or k.startswith(family + ":"))]:
+            del data[k]
+        data[key] = {"acked_items": acked_items, "updated_at": datetime.now().isoformat(timespec="seconds")}
+        _save_checkpoints(data)
+
+
+def clear_checkpoint(key: str):
+    with _ckpt_lock:
+        data = _load_checkpoints()
+        if data.pop(key, None) is not None:
+            _save_checkpoints(data)
+
+
+# ------------------------------- errores -----------------------------------
+def is_transient(exc: Exception) -> bool:
+    if isinstance(exc, (AutoReconnect, ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return True
+    if isinstance(exc, PyMongoError) and exc.has_error_label("RetryableWriteError"):
+        return True
+    if isinstance(exc, BulkWriteError):
+        details = exc.details or {}
+        errors = details.get("writeErrors") or []
+        if details.get("writeConcernErrors") and not errors:
+            return True
+        return bool(errors) and all(e.get("code") in _RETRYABLE_CODES for e in errors)
+    return False
+
+
+def _error_info(exc: Exception):
+    return exc.details if isinstance(exc, BulkWriteError) else str(exc)
+
+
+def _with_retries(fn: Callable[[List[Any]], Dict[str, Any]], batch: List[Any], retries: int) -> Dict[str, Any]:
+    for attempt in range(retries + 1):
+        try:
+            return fn(batch)
+        except PyMongoError as e:
+            if attempt >= retries or not is_transient(e):
+                raise
+            pause = BACKOFF_S * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"[bulk] error transitorio ({type(e).__name__}); reintento {attempt + 1}/{retries} en {pause:.1f}s")
+            time.sleep(pause)
+
+
+def _batches(items: Iterable[Any], size: int):
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ------------------------------- escritor ----------------------------------
+def run(items: Iterable[Any], write_batch: Callable[[List[Any]], Dict[str, Any]],
+        batch_size: int = None, workers: int = None, retries: int = None,
+        ordered: bool = False, checkpoint: str = None, label: str = "bulk") -> Dict[str, Any]:
+    """
+    Escribe `items` por lotes con `write_batch(lote) -> resumen` (claves como las de
+    mongo_upsert.write_changed; si no trae n_ops se cuenta el tamaño del lote).
+    Devuelve el resumen agregado con n_batches, failed_batches, errors, elapsed_s y ops_s.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    workers = 1 if ordered else (workers or WORKERS)
+    retries = RETRIES if retries is None else retries
+    skip = get_checkpoint(checkpoint)
+    if skip:
+        print(f"[{label}] reanudando tras {skip} elementos ya confirmados (checkpoint '{checkpoint}')")
+        items = islice(items, skip, None)
+
+    summary: Dict[str, Any] = {"ok": True, "n_batches": 0, "failed_batches": 0, "resumed_from": skip}
+    for k in _SUM_KEYS:
+        summary[k] = 0
+    for k in _LIST_KEYS:
+        summary[k] = []
+    errors = []
+    # marca de agua del checkpoint: lotes confirmados contiguos desde el principio
+    sizes: Dict[int, int] = {}
+    acked = set()
+    next_unacked = 0
+    acked_items = skip
+
+    def _ack(idx: int):
+        nonlocal next_unacked, acked_items
+        acked.add(idx)
+        advanced = False
+        while next_unacked in acked:
+            acked.discard(next_unacked)
+            acked_items += sizes.pop(next_unacked)
+            next_unacked += 1
+            advanced = True
+        if advanced and checkpoint:
+            set_checkpoint(checkpoint, acked_items)
+
+    def _done(fut, idx: int, n: int):
+        try:
+            part = fut.result()
+        except PyMongoError as e:
+            summary["failed_batches"] += 1
+            errors.append({"batch": idx, "error": _error_info(e)})
+            print(f"[{label}] lote {idx} falló: {e}")
+            return False
+        if "n_ops" not in part:
+            part = {**part, "n_docs": n, "n_ops": n}
+        for k in _SUM_KEYS:
+            summary[k] += part.get(k) or 0
+        for k in _LIST_KEYS:
+            summary[k].extend(part.get(k) or ())
+        _ack(idx)
+        return True
+
+    t0 = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    max_pending = 1 if ordered else 2 * workers
+    stop = False  # ordered: se para en el primer lote fallido
+    try:
+        for idx, batch in enumerate(_batches(items, batch_size)):
+            sizes[idx] = len(batch)
+            summary["n_batches"] += 1
+            pending.append((pool.submit(_with_retries, write_batch, batch, retries), idx, len(batch)))
+            # como mucho 2*workers lotes en memoria (ordered: uno detrás de otro)
+            while len(pending) >= max_pending and not stop:
+                wait([f for f, _, _ in pending], return_when=FIRST_COMPLETED)
+                for entry in [e for e in pending if e[0].done()]:
+                    pending.remove(entry)
+                    stop |= not _done(*entry) and ordered
+            if stop:
+                break
+        while pending and not stop:
+            stop |= not _done(*pending.popleft()) and ordered
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - t0
+    summary["elapsed_s"] = round(elapsed, 3)
+    summary["ops_s"] = round(summary["n_ops"] / elapsed, 1) if elapsed > 0 else None
+    if errors:
+        summary["ok"] = False
+        summary["errors"] = errors
+    elif checkpoint:
+        clear_checkpoint(checkpoint)
+    print(f"[{label}] {summary['n_ops']} escrituras en {summary['n_batches']} lotes, "
+          f"{elapsed:.2f}s ({summary['ops_s'] or 0:,.0f} ops/s)"
+          + (f", {summary['failed_batches']} lotes fallidos" if errors else ""))
+    return summary
+
+
+def write_docs(coll, docs: Iterable[Dict[str, Any]], ordered: bool = False, **kwargs) -> Dict[str, Any]:
+    """Documentos de sorteo con detección de cambios (mongo_upsert.write_changed) por lote."""
+    mongo_queries.ensure_indexes(coll)
+    mongo_upsert.backfill_first_seen(coll)
+    return run(docs, lambda batch: mongo_upsert.write_changed(coll, batch, ordered=ordered),
+               ordered=ordered, **kwargs)
+
+
+def write_ops(coll, ops: Iterable[Any], ordered: bool = False, **kwargs) -> Dict[str, Any]:
+    """Operaciones ya construidas (UpdateOne/ReplaceOne...) por lote."""
+    mongo_queries.ensure_indexes(coll)
+    def _write(batch):
+        res = coll.bulk_write(batch, ordered=ordered)
+        return {"n_docs": len(batch), "n_ops": len(batch),
+                "matched_count": getattr(res, "matched_count", 0) or 0,
+                "modified_count": getattr(res, "modified_count", 0) or 0,
+                "upserted_count": len(getattr(res, "upserted_ids", {}) or {})}
+    return run(ops, _write, ordered=ordered, **kwargs)
@@ -1,22 +1,47 @@
-from pymongo import MongoClient, UpdateOne
+import json
+import hashlib
+
+from pymongo import UpdateOne
+
+try:
+    from src import mongo_pool, bulk_writer, fechas
+except Exception:
+    import mongo_pool
+    import bulk_writer
+    import fechas
 
 def insertar_historico(resultados, uri="mongodb://localhost:27017/", db_name="loterias", coleccion="resultados_loterias"):
-    cliente = MongoClient(uri)
-    db = cliente[db_name]
-    col = db[coleccion]
+    col = mongo_pool.get_collection(coleccion, db_name, uri)
+    rechazadas = []
+
+    def _con_fecha_iso(resultados):
+        # las consultas por fecha comparan texto: lo que no se pueda pasar a YYYY-MM-DD no se guarda
+        for r in resultados:
+            fecha = fechas.normalizar_fecha(r.get("fecha"))
+            if fecha is None:
+                rechazadas.append(r.get("fecha"))
+                continue
+            yield {**r, "fecha": fecha}
 
-    operaciones = []
-    for r in resultados:
-        operaciones.append(
-            UpdateOne(
-                {"juego": "Primitiva", "fecha": r["fecha"]},
-                {"$set": r},
-                upsert=True
-            )
+    filas = list(_con_fecha_iso(resultados))
+    operaciones = (
+        UpdateOne(
+            {"juego": "Primitiva", "fecha": r["fecha"]},
+            {"$set": r},
+            upsert=True
         )
+        for r in filas
+    )
 
-    if operaciones:
-        resultado = col.bulk_write(operaciones, ordered=False)
-        print(f"{resultado.upserted_count + resultado.modified_count} registros insertados/actualizados en MongoDB")
+    # checkpoint por contenido: relanzar la misma carga sigue tras el último lote confirmado
+    huella = hashlib.sha1(json.dumps(filas, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+    resumen = bulk_writer.write_ops(col, operaciones, label="insertar_historico",
+                                    checkpoint=f"insertar_historico:{db_name}.{coleccion}@{len(filas)}:{huella}")
+    if rechazadas:
+        resumen["rechazadas"] = len(rechazadas)
+        print(f"{len(rechazadas)} registros descartados por fecha no reconocida (p.ej. {rechazadas[0]!r})")
+    if resumen["n_ops"]:
+        print(f"{resumen['upserted_count'] + resumen['modified_count']} registros insertados/actualizados en MongoDB")
     else:
         print("No hay datos para insertar.")
+    return resumen
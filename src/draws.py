@@ -0,0 +1,452 @@
+# src/draws.py
+"""
+Tipos compactos para sorteos (scraper -> ficheros / Mongo y ETL).
+- Draw: un sorteo con __slots__ (sin dict por instancia).
+- DrawBatch: contenedor columnar con arrays numpy:
+    fecha          int32, días desde 1970-01-01 (NO_FECHA si falta)
+    numeros        int8 (N, 6), -1 donde falta un número
+    complementario int8, -1 = None
+    reintegro      int8, -1 = None
+    juego / fuente arrays de objetos (comparten el mismo str)
+  Si algún valor no cabe en int8 (datos sucios) esa columna pasa a int16 o int32; más allá
+  de int32 se lanza ValueError en vez de desbordar en silencio.
+La deduplicación y la ordenación por fecha se hacen en bloque; to_dicts() / from_dicts()
+convierten a la lista de dicts {juego, fecha, numeros, complementario, reintegro} de siempre.
+Snapshot binario del processed CSV ({prefix}_processed.npz, junto al CSV): las mismas
+columnas en un .npz sin comprimir (juego/fuente como códigos + categorías) que se lee
+con memory-map; write_snapshot() / read_snapshot() lo ligan al tamaño y mtime del CSV.
+"""
+
+import os
+import struct
+import hashlib
+import zipfile
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src import fechas
+except Exception:
+    import fechas
+
+NO_FECHA = np.iinfo(np.int32).min
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _small_ints(values, shape=None) -> np.ndarray:
+    """El entero más pequeño en que caben todos los valores (int8, int16 o int32); ValueError si ni en int32."""
+    arr = np.asarray(values, dtype=np.int64)
+    if shape is not None:
+        arr = arr.reshape(shape)
+    if arr.size == 0:
+        return arr.astype(np.int8)
+    lo, hi = arr.min(), arr.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return arr.astype(dtype)
+    raise ValueError(f"valores fuera de rango para un sorteo: {lo}..{hi}")
+
+
+def fecha_to_days(fecha: Union[str, None]) -> int:
+    if not fecha:
+        return NO_FECHA
+    return date.fromisoformat(fecha).toordinal() - _EPOCH_ORDINAL
+
+
+def days_to_fecha(days: int) -> Union[str, None]:
+    if days == NO_FECHA:
+        return None
+    return date.fromordinal(int(days) + _EPOCH_ORDINAL).isoformat()
+
+
+def _isos_to_days(isos: Sequence[Union[str, None]]) -> np.ndarray:
+    arr = np.array([f if f else "NaT" for f in isos], dtype="datetime64[D]")
+    days = arr.astype(np.int64)
+    days[np.isnat(arr)] = NO_FECHA
+    return days.astype(np.int32)
+
+
+def _dayfirst_to_days(values: Sequence[Any], only_str: bool = False) -> np.ndarray:
+    """
+    Días desde 1970 de una columna de fechas con la normalización dayfirst del ETL
+    (fechas.dayfirst_serie, en bloque sobre los valores distintos de la columna).
+    Con only_str=True lo que no sea str cuenta como sin fecha (columna leída de un CSV).
+    """
+    col = pd.Series(values, dtype=object)
+    valid = col.map(lambda f: isinstance(f, str) if only_str else f is not None and f == f) & (col != "")
+    codes, uniques = pd.factorize(col.where(valid))
+    if not len(uniques):
+        return np.full(len(col), NO_FECHA, dtype=np.int32)
+    dt = fechas.dayfirst_serie(pd.Series(uniques, dtype=object)).to_numpy().astype("datetime64[D]")
+    days = dt.astype(np.int64)
+    days[np.isnat(dt)] = NO_FECHA
+    out = days.astype(np.int32).take(np.where(codes < 0, 0, codes))
+    out[codes < 0] = NO_FECHA
+    return out
+
+
+def _days_to_isos(days: np.ndarray) -> List[Union[str, None]]:
+    missing = days == NO_FECHA
+    isos = np.where(missing, 0, days).astype("datetime64[D]").astype(str).astype(object)
+    isos[missing] = None
+    return isos.tolist()
+
+
+def _opt(v) -> int:
+    if v is None or v == "" or v == "nan":
+        return -1
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return -1
+
+
+class Draw:
+    """Un sorteo. `numeros` es una tupla de hasta 6 enteros."""
+    __slots__ = ("juego", "fecha", "numeros", "complementario", "reintegro", "fuente")
+
+    def __init__(self, juego: str, fecha: Union[str, None], numeros: Sequence[int],
+                 complementario: Union[int, None] = None, reintegro: Union[int, None] = None,
+                 fuente: Union[str, None] = None):
+        self.juego = juego
+        self.fecha = fecha
+        self.numeros = tuple(numeros)
+        self.complementario = complementario
+        self.reintegro = reintegro
+        self.fuente = fuente
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> "Draw":
+        return cls(row.get("juego", ""), row.get("fecha"), row.get("numeros") or (),
+                   row.get("complementario"), row.get("reintegro"), row.get("fuente"))
+
+    def key(self) -> tuple:
+        return self.fecha, self.numeros
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {
+            "juego": self.juego,
+            "fecha": self.fecha,
+            "numeros": list(self.numeros),
+            "complementario": self.complementario,
+            "reintegro": self.reintegro,
+        }
+        if self.fuente is not None:
+            d["fuente"] = self.fuente
+        return d
+
+    def __eq__(self, other):
+        return isinstance(other, Draw) and all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self):
+        return f"Draw({self.juego!r}, {self.fecha!r}, {list(self.numeros)}, C={self.complementario}, R={self.reintegro})"
+
+
+class DrawBatch:
+    """Conjunto de sorteos en columnas numpy (ver docstring del módulo)."""
+    __slots__ = ("juego", "fecha", "numeros", "complementario", "reintegro", "fuente")
+
+    def __init__(self, juego: np.ndarray, fecha: np.ndarray, numeros: np.ndarray,
+                 complementario: np.ndarray, reintegro: np.ndarray, fuente: np.ndarray = None):
+        self.juego = juego
+        self.fecha = fecha
+        self.numeros = numeros
+        self.complementario = complementario
+        self.reintegro = reintegro
+        self.fuente = fuente
+
+    # --------------------------- construcción ------------------------------
+    @classmethod
+    def empty(cls) -> "DrawBatch":
+        return cls(np.empty(0, dtype=object), np.empty(0, dtype=np.int32), np.empty((0, 6), dtype=np.int8),
+                   np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8))
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[Dict[str, Any]], normalize_fecha: bool = False) -> "DrawBatch":
+        """
+        Dicts del scraper ({juego, fecha, numeros, complementario, reintegro[, fuente]}).
+        Con normalize_fecha=True la fecha se pasa por fechas.normalizar_fecha_dayfirst
+        (ETL); si no, se espera ya en 'YYYY-MM-DD'.
+        """
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        nums = np.full((len(rows), 6), -1, dtype=np.int64)
+        for i, r in enumerate(rows):
+            ns = [int(x) for x in (r.get("numeros") or [])][:6]
+            nums[i, :len(ns)] = ns
+        fechas_l = [r.get("fecha") for r in rows]
+        has_fuente = any("fuente" in r for r in rows)
+        return cls(
+            np.array([r.get("juego", "") for r in rows], dtype=object),
+            _dayfirst_to_days(fechas_l) if normalize_fecha else _isos_to_days(fechas_l),
+            _small_ints(nums),
+            _small_ints([_opt(r.get("complementario")) for r in rows]),
+            _small_ints([_opt(r.get("reintegro")) for r in rows]),
+            np.array([r.get("fuente", "") for r in rows], dtype=object) if has_fuente else None,
+        )
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, juego: str = "") -> "DrawBatch":
+        """DataFrame con columnas fecha, n1..n6[, complementario, reintegro, juego, fuente] (CSV processed)."""
+        n = len(df)
+        if n == 0:
+            return cls.empty()
+
+        def _col_ints(col: str) -> np.ndarray:
+            if col not in df.columns:
+                return np.full(n, -1, dtype=np.int64)
+            v = pd.to_numeric(df[col], errors="coerce")
+            return v.fillna(-1).astype(np.int64).to_numpy()
+
+        nums = np.column_stack([_col_ints(f"n{i}") for i in range(1, 7)])
+        # los números que faltan se compactan a la derecha, igual que al leer fila a fila
+        order = np.argsort(nums < 0, axis=1, kind="stable")
+        nums = np.take_along_axis(nums, order, axis=1)
+        # misma normalización dayfirst que ingest.doc_from_row, una vez por fecha distinta
+        dias = _dayfirst_to_days(df["fecha"].tolist(), only_str=True) if "fecha" in df.columns \
+            else np.full(n, NO_FECHA, dtype=np.int32)
+        juegos = df["juego"].fillna(juego).to_numpy(dtype=object) if "juego" in df.columns else np.full(n, juego, dtype=object)
+        fuente = df["fuente"].fillna("").to_numpy(dtype=object) if "fuente" in df.columns else None
+        return cls(juegos, dias, _small_ints(nums),
+                   _small_ints(_col_ints("complementario")), _small_ints(_col_ints("reintegro")), fuente)
+
+    @classmethod
+    def concat(cls, batches: Sequence["DrawBatch"]) -> "DrawBatch":
+        batches = [b for b in batches if b is not None and len(b)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+        fuente = None
+        if any(b.fuente is not None for b in batches):
+            fuente = np.concatenate([b.fuente if b.fuente is not None else np.full(len(b), "", dtype=object)
+                                     for b in batches])
+        return cls(
+            np.concatenate([b.juego for b in batches]),
+            np.concatenate([b.fecha for b in batches]),
+            _small_ints(np.concatenate([b.numeros.astype(np.int64) for b in batches])),
+            _small_ints(np.concatenate([b.complementario.astype(np.int64) for b in batches])),
+            _small_ints(np.concatenate([b.reintegro.astype(np.int64) for b in batches])),
+            fuente,
+        )
+
+    # ----------------------------- acceso ----------------------------------
+    def __len__(self) -> int:
+        return len(self.fecha)
+
+    def __getitem__(self, i: int) -> Draw:
+        return self._draw(i)
+
+    def __iter__(self) -> Iterator[Draw]:
+        for i in range(len(self)):
+            yield self._draw(i)
+
+    def _draw(self, i: int) -> Draw:
+        nums = [int(x) for x in self.numeros[i] if x >= 0]
+        c, r = int(self.complementario[i]), int(self.reintegro[i])
+        return Draw(self.juego[i], days_to_fecha(self.fecha[i]), nums,
+                    None if c < 0 else c, None if r < 0 else r,
+                    None if self.fuente is None else self.fuente[i])
+
+    def take(self, idx) -> "DrawBatch":
+        return DrawBatch(self.juego[idx], self.fecha[idx], self.numeros[idx], self.complementario[idx],
+                         self.reintegro[idx], None if self.fuente is None else self.fuente[idx])
+
+    @property
+    def nbytes(self) -> int:
+        n = self.fecha.nbytes + self.numeros.nbytes + self.complementario.nbytes + self.reintegro.nbytes
+        return n + self.juego.nbytes + (self.fuente.nbytes if self.fuente is not None else 0)
+
+    def fechas_iso(self) -> List[Union[str, None]]:
+        return _days_to_isos(self.fecha)
+
+    def digest(self) -> str:
+        """sha1 (16 hex) del contenido en su orden (clave de checkpoint de una carga)."""
+        h = hashlib.sha1()
+        for arr in (self.fecha, self.numeros, self.complementario, self.reintegro):
+            h.update(np.ascontiguousarray(arr, dtype=np.int64).tobytes())
+        for col in (self.juego, self.fuente):
+            if col is not None:
+                h.update("\x1f".join("" if v is None else str(v) for v in col).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    # -------------------------- operaciones en bloque ----------------------
+    def valid_mask(self) -> np.ndarray:
+        """Filas con fecha y al menos un número (las que conserva la deduplicación)."""
+        return (self.fecha != NO_FECHA) & (self.numeros[:, 0] >= 0)
+
+    def dedupe(self) -> "DrawBatch":
+        """Una fila por (fecha, numeros), la primera que aparece; descarta filas sin fecha o sin números."""
+        valid = np.flatnonzero(self.valid_mask())
+        if not len(valid):
+            return self.take(valid)
+        keys = np.column_stack([self.fecha[valid].astype(np.int64), self.numeros[valid].astype(np.int64)])
+        _, first = np.unique(keys, axis=0, return_index=True)
+        return self.take(valid[np.sort(first)])
+
+    def sort_by_fecha(self, descending: bool = True) -> "DrawBatch":
+        """Orden estable por fecha (las filas sin fecha al final)."""
+        f = self.fecha.astype(np.int64)
+        key = np.where(self.fecha == NO_FECHA, np.iinfo(np.int64).max, -f if descending else f)
+        return self.take(np.argsort(key, kind="stable"))
+
+    def after(self, fecha: str) -> "DrawBatch":
+        """Sorteos con fecha estrictamente posterior a `fecha` (YYYY-MM-DD)."""
+        return self.take(np.flatnonzero((self.fecha != NO_FECHA) & (self.fecha > fecha_to_days(fecha))))
+
+    # ----------------------------- bordes ----------------------------------
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Lista de dicts {juego, fecha, numeros, complementario, reintegro[, fuente]}."""
+        isos = self.fechas_iso()
+        nums = self.numeros.tolist()
+        comps = self.complementario.tolist()
+        reints = self.reintegro.tolist()
+        juegos = self.juego.tolist()
+        fuentes = self.fuente.tolist() if self.fuente is not None else None
+        out = []
+        for i in range(len(isos)):
+            d = {
+                "juego": juegos[i],
+                "fecha": isos[i],
+                "numeros": [x for x in nums[i] if x >= 0],
+                "complementario": comps[i] if comps[i] >= 0 else None,
+                "reintegro": reints[i] if reints[i] >= 0 else None,
+            }
+            if fuentes is not None:
+                d["fuente"] = fuentes[i]
+            out.append(d)
+        return out
+
+    # ---------------------------- snapshot npz -----------------------------
+    def save_npz(self, path: str, meta: Dict[str, int] = None):
+        """Guarda las columnas en un .npz sin comprimir (escritura atómica: .tmp + rename)."""
+        arrays = {"fecha": self.fecha, "numeros": self.numeros,
+                  "complementario": self.complementario, "reintegro": self.reintegro}
+        for col in ("juego", "fuente"):
+            values = getattr(self, col)
+            if values is None:
+                continue
+            cats, codes = np.unique(np.array(["" if v is None else str(v) for v in values], dtype=str),
+                                    return_inverse=True)
+            arrays[f"{col}_cats"] = cats
+            arrays[f"{col}_codes"] = codes.astype(np.int32)
+        for k, v in (meta or {}).items():
+            arrays[f"meta_{k}"] = np.int64(v)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_npz(cls, path: str, mmap: bool = True) -> "DrawBatch":
+        """Lee un snapshot de save_npz(); con mmap=True las columnas numéricas son memmaps de solo lectura."""
+        arrays = _npz_arrays(path, mmap)
+
+        def _strings(col: str):
+            if f"{col}_codes" not in arrays:
+                return None
+            return np.asarray(arrays[f"{col}_cats"]).astype(object)[arrays[f"{col}_codes"]]
+
+        juego = _strings("juego")
+        return cls(juego if juego is not None else np.full(len(arrays["fecha"]), "", dtype=object),
+                   arrays["fecha"], arrays["numeros"], arrays["complementario"], arrays["reintegro"],
+                   _strings("fuente"))
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame juego, fecha, n1..n6, complementario, reintegro (formato processed CSV)."""
+        data = {"juego": self.juego, "fecha": self.fechas_iso()}
+        nums = self.numeros.astype("float64")
+        nums[nums < 0] = np.nan
+        for i in range(6):
+            data[f"n{i + 1}"] = pd.array(nums[:, i], dtype="Int64")
+        for col in ("complementario", "reintegro"):
+            v = getattr(self, col).astype("float64")
+            v[v < 0] = np.nan
+            data[col] = pd.array(v, dtype="Int64")
+        return pd.DataFrame(data)
+
+
+def _npz_arrays(path: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Arrays de un .npz. np.load ignora mmap_mode en los .npz, así que con mmap=True se
+    localiza cada miembro (guardado sin comprimir) dentro del zip y se abre con np.memmap.
+    """
+    if not mmap:
+        with np.load(path) as z:
+            return {k: z[k] for k in z.files}
+    out = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return _npz_arrays(path, mmap=False)
+            f.seek(info.header_offset)
+            name_len, extra_len = struct.unpack("<HH", f.read(30)[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if not shape or 0 in shape:
+                with zf.open(info) as member:
+                    out[name] = np.lib.format.read_array(member)
+                continue
+            out[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                  order="F" if fortran else "C")
+    return out
+
+
+def snapshot_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".npz"
+
+
+def _csv_stamp(csv_path: str) -> Dict[str, int]:
+    st = os.stat(csv_path)
+    return {"csv_size": st.st_size, "csv_mtime_ns": st.st_mtime_ns}
+
+
+def write_snapshot(csv_path: str, batch: "DrawBatch" = None) -> str:
+    """
+    Escribe el snapshot de `csv_path` (de `batch` si se pasa; si no, leyendo el CSV una vez)
+    ligado al tamaño/mtime actuales del CSV.
+    """
+    if batch is None:
+        batch = DrawBatch.from_frame(pd.read_csv(csv_path, dtype=str))
+    path = snapshot_path(csv_path)
+    batch.save_npz(path, meta=_csv_stamp(csv_path))
+    return path
+
+
+def read_snapshot(csv_path: str, mmap: bool = True) -> Union[DrawBatch, None]:
+    """Snapshot de `csv_path`, o None si no existe o el CSV cambió después de escribirlo."""
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as z:  # NpzFile lee cada miembro bajo demanda
+            meta = {k[5:]: int(z[k]) for k in z.files if k.startswith("meta_")}
+        if os.path.exists(csv_path) and meta != _csv_stamp(csv_path):
+            return None
+        return DrawBatch.load_npz(path, mmap=mmap)
+    except Exception as e:
+        print("Snapshot ilegible, se usa el CSV:", e)
+        return None
+
+
+def as_dicts(resultados: Union[DrawBatch, List[dict]]) -> List[dict]:
+    """Borde de compatibilidad: acepta DrawBatch o lista de dicts."""
+    if isinstance(resultados, DrawBatch):
+        return resultados.to_dicts()
+    return resultados
+
+
+def as_batch(resultados: Union[DrawBatch, List[dict]]) -> DrawBatch:
+    if isinstance(resultados, DrawBatch):
+        return resultados
+    return DrawBatch.from_dicts(resultados)
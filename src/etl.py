@@ -1,19 +1,43 @@
 # src/etl.py
 """
 ETL bidireccional:
- - mongo2fs (por defecto): lee colección Mongo -> guarda data/raw/{prefix}_raw.json y data/processed/{prefix}_processed.csv
- - fs2mongo (--to-mongo): lee CSV/JSON desde data/processed o data/raw -> inserta/bulk_upsert en Mongo
+ - mongo2fs (por defecto): recorre la colección Mongo con un cursor -> data/raw/{prefix}/ (segmentos JSONL
+   comprimidos, src/raw_store.py) y data/processed/{prefix}_processed.csv
+   (+ snapshot binario data/processed/{prefix}_processed.npz para utils_ml.load_processed_df)
+ - mongo2fs --incremental: solo pide a Mongo los sorteos posteriores a la marca de agua
+   (data/processed/{prefix}_processed.watermark.json) y los añade (raw: un segmento nuevo); reconstruye
+   si cambió la historia
+ - fs2mongo (--to-mongo): lee el CSV de data/processed o el raw (segmentos, o el _raw.json(l) antiguo) -> inserta/bulk_upsert en Mongo
+   (a través de src/repository.py: con DRAW_BACKEND=memory|file se carga ahí en vez de en Mongo)
 Usa --which/--game para seleccionar 'primitiva' o 'bonoloto' (o interactivo).
 """
 import os
+import csv
 import json
+import hashlib
 import argparse
+from functools import partial
 from datetime import datetime
-from typing import List, Dict, Any
-from pymongo import MongoClient, ReplaceOne
-from pymongo.errors import BulkWriteError, PyMongoError
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
 load_dotenv()
+try:
+    from src.fechas import normalizar_fecha_dayfirst
+    from src import draws
+    from src.draws import DrawBatch
+    from src import mongo_pool, mongo_upsert, mongo_queries, repository, raw_store
+except Exception:
+    from fechas import normalizar_fecha_dayfirst
+    import draws
+    from draws import DrawBatch
+    import mongo_pool
+    import mongo_upsert
+    import mongo_queries
+    import repository
+    import raw_store
 # CONFIG vía env
 MONGO_URI = os.environ.get("MONGO_URI")
 MONGO_DB = os.environ.get("MONGO_DB", "loterias")
@@ -26,224 +50,307 @@ OUT_DIR_PROCESSED = os.path.join(BASE_DIR, "data", "processed")
 
 # ---------- utilidades Mongo ----------
 def get_client():
-    return MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    # cliente compartido del proceso (src/mongo_pool.py): un solo pool por ejecución
+    return mongo_pool.get_client(MONGO_URI)
 
 def get_collection(prefix: str):
-    name = f"{COLLECTION_BASE}_{prefix}"
-    client = get_client()
-    return client[MONGO_DB][name]
+    return mongo_queries.get_collection(prefix)
 
 
-def _make_doc_for_mongo(row: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Normaliza fila/registro a documento de Mongo listo para insertar.
-    Se espera keys: juego, fecha (YYYY-MM-DD o parseable), n1..n6 OR 'numeros' list, complementario, reintegro, fuente
-    Genera _id = "YYYY-MM-DD:3,15,23,26,34,38"
-    """
-    # manejar si vienen n1..n6
-    nums = []
-    if "numeros" in row and row.get("numeros"):
-        nums = [int(x) for x in row.get("numeros")]
-    else:
-        for i in range(1, 7):
-            k = f"n{i}"
-            v = row.get(k)
-            if v is not None and str(v).strip() != "":
-                try:
-                    nums.append(int(v))
-                except Exception:
-                    pass
-
-    # fecha: intentar normalizar a YYYY-MM-DD
-    fecha = row.get("fecha")
-    fecha_norm = None
-    if fecha:
-        try:
-            # si ya es datetime
-            if isinstance(fecha, datetime):
-                fecha_norm = fecha.strftime("%Y-%m-%d")
-            else:
-                import pandas as pd
-                dt = pd.to_datetime(str(fecha), dayfirst=True, errors='coerce')
-                if not pd.isna(dt):
-                    fecha_norm = dt.strftime("%Y-%m-%d")
-        except Exception:
-            fecha_norm = None
-
-    # asegurar lista de 6 ints (o menos si no hay)
-    nums = [int(x) for x in nums][:6]
+# ---------- mongo -> files (streaming) ----------
+# solo los campos que se exportan; el orden lo da Mongo (fecha ISO YYYY-MM-DD)
+EXPORT_PROJECTION = mongo_queries.DRAW_PROJECTION
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+EXPORT_PROJECTION_WM = {**EXPORT_PROJECTION, "last_modified": 1}
+CSV_COLUMNS = ["juego", "fecha", "n1", "n2", "n3", "n4", "n5", "n6", "complementario", "reintegro", "fuente"]
 
-    clave_nums = ",".join(str(x) for x in nums) if nums else "no_nums"
-    _id = f"{fecha_norm if fecha_norm else 'no_fecha'}:{clave_nums}"
 
-    doc = {
-        "_id": _id,
-        "juego": row.get("juego", ""),
-        "fecha": fecha_norm,
-        "numeros": nums,
-        "complementario": int(row.get("complementario")) if row.get("complementario") not in (None, "", "nan") else None,
-        "reintegro": int(row.get("reintegro")) if row.get("reintegro") not in (None, "", "nan") else None,
-        "fuente": row.get("fuente", ""),
-        "inserted_at": datetime.now()
-    }
-    return doc
+def iter_mongo_docs(prefix: str, batch_size: int = None, query: Dict[str, Any] = None,
+                    projection: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+    """Cursor ordenado por fecha en el servidor; trae `batch_size` documentos por ida y vuelta."""
+    col = get_collection(prefix)
+    mongo_queries.ensure_indexes(col)
+    return col.find(query or {}, projection or EXPORT_PROJECTION, sort=[("fecha", 1)],
+                    batch_size=batch_size or EXPORT_BATCH_SIZE)
 
 
-# ---------- mongo -> files (original) ----------
 def fetch_all_from_mongo(prefix: str) -> List[Dict[str, Any]]:
-    col = get_collection(prefix)
-    docs = list(col.find({}, {"_id": 0}))
-    return docs
+    return list(iter_mongo_docs(prefix))
 
-def mongo_to_files(prefix: str) -> str:
-    """
-    Lee toda la colección y guarda raw JSON y processed CSV (equivalente a tu código original).
-    Returns path to processed CSV or None.
-    """
-    os.makedirs(OUT_DIR_RAW, exist_ok=True)
-    os.makedirs(OUT_DIR_PROCESSED, exist_ok=True)
 
-    docs = fetch_all_from_mongo(prefix)
-    if not docs:
-        print(f"No se han encontrado documentos en MongoDB para {prefix}.")
+def _csv_row(r: Dict[str, Any]) -> Union[List[Any], None]:
+    """Fila n1..n6 del processed CSV, o None si la fecha no se puede normalizar."""
+    fecha = normalizar_fecha_dayfirst(r.get("fecha"))
+    if not fecha:
         return None
+    nums = r.get("numeros") or []
+    if isinstance(nums, str):
+        nums = [int(x) for x in nums.split() if x.isdigit()]
+    nums = [int(x) for x in nums][:6]
+    nums += [None] * (6 - len(nums))
+    return [r.get("juego", ""), fecha, *nums, r.get("complementario"), r.get("reintegro"), r.get("fuente", "")]
+
+
+# ---------- marca de agua (export incremental) ----------
+# data/processed/{prefix}_processed.watermark.json:
+#   fecha          último valor de `fecha` exportado (tal cual está en Mongo)
+#   day_hash       sha1 de los content_hash de los sorteos de esa fecha
+#   n_dated        documentos con fecha <= marca (para detectar altas/bajas antiguas)
+#   last_modified  mayor last_modified exportado (para detectar ediciones antiguas)
+#   processed_size bytes confirmados del CSV (el raw se recorta con raw_store.drop_after(fecha))
+def _paths(out_prefix: str):
+    return (os.path.join(OUT_DIR_PROCESSED, f"{out_prefix}_processed.csv"),
+            os.path.join(OUT_DIR_PROCESSED, f"{out_prefix}_processed.watermark.json"))
+
+
+def load_watermark(out_prefix: str) -> Dict[str, Any]:
+    try:
+        with open(_paths(out_prefix)[1], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_watermark(out_prefix: str, wm: Dict[str, Any]):
+    path = _paths(out_prefix)[1]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**wm, "updated_at": datetime.now().isoformat(timespec="seconds")}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _day_hash(docs: Iterable[Dict[str, Any]]) -> str:
+    hashes = sorted(mongo_upsert.content_hash(d) for d in docs)
+    return hashlib.sha1(",".join(hashes).encode("utf-8")).hexdigest()
+
+
+def _write_docs(docs: Iterable[Dict[str, Any]], raw: "raw_store.Writer", writer, wm: Dict[str, Any],
+                rows: List[list] = None) -> int:
+    """
+    Escribe raw (segmentos de raw_store) + CSV a medida que llegan los documentos y avanza
+    `wm`. Devuelve nº de documentos; si se pasa `rows`, también acumula ahí las filas del CSV.
+    """
+    n_docs = 0
+    day = []
+    for doc in docs:
+        modified = doc.pop("last_modified", None)
+        raw.add(doc)
+        n_docs += 1
+        row = _csv_row(doc)
+        if row is not None:
+            writer.writerow(row)
+            if rows is not None:
+                rows.append(row)
+        if isinstance(modified, datetime):
+            modified = modified.isoformat()
+            if modified > (wm.get("last_modified") or ""):
+                wm["last_modified"] = modified
+        fecha = doc.get("fecha")
+        if isinstance(fecha, str):
+            wm["n_dated"] = wm.get("n_dated", 0) + 1
+            if fecha != wm.get("fecha"):
+                wm["fecha"] = fecha
+                day = []
+            day.append(doc)
+    if day:
+        wm["day_hash"] = _day_hash(day)
+    return n_docs
+
+
+def _write_snapshot(processed_path: str, batch: DrawBatch = None):
+    """Snapshot binario (.npz) que lee utils_ml.load_processed_df; si falla, se queda el CSV."""
+    try:
+        draws.write_snapshot(processed_path, batch)
+    except Exception as e:
+        print("No se pudo escribir el snapshot:", e)
 
-    raw_path = os.path.join(OUT_DIR_RAW, f"{prefix}_raw.json")
-    with open(raw_path, "w", encoding="utf-8") as f:
-        json.dump(docs, f, ensure_ascii=False, indent=2, default=str)
-    print("Guardado raw en:", raw_path)
 
-    # Normalizar y crear filas tipo n1..n6
+def _retroactive_change(prefix: str, wm: Dict[str, Any]) -> Union[str, None]:
+    """Motivo por el que lo ya exportado dejó de coincidir con Mongo, o None."""
+    col = get_collection(prefix)
+    old = {"fecha": {"$lte": wm["fecha"]}}
+    if col.count_documents(old) != wm.get("n_dated"):
+        return "cambió el número de sorteos anteriores a la marca"
+    modified = {"$gt": datetime.fromisoformat(wm["last_modified"])} if wm.get("last_modified") else {"$exists": True}
+    if col.find_one({**old, "last_modified": modified}, {"_id": 1}) is not None:
+        return "hay sorteos anteriores a la marca modificados"
+    if _day_hash(col.find({"fecha": wm["fecha"]}, EXPORT_PROJECTION)) != wm.get("day_hash"):
+        return "cambió el último día exportado"
+    return None
+
+
+def _append_new(prefix: str, out_prefix: str, wm: Dict[str, Any], batch_size: int = None) -> Union[int, None]:
+    """
+    Añade los sorteos con fecha > marca: al CSV por el final y al raw como un segmento
+    nuevo. Primero se recorta el CSV a los bytes confirmados y se quita del raw lo
+    posterior a la marca (por si una ejecución anterior se cortó a medias); la marca se
+    guarda solo después de fsync. None si los ficheros no cuadran con la marca.
+    """
+    processed_path, _ = _paths(out_prefix)
+    size = wm.get("processed_size")
+    if size is None or not os.path.exists(processed_path) or os.path.getsize(processed_path) < size \
+            or not raw_store.exists(out_prefix):
+        return None
+    old = draws.read_snapshot(processed_path)
+    raw_store.drop_after(out_prefix, wm["fecha"])
     rows = []
-    for r in docs:
-        nums = r.get("numeros") or []
-        if isinstance(nums, str):
-            nums = [int(x) for x in nums.split() if x.isdigit()]
-        nums = [int(x) for x in nums][:6]
-        rows.append({
-            "juego": r.get("juego", ""),
-            "fecha": r.get("fecha"),
-            "n1": nums[0] if len(nums) > 0 else None,
-            "n2": nums[1] if len(nums) > 1 else None,
-            "n3": nums[2] if len(nums) > 2 else None,
-            "n4": nums[3] if len(nums) > 3 else None,
-            "n5": nums[4] if len(nums) > 4 else None,
-            "n6": nums[5] if len(nums) > 5 else None,
-            "complementario": r.get("complementario"),
-            "reintegro": r.get("reintegro"),
-            "fuente": r.get("fuente", "")
-        })
+    with open(processed_path, "r+", encoding="utf-8", newline="") as fp, raw_store.Writer(out_prefix) as raw:
+        # solo si sobra algo: truncate() cambia el mtime y dejaría el snapshot desfasado
+        if os.path.getsize(processed_path) != size:
+            fp.truncate(size)
+        fp.seek(0, os.SEEK_END)
+        new_docs = mongo_queries.draws_since(prefix, wm["fecha"], projection=EXPORT_PROJECTION_WM, batch_size=batch_size)
+        n_new = _write_docs(new_docs, raw, csv.writer(fp), wm, rows)
+        fp.flush()
+        os.fsync(fp.fileno())
+        wm["processed_size"] = fp.tell()
+    _save_watermark(out_prefix, wm)
+    if old is None or rows:
+        new = DrawBatch.from_frame(pd.DataFrame(rows, columns=CSV_COLUMNS, dtype=str)) if rows else None
+        _write_snapshot(processed_path, None if old is None else DrawBatch.concat([old, new]))
+    return n_new
+
+
+def mongo_to_files(prefix: str, batch_size: int = None, incremental: bool = False, out_prefix: str = None) -> str:
+    """
+    Recorre la colección con un cursor (orden y proyección en el servidor) y escribe a la
+    vez el raw data/raw/{out_prefix}/ (segmentos de src/raw_store.py, que sustituyen a los
+    anteriores) y el processed CSV, sin tener la colección entera en memoria. El CSV se
+    escribe en .tmp y se renombra al final, y los segmentos solo pasan al manifest si el
+    export termina; junto al CSV queda la marca de agua del export.
+    Con incremental=True solo se piden a Mongo los sorteos posteriores a la marca y se
+    añaden al final; si la historia anterior cambió (altas, bajas o ediciones) o los
+    ficheros no cuadran con la marca, se reconstruye todo.
+    Returns path to processed CSV or None.
+    """
+    out_prefix = out_prefix or prefix
+    os.makedirs(OUT_DIR_PROCESSED, exist_ok=True)
+    processed_path, _ = _paths(out_prefix)
+
+    wm = load_watermark(out_prefix) if incremental else {}
+    if wm.get("fecha"):
+        try:
+            reason = _retroactive_change(prefix, wm)
+            n_new = None if reason else _append_new(prefix, out_prefix, wm, batch_size)
+        except Exception as e:
+            print("Error en el export incremental:", e)
+            reason, n_new = str(e), None
+        if n_new is not None:
+            print(f"Export incremental: {n_new} sorteos nuevos (marca: {wm['fecha']}) -> {processed_path}")
+            return processed_path
+        print(f"Reconstrucción completa ({reason or 'los ficheros no cuadran con la marca'})")
+    elif incremental:
+        print("Sin marca de agua previa: export completo")
+
+    processed_tmp = f"{processed_path}.tmp"
+    raw = raw_store.Writer(out_prefix, replace=True)
+    wm = {}
     try:
-        import pandas as pd
-        df = pd.DataFrame(rows)
-        df['fecha'] = pd.to_datetime(df['fecha'], dayfirst=True, errors='coerce')
-        df = df[~df['fecha'].isna()].copy()
-        df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
-        df = df.sort_values('fecha').reset_index(drop=True)
-        processed_path = os.path.join(OUT_DIR_PROCESSED, f"{prefix}_processed.csv")
-        df.to_csv(processed_path, index=False)
-        print("Guardado processed en:", processed_path)
-        return processed_path
+        with open(processed_tmp, "w", encoding="utf-8", newline="") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(CSV_COLUMNS)
+            n_docs = _write_docs(iter_mongo_docs(prefix, batch_size, projection=EXPORT_PROJECTION_WM), raw, writer, wm)
+            wm["processed_size"] = fp.tell()
     except Exception as e:
-        print("Error guardando CSV (pandas requerido):", e)
+        print("Error exportando desde Mongo:", e)
+        raw.abort()
+        if os.path.exists(processed_tmp):
+            os.remove(processed_tmp)
         return None
 
+    if not n_docs:
+        raw.abort()
+        os.remove(processed_tmp)
+        print(f"No se han encontrado documentos en MongoDB para {prefix}.")
+        return None
+    res = raw.commit()
+    os.replace(processed_tmp, processed_path)
+    _save_watermark(out_prefix, wm)
+    _write_snapshot(processed_path)
+    print(f"Guardado raw en: {raw_store.store_dir(out_prefix)} ({n_docs} documentos, {len(res['segments'])} segmentos)")
+    print(f"Guardado processed en: {processed_path}")
+    return processed_path
+
 
 # ---------- files -> mongo (nuevo) ----------
-def _load_from_files(prefix: str) -> List[Dict[str, Any]]:
+def _raw_paths(prefix: str) -> List[str]:
+    return [os.path.join(OUT_DIR_RAW, f"{prefix}_raw.jsonl"), os.path.join(OUT_DIR_RAW, f"{prefix}_raw.json")]
+
+
+def _iter_legacy_raw(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            yield from (json.loads(ln) for ln in f if ln.strip())
+        else:
+            yield from json.load(f)
+
+
+def _load_from_files(prefix: str) -> DrawBatch:
     """
-    Intenta cargar primero processed CSV, si no existe intenta raw JSON.
-    Devuelve lista de dicts uniformes.
+    Intenta cargar primero processed CSV, si no existe el raw en segmentos y si no
+    el raw JSONL / JSON antiguo.
+    Devuelve un DrawBatch (columnar); las fechas quedan ya normalizadas a YYYY-MM-DD.
     """
     csv_path = os.path.join(OUT_DIR_PROCESSED, f"{prefix}_processed.csv")
-    raw_path = os.path.join(OUT_DIR_RAW, f"{prefix}_raw.json")
-    rows = []
     if os.path.exists(csv_path):
         try:
             import pandas as pd
             df = pd.read_csv(csv_path, dtype=str)
-            for _, r in df.iterrows():
-                # mapear columnas a formato de documento
-                nums = []
-                for i in range(1,7):
-                    k = f"n{i}"
-                    v = r.get(k)
-                    if v is not None and str(v).strip() != "":
-                        try:
-                            nums.append(int(float(v)))
-                        except Exception:
-                            pass
-                rows.append({
-                    "juego": r.get("juego", prefix),
-                    "fecha": r.get("fecha"),
-                    "numeros": nums,
-                    "complementario": int(r.get("complementario")) if r.get("complementario") not in (None, "", "nan") else None,
-                    "reintegro": int(r.get("reintegro")) if r.get("reintegro") not in (None, "", "nan") else None,
-                    "fuente": r.get("fuente", "")
-                })
-            if rows:
-                return rows
+            batch = DrawBatch.from_frame(df, juego=prefix)
+            if "fuente" not in df.columns:
+                batch.fuente = np.full(len(batch), "", dtype=object)
+            if len(batch):
+                return batch
         except Exception as e:
             print("Error leyendo CSV:", e)
 
-    # fallback: intentar raw json
-    if os.path.exists(raw_path):
+    # fallback: raw en segmentos (src/raw_store.py) o el raw JSONL / JSON de antes
+    fuentes = [(raw_store.store_dir(prefix), lambda: raw_store.iter_docs(prefix))] if raw_store.exists(prefix) else []
+    fuentes += [(path, partial(_iter_legacy_raw, path)) for path in _raw_paths(prefix) if os.path.exists(path)]
+    for path, leer in fuentes:
         try:
-            with open(raw_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for r in data:
-                rows.append({
-                    "juego": r.get("juego", prefix),
-                    "fecha": r.get("fecha"),
-                    "numeros": r.get("numeros") or [],
-                    "complementario": r.get("complementario"),
-                    "reintegro": r.get("reintegro"),
-                    "fuente": r.get("fuente", "")
-                })
-            return rows
+            rows = [{
+                "juego": r.get("juego", prefix),
+                "fecha": r.get("fecha"),
+                "numeros": r.get("numeros") or [],
+                "complementario": r.get("complementario"),
+                "reintegro": r.get("reintegro"),
+                "fuente": r.get("fuente", "")
+            } for r in leer()]
+            return DrawBatch.from_dicts(rows, normalize_fecha=True)
         except Exception as e:
-            print("Error leyendo raw JSON:", e)
+            print(f"Error leyendo raw ({path}):", e)
 
     print("No se encontraron ficheros para", prefix)
-    return []
+    return DrawBatch.empty()
+
+
+def _source_fingerprint(prefix: str) -> str:
+    """Ruta + mtime + tamaño del fichero que leerá _load_from_files (clave del checkpoint)."""
+    for path in (os.path.join(OUT_DIR_PROCESSED, f"{prefix}_processed.csv"), raw_store.manifest_path(prefix),
+                 *_raw_paths(prefix)):
+        if os.path.exists(path):
+            st = os.stat(path)
+            return f"{os.path.basename(path)}:{int(st.st_mtime)}:{st.st_size}"
+    return ""
 
 
 def files_to_mongo(prefix: str, ordered: bool = False) -> Dict[str, Any]:
     """
-    Carga filas desde data y las inserta/actualiza en Mongo (bulk upsert).
+    Carga filas desde data y las inserta/actualiza en el repositorio de sorteos
+    (src/repository.py; Mongo salvo DRAW_BACKEND). En Mongo va por lotes con
+    src/bulk_writer.py: si una carga grande se corta, la siguiente con el mismo
+    fichero sigue desde el último lote confirmado.
     Devuelve resumen.
     """
-    rows = _load_from_files(prefix)
-    if not rows:
+    batch = _load_from_files(prefix)
+    if not len(batch):
         return {"ok": False, "reason": "no_files_or_no_rows"}
 
-    # construir ops ReplaceOne con _id único
-    ops = []
-    for r in rows:
-        try:
-            doc = _make_doc_for_mongo(r)
-        except Exception:
-            continue
-        ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
-
-    if not ops:
-        return {"ok": False, "reason": "no_ops"}
-
-    coll = get_collection(prefix)
-    try:
-        res = coll.bulk_write(ops, ordered=ordered)
-        summary = {
-            "ok": True,
-            "n_ops": len(ops),
-            "matched_count": getattr(res, "matched_count", None),
-            "modified_count": getattr(res, "modified_count", None),
-            "upserted_count": len(getattr(res, "upserted_ids", {}) or {})
-        }
-        return summary
-    except BulkWriteError as bwe:
-        return {"ok": False, "error": bwe.details}
-    except PyMongoError as e:
-        return {"ok": False, "error": str(e)}
+    # solo se escriben los documentos nuevos o cambiados (src/mongo_upsert.py)
+    checkpoint = f"files_to_mongo:{prefix}@{_source_fingerprint(prefix)}"
+    return repository.get_repository().upsert(prefix, batch, ordered=ordered,
+                                              checkpoint=checkpoint, label="files_to_mongo")
 
 
 # ------------------ CLI ------------------
@@ -265,6 +372,8 @@ if __name__ == "__main__":
     parser.add_argument("--prefix", default=None, help="prefijo para ficheros y colección")
     parser.add_argument("--to-mongo", action="store_true", help="cargar desde data/ -> Mongo (fs2mongo).")
     parser.add_argument("--ordered", action="store_true", help="bulk_write ordered (más lento pero predecible).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="mongo2fs: añadir solo los sorteos posteriores a la marca de agua.")
     args = parser.parse_args()
 
     if args.which:
@@ -285,12 +394,4 @@ if __name__ == "__main__":
         print("Resultado:", r)
     else:
         print(f"Exportando Mongo '{COLLECTION_BASE}_{prefix}' -> data/raw + data/processed (prefijo {out_prefix}) ...")
-        p = mongo_to_files(prefix)
-        if p and out_prefix != prefix:
-            # renombrar si usuario pidió otro prefijo
-            try:
-                dst = os.path.join(OUT_DIR_PROCESSED, f"{out_prefix}_processed.csv")
-                os.replace(p, dst)
-                print(f"Renombrado processed a: {dst}")
-            except Exception:
-                pass
+        p = mongo_to_files(prefix, incremental=args.incremental, out_prefix=out_prefix)
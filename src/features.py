@@ -4,11 +4,15 @@ import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MultiLabelBinarizer
 
+try:
+    from src.utils_ml import load_processed_df, df_to_numeros_list
+except Exception:
+    from utils_ml import load_processed_df, df_to_numeros_list
+
 # Paths
 import os
 BASE = os.path.join(os.path.dirname(__file__), '..')
 PREFIX = os.environ.get('JUEGO', 'primitiva')
-PROCESSED_CSV = os.path.join(BASE, 'data', 'processed', f"{PREFIX}_processed.csv")
 OUT_FEATURES = os.path.join(BASE, "data", "processed", "features.csv")
 OUT_LABELS = os.path.join(BASE, "data", "processed", "labels.npy")
 
@@ -17,17 +21,10 @@ WINDOW_K = 10  # cuántos sorteos previos usar para features
 NUM_MAX = 49
 
 def build_features(window_k=WINDOW_K):
-    df = pd.read_csv(PROCESSED_CSV, parse_dates=["fecha"], dayfirst=True)
+    # sorteos del repositorio (src/repository.py; por defecto el processed CSV / snapshot .npz)
+    df = load_processed_df(PREFIX)
     # construimos lista de listas con las 6 numeros por fila
-    numeros_list = []
-    for _, row in df.iterrows():
-        nums = []
-        for col in ["n1","n2","n3","n4","n5","n6"]:
-            v = row.get(col)
-            if pd.isna(v):
-                continue
-            nums.append(int(v))
-        numeros_list.append(nums)
+    numeros_list = df_to_numeros_list(df)
 
     # preparaciones
     rows_features = []
@@ -0,0 +1,207 @@
+# src/fechas.py
+"""
+Motor de normalización de fechas a 'YYYY-MM-DD' (scrapers + ETL).
+- normalizar_fecha(): versión escalar con regex precompiladas y memo LRU acotada.
+- detectar_formato(): detecta una vez por columna cuál de los formatos fijos usa.
+- normalizar_serie(): convierte una Serie entera de golpe con el formato conocido;
+  después resuelve en bloque fechas en castellano ("5 de enero de 2024") y seriales
+  de Excel, y solo lo que quede pasa por la versión escalar (una vez por valor único).
+- normalizar_fecha_dayfirst(): equivalente memoizado de pd.to_datetime(dayfirst=True) (ETL).
+- dayfirst_serie(): lo mismo para una columna entera (ISO y dd/mm/yyyy en bloque).
+Variables de entorno:
+    FECHAS_CACHE_SIZE (default: 65536)   tamaño de la memo LRU
+"""
+
+import os
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, Union
+
+import pandas as pd
+
+FORMATOS = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y")
+CACHE_SIZE = int(os.environ.get("FECHAS_CACHE_SIZE", 65536))
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
+    "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12
+}
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_MESES_ALT = "|".join(MESES)
+_RE_NO_DIGIT = re.compile(r"\D")
+_RE_SERIAL = re.compile(r"\d{4,5}")
+_RE_MES = re.compile(r"(\d{1,2})\D+(" + _MESES_ALT + r")\D+(\d{4})", re.IGNORECASE)
+_RE_ISO = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _limpiar(s: str) -> str:
+    return s.replace("\xa0", " ").replace(",", " ").strip()
+
+
+# ------------------------------ escalar ------------------------------------
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalizar_str(s: str) -> Union[str, None]:
+    s = _limpiar(s)
+    if not s:
+        return None
+
+    for fmt in FORMATOS:
+        try:
+            return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+
+    toks = s.lower().split()
+    for i in range(len(toks)):
+        if toks[i].isdigit() and i + 2 < len(toks):
+            try:
+                dia = int(toks[i])
+                mes = MESES.get(toks[i + 1])
+                anio = int(_RE_NO_DIGIT.sub("", toks[i + 2]))
+                if mes:
+                    return datetime(anio, mes, dia).strftime("%Y-%m-%d")
+            except Exception:
+                continue
+
+    if _RE_SERIAL.fullmatch(s):
+        try:
+            return (EXCEL_EPOCH + timedelta(days=int(s))).strftime("%Y-%m-%d")
+        except Exception:
+            pass
+
+    m = _RE_MES.search(s)
+    if m:
+        try:
+            return datetime(int(m.group(3)), MESES[m.group(2).lower()], int(m.group(1))).strftime("%Y-%m-%d")
+        except Exception:
+            pass
+
+    return None
+
+
+def normalizar_fecha(fecha_str) -> Union[str, None]:
+    """'YYYY-MM-DD' o None. Acepta d/m/Y, d-m-Y, Y-m-d, d.m.Y, '5 de enero de 2024' y seriales Excel."""
+    if fecha_str is None:
+        return None
+    return _normalizar_str(str(fecha_str))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _dayfirst_str(s: str) -> Union[str, None]:
+    if _RE_ISO.fullmatch(s):
+        try:
+            return datetime.strptime(s, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    dt = pd.to_datetime(s, dayfirst=True, errors="coerce")
+    return None if pd.isna(dt) else dt.strftime("%Y-%m-%d")
+
+
+def normalizar_fecha_dayfirst(fecha) -> Union[str, None]:
+    """Mismo resultado que pd.to_datetime(str(fecha), dayfirst=True) formateado, pero memoizado."""
+    if fecha is None:
+        return None
+    if isinstance(fecha, datetime):
+        return fecha.strftime("%Y-%m-%d")
+    return _dayfirst_str(str(fecha).strip())
+
+
+def cache_info():
+    return _normalizar_str.cache_info()
+
+
+# ----------------------------- vectorizado ---------------------------------
+def _limpiar_serie(col: pd.Series) -> pd.Series:
+    return col.astype(str).str.replace("\xa0", " ", regex=False).str.replace(",", " ", regex=False).str.strip()
+
+
+def detectar_formato(valores: Union[pd.Series, Iterable[str]], muestra: int = 200) -> Union[str, None]:
+    """Formato fijo (de FORMATOS) que más valores de la muestra reconoce, o None."""
+    s = _limpiar_serie(pd.Series(list(valores) if not isinstance(valores, pd.Series) else valores).head(muestra))
+    best, best_n = None, 0
+    for f in FORMATOS:
+        n = int(pd.to_datetime(s, format=f, errors="coerce").notna().sum())
+        if n > best_n:
+            best, best_n = f, n
+    return best
+
+
+def normalizar_serie(col: pd.Series, fmt: str = None) -> pd.Series:
+    """
+    Serie de 'YYYY-MM-DD' (object, None si no es fecha) con el mismo índice que `col`.
+    `fmt` es el formato detectado para la columna (se prueba primero).
+    Se trabaja sobre los valores únicos (pd.factorize) y luego se expande.
+    """
+    codes, uniques = pd.factorize(_limpiar_serie(col))
+    res = _normalizar_unicos(pd.Series(uniques, dtype=object), fmt).to_numpy()
+    out = res.take(codes)
+    out[codes < 0] = None
+    return pd.Series(out, index=col.index, dtype=object)
+
+
+def _normalizar_unicos(s: pd.Series, fmt: str = None) -> pd.Series:
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    formats = ([fmt] if fmt else []) + [f for f in FORMATOS if f != fmt]
+    for f in formats:
+        pending = out.isna()
+        if not pending.any():
+            break
+        out[pending] = pd.to_datetime(s[pending], format=f, errors="coerce")
+
+    # fechas en castellano y seriales de Excel, también en bloque
+    pending = out.isna() & (s != "")
+    if pending.any():
+        ext = s[pending].str.extract(_RE_MES.pattern, flags=re.IGNORECASE)
+        hit = ext[0].notna()
+        if hit.any():
+            ext = ext[hit]
+            ymd = ext[2] + "-" + ext[1].str.lower().map(MESES).astype(str) + "-" + ext[0]
+            out[ext.index] = pd.to_datetime(ymd, format="%Y-%m-%d", errors="coerce")
+        pending = out.isna() & s.str.fullmatch(_RE_SERIAL.pattern)
+        if pending.any():
+            days = pd.to_numeric(s[pending], errors="coerce")
+            out[pending] = pd.Timestamp(EXCEL_EPOCH) + pd.to_timedelta(days, unit="D")
+
+    res = out.dt.strftime("%Y-%m-%d").astype(object)
+    res[out.isna()] = None
+
+    # lo que quede (formatos raros): escalar memoizado
+    pending = out.isna() & (s != "")
+    if pending.any():
+        res[pending] = s[pending].map(_normalizar_str)
+    return res
+
+
+_RE_DMY = re.compile(r"\d{1,2}/\d{1,2}/\d{4}")
+
+
+def dayfirst_serie(valores: Iterable) -> pd.Series:
+    """
+    Serie datetime64 (NaT si no es fecha) con el mismo resultado que
+    normalizar_fecha_dayfirst valor a valor. Los formatos habituales (YYYY-MM-DD y
+    dd/mm/yyyy) se convierten de golpe; el resto pasa por la versión escalar memoizada.
+    """
+    col = pd.Series(list(valores) if not isinstance(valores, pd.Series) else valores, dtype=object)
+    # microsegundos: el rango de ns acaba en 2262
+    out = pd.Series(pd.NaT, index=col.index, dtype="datetime64[us]")
+    es_str = col.map(lambda v: isinstance(v, str))
+    s = col[es_str].astype(str).str.strip()
+    iso = s.str.fullmatch(_RE_ISO.pattern)
+    if iso.any():
+        out[iso[iso].index] = pd.to_datetime(s[iso], format="%Y-%m-%d", errors="coerce")
+    dmy = ~iso & s.str.fullmatch(_RE_DMY.pattern)
+    if dmy.any():
+        out[dmy[dmy].index] = pd.to_datetime(s[dmy], format="%d/%m/%Y", errors="coerce")
+    # ISO inválidas quedan NaT (igual que la escalar); lo demás, escalar
+    resto = col.index[~es_str].union(s.index[~iso & ~(dmy & out[s.index].notna())])
+    for i in resto:
+        v = col[i]
+        if v is None or v != v or v == "":
+            continue
+        iso_str = normalizar_fecha_dayfirst(v)
+        if iso_str:
+            out[i] = pd.Timestamp(iso_str)
+    return out
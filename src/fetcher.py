@@ -0,0 +1,277 @@
+# src/fetcher.py
+"""
+Capa de descarga HTTP compartida por los scrapers.
+- Una única requests.Session por proceso (keep-alive + pool de conexiones).
+- fetch_first(): lanza varias URLs candidatas en paralelo (ThreadPool) y devuelve
+  la primera válida en el orden de las candidatas (no la que antes llegue); las
+  posteriores a esa se cancelan.
+- fetch_many(): descarga varias URLs en paralelo y devuelve todas las válidas;
+  iter_fetch() hace lo mismo pero las va entregando según terminan.
+- fetch() hace peticiones condicionales contra la caché de disco (src/http_cache.py):
+  si el servidor responde 304 se devuelve el cuerpo guardado (resp.from_cache = True).
+- Modo record/replay (src/http_fixtures.py): graba todas las respuestas en un directorio
+  o las sirve desde él sin tocar la red, pasando por estas mismas funciones.
+- Deadline: presupuesto total de tiempo (por fuente) que se reparte entre candidatas;
+  los reintentos (errores de red, 5xx, 429) usan backoff con jitter dentro del presupuesto.
+- Las candidatas que dan 4xx o un cuerpo que no es CSV van a la caché negativa
+  (http_cache.mark_negative) y se saltan en ejecuciones posteriores.
+Variables de entorno:
+    FETCH_WORKERS (default: 8)   hilos para descargas concurrentes
+    FETCH_RETRIES (default: 2)   reintentos por petición
+    FETCH_BACKOFF (default: 0.5) segundos base del backoff exponencial
+    FETCH_RECORD_DIR / FETCH_REPLAY_DIR   ver set_mode()
+"""
+
+import os
+import math
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from src import http_cache, http_fixtures
+except Exception:
+    import http_cache
+    import http_fixtures
+
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"}
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 8))
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", 2))
+FETCH_BACKOFF = float(os.environ.get("FETCH_BACKOFF", 0.5))
+MIN_TIMEOUT = 1.0
+
+_session = None
+_session_lock = threading.Lock()
+
+RECORD_DIR = os.environ.get("FETCH_RECORD_DIR") or None
+REPLAY_DIR = os.environ.get("FETCH_REPLAY_DIR") or None
+
+
+def set_mode(record_dir: str = None, replay_dir: str = None):
+    """Activa la grabación de respuestas o su reproducción offline (no ambas)."""
+    global RECORD_DIR, REPLAY_DIR
+    if record_dir and replay_dir:
+        raise ValueError("record y replay son excluyentes")
+    RECORD_DIR = record_dir or None
+    REPLAY_DIR = replay_dir or None
+
+
+class Deadline:
+    """Presupuesto de tiempo total; seconds=None significa sin límite."""
+
+    def __init__(self, seconds: float = None):
+        self.end = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        if self.end is None:
+            return None
+        return max(0.0, self.end - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.end is not None and time.monotonic() >= self.end
+
+    def timeout(self, default: float, share: int = 1) -> float:
+        """Timeout por petición: el default, o la parte proporcional de lo que queda."""
+        rem = self.remaining()
+        if rem is None:
+            return default
+        return max(MIN_TIMEOUT, min(default, rem / max(1, share)))
+
+
+def get_session() -> requests.Session:
+    """Devuelve la sesión compartida (se crea la primera vez)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                s.headers.update(HEADERS)
+                _session = s
+    return _session
+
+
+def is_csv_response(resp: requests.Response) -> bool:
+    """Mismo criterio que el scraper original, descartando páginas HTML (login, errores)."""
+    if resp is None or resp.status_code != 200:
+        return False
+    text = resp.text
+    if text.lstrip()[:15].lower().startswith(("<!doctype", "<html")):
+        return False
+    return "," in text or "\n" in text
+
+
+def fetch(url: str, timeout: float = 15, deadline: Deadline = None) -> Optional[requests.Response]:
+    """
+    GET condicional con la sesión compartida. Devuelve None si falla la conexión.
+    Un 304 se transforma en la respuesta 200 guardada en caché.
+    Errores de red, 5xx y 429 se reintentan con backoff+jitter mientras quede presupuesto.
+    En modo replay no hay red: se devuelve la respuesta grabada (None si no existe).
+    """
+    if REPLAY_DIR:
+        return http_fixtures.replay(REPLAY_DIR, url)
+    deadline = deadline or Deadline()
+    resp = None
+    for attempt in range(FETCH_RETRIES + 1):
+        if deadline.expired():
+            break
+        resp = _fetch_network(url, deadline.timeout(timeout))
+        if resp is not None and resp.status_code < 500 and resp.status_code != 429:
+            break
+        if attempt < FETCH_RETRIES:
+            pause = FETCH_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            rem = deadline.remaining()
+            if rem is not None and pause >= rem:
+                break
+            time.sleep(pause)
+    if RECORD_DIR and resp is not None:
+        http_fixtures.record(RECORD_DIR, url, resp)
+    return resp
+
+
+def _fetch_network(url: str, timeout: float) -> Optional[requests.Response]:
+    try:
+        resp = get_session().get(url, timeout=timeout, headers=http_cache.conditional_headers(url))
+    except Exception:
+        return None
+    if resp.status_code == 304:
+        cached = http_cache.cached_response(url, resp)
+        if cached is not None:
+            return cached
+        # caché inconsistente: repetir sin cabeceras condicionales
+        try:
+            resp = get_session().get(url, timeout=timeout)
+        except Exception:
+            return None
+    resp.from_cache = False
+    http_cache.store(url, resp)
+    return resp
+
+
+def _fetch_candidate(u: str, accept: Callable[[requests.Response], bool],
+                     timeout: float, deadline: Deadline) -> Optional[str]:
+    """Descarga una candidata; si es un 4xx o no cumple `accept` se anota en la caché negativa."""
+    resp = fetch(u, timeout=timeout, deadline=deadline)
+    if resp is None:
+        return None
+    if accept(resp):
+        return resp.text
+    if not REPLAY_DIR:
+        if 400 <= resp.status_code < 500 and resp.status_code != 429:
+            http_cache.mark_negative(u, f"http_{resp.status_code}")
+        elif resp.status_code == 200:
+            http_cache.mark_negative(u, "not_csv")
+    return None
+
+
+def _live_candidates(urls: Iterable[str]) -> List[str]:
+    urls = list(dict.fromkeys(u for u in urls if u))
+    if REPLAY_DIR:
+        return urls
+    return [u for u in urls if not http_cache.is_negative(u)]
+
+
+def fetch_first(urls: Iterable[str],
+                accept: Callable[[requests.Response], bool] = is_csv_response,
+                timeout: float = 15,
+                max_workers: int = None,
+                deadline: Deadline = None) -> Optional[Tuple[str, str]]:
+    """
+    Descarga las URLs en paralelo y devuelve (url, texto) de la primera, en el orden de
+    `urls`, que cumpla `accept`: una respuesta válida que llega antes se guarda hasta que
+    todas las anteriores han fallado (las candidatas no tienen por qué ser el mismo dato,
+    p.ej. distintos gid). Las descargas posteriores a una ya válida no se empiezan o se
+    descartan. No espera más allá del deadline.
+    """
+    urls = _live_candidates(urls)
+    if not urls:
+        return None
+    deadline = deadline or Deadline()
+    workers = min(max_workers or FETCH_WORKERS, len(urls))
+    per_request = deadline.timeout(timeout, share=math.ceil(len(urls) / workers))
+    best = [len(urls)]   # índice de la primera candidata válida conocida
+
+    def _job(i, u):
+        if i > best[0] or deadline.expired():
+            return i, None
+        text = _fetch_candidate(u, accept, per_request, deadline)
+        if text is not None and i < best[0]:
+            best[0] = i
+        return i, text
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_job, i, u) for i, u in enumerate(urls)]
+        results = {}
+        nxt = 0   # primera candidata cuyo resultado aún no se conoce
+        try:
+            for fut in as_completed(futures, timeout=deadline.remaining()):
+                i, text = fut.result()
+                results[i] = text
+                while nxt in results:
+                    if results[nxt] is not None:
+                        return urls[nxt], results[nxt]
+                    nxt += 1
+        except FuturesTimeout:
+            pass
+        return None
+    finally:
+        best[0] = -1
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_fetch(urls: Iterable[str],
+               accept: Callable[[requests.Response], bool] = is_csv_response,
+               timeout: float = 15,
+               max_workers: int = None,
+               deadline: Deadline = None) -> Iterator[Tuple[str, str]]:
+    """
+    Descarga todas las URLs en paralelo y va generando (url, texto) de las respuestas
+    válidas según terminan, para poder parsear unas mientras llegan las otras.
+    Lo que no haya llegado al agotarse el deadline se descarta.
+    """
+    urls = _live_candidates(urls)
+    if not urls:
+        return
+    deadline = deadline or Deadline()
+    workers = min(max_workers or FETCH_WORKERS, len(urls))
+    per_request = deadline.timeout(timeout, share=math.ceil(len(urls) / workers))
+
+    def _job(u):
+        if deadline.expired():
+            return u, None
+        return u, _fetch_candidate(u, accept, per_request, deadline)
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_job, u) for u in urls]
+        try:
+            for fut in as_completed(futures, timeout=deadline.remaining()):
+                u, text = fut.result()
+                if text is not None:
+                    yield u, text
+        except FuturesTimeout:
+            pass
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def fetch_many(urls: Iterable[str],
+               accept: Callable[[requests.Response], bool] = is_csv_response,
+               timeout: float = 15,
+               max_workers: int = None,
+               deadline: Deadline = None) -> List[Tuple[str, str]]:
+    """
+    Descarga todas las URLs en paralelo. Devuelve [(url, texto)] de las respuestas
+    válidas, en el mismo orden en que se pasaron las URLs (ver iter_fetch).
+    """
+    urls = list(urls)
+    got = dict(iter_fetch(urls, accept, timeout, max_workers, deadline))
+    return [(u, got[u]) for u in dict.fromkeys(urls) if u in got]
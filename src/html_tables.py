@@ -0,0 +1,226 @@
+# src/html_tables.py
+"""
+Lectura de tablas HTML en una sola pasada y en streaming (sin construir el árbol).
+- iter_rows(): genera (nº_tabla, celdas) según se parsea el documento; cada celda es
+  el texto de <td>/<th> con los fragmentos unidos por espacios (igual que
+  BeautifulSoup get_text(" ", strip=True)).
+- iter_tables(): agrupa las filas por tabla y la entrega en cuanto se cierra su </table>
+  (en memoria solo las tablas abiertas); descarta sin acumularlas las tablas que no
+  parecen de sorteos (ninguna fila con fecha + números en las primeras PROBE_ROWS).
+- check_backends(): compara la salida de los dos backends (python -m src.bench tables).
+Usa lxml (iterparse) si está instalado y, si no, un html.parser.HTMLParser mínimo que
+se alimenta por bloques.
+"""
+
+import re
+from html.parser import HTMLParser
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from lxml import etree
+    HAS_LXML = True
+except Exception:
+    etree = None
+    HAS_LXML = False
+
+PROBE_ROWS = 50
+MIN_INTS = 8      # fecha (2-3 enteros) + 6 números
+CHUNK_SIZE = 1 << 16
+
+_INT_RE = re.compile(r"\d+")
+
+
+def _cell_text(fragments: Iterable[str]) -> str:
+    return " ".join(t for t in (f.strip() for f in fragments) if t)
+
+
+# ------------------------- backend html.parser -----------------------------
+class _RowParser(HTMLParser):
+    """
+    Acumula en self.rows las filas (nº_tabla, celdas) completadas desde el último feed,
+    más (nº_tabla, None) al cerrarse cada tabla.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows: List[Tuple[int, Optional[List[str]]]] = []
+        self._tables: List[int] = []   # pila de tablas abiertas (anidadas)
+        self._n_tables = 0
+        self._row = None
+        self._cell = None
+        self._in_data = False   # un mismo nodo de texto puede llegar partido entre dos feed()
+
+    def handle_starttag(self, tag, attrs):
+        self._in_data = False
+        if tag == "table":
+            self._tables.append(self._n_tables)
+            self._n_tables += 1
+        elif not self._tables:
+            return
+        elif tag == "tr":
+            self._close_row()
+            self._row = []
+        elif tag in ("td", "th"):
+            self._close_cell()
+            if self._row is None:
+                self._row = []
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        self._in_data = False
+        if tag in ("td", "th"):
+            self._close_cell()
+        elif tag == "tr":
+            self._close_row()
+        elif tag == "table" and self._tables:
+            self._close_row()
+            self.rows.append((self._tables.pop(), None))
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            if self._in_data and self._cell:
+                self._cell[-1] += data
+            else:
+                self._cell.append(data)
+            self._in_data = True
+
+    def _close_cell(self):
+        if self._cell is not None and self._row is not None:
+            self._row.append(_cell_text(self._cell))
+        self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row is not None and self._tables:
+            self.rows.append((self._tables[-1], self._row))
+        self._row = None
+
+
+def _iter_rows_htmlparser(html_text: str) -> Iterator[Tuple[int, Optional[List[str]]]]:
+    parser = _RowParser()
+    for i in range(0, len(html_text), CHUNK_SIZE):
+        parser.feed(html_text[i:i + CHUNK_SIZE])
+        if parser.rows:
+            yield from parser.rows
+            parser.rows = []
+    parser.close()
+    parser._close_row()
+    yield from parser.rows
+
+
+# ----------------------------- backend lxml --------------------------------
+def _iter_rows_lxml(html_text: str) -> Iterator[Tuple[int, Optional[List[str]]]]:
+    tables: List[int] = []
+    n_tables = 0
+    row = None
+    data = BytesIO(html_text.encode("utf-8"))
+    for event, el in etree.iterparse(data, events=("start", "end"), html=True,
+                                     encoding="utf-8", tag=("table", "tr", "td", "th")):
+        tag = el.tag
+        if event == "start":
+            if tag == "table":
+                tables.append(n_tables)
+                n_tables += 1
+            elif tag == "tr" and tables:
+                row = []
+            continue
+        if tag in ("td", "th"):
+            if row is not None:
+                row.append(_cell_text(el.itertext()))
+            el.clear(keep_tail=True)
+        elif tag == "tr":
+            if row is not None and tables:
+                yield tables[-1], row
+            row = None
+            # liberar las filas ya leídas para no mantener el documento en memoria
+            el.clear(keep_tail=True)
+            parent = el.getparent()
+            if parent is not None:
+                while el.getprevious() is not None:
+                    del parent[0]
+        elif tag == "table" and tables:
+            yield tables.pop(), None
+
+
+BACKENDS = ("lxml", "htmlparser")
+
+
+def _iter_events(html_text: str, backend: str = None) -> Iterator[Tuple[int, Optional[List[str]]]]:
+    """Filas (nº_tabla, celdas) y cierres de tabla (nº_tabla, None), en orden."""
+    backend = backend or ("lxml" if HAS_LXML else "htmlparser")
+    if backend not in BACKENDS:
+        raise ValueError(f"backend desconocido: {backend}")
+    if backend == "lxml" and not HAS_LXML:
+        raise RuntimeError("lxml no está instalado")
+    if not html_text:
+        return iter(())
+    if backend == "lxml":
+        return _iter_rows_lxml(html_text)
+    return _iter_rows_htmlparser(html_text)
+
+
+def iter_rows(html_text: str, backend: str = None) -> Iterator[Tuple[int, List[str]]]:
+    """(nº_tabla, celdas) de todas las filas del documento, en orden."""
+    return ((k, cells) for k, cells in _iter_events(html_text, backend) if cells is not None)
+
+
+# ------------------------- agrupado por tabla ------------------------------
+def looks_like_draw(cells: List[str]) -> bool:
+    """Fila candidata a sorteo: suma al menos MIN_INTS enteros entre todas sus celdas."""
+    n = 0
+    for c in cells:
+        n += len(_INT_RE.findall(c))
+        if n >= MIN_INTS:
+            return True
+    return False
+
+
+def iter_tables(html_text: str, backend: str = None) -> Iterator[Tuple[int, List[List[str]]]]:
+    """
+    (nº_tabla, filas) de las tablas que parecen de sorteos, en orden de cierre (el de
+    aparición salvo tablas anidadas). Cada tabla se entrega y se suelta al leer su
+    </table>; las que no llegan a cerrarse, al final del documento. Una tabla se descarta
+    si en sus primeras PROBE_ROWS filas no hay ninguna que lo parezca; a partir de ahí sus
+    filas se ignoran sin guardarlas.
+    """
+    rows_by_table: Dict[int, List[List[str]]] = {}
+    state: Dict[int, Optional[bool]] = {}   # nº_tabla -> True (aceptada) / False (descartada) / None (en prueba)
+    for k, cells in _iter_events(html_text, backend):
+        if cells is None:
+            rows = rows_by_table.pop(k, None)
+            if state.pop(k, None):
+                yield k, rows
+            continue
+        st = state.get(k)
+        if st is False:
+            continue
+        if k not in state:
+            state[k] = None
+            rows_by_table[k] = []
+        rows_by_table[k].append(cells)
+        if st is None:
+            if looks_like_draw(cells):
+                state[k] = True
+            elif len(rows_by_table[k]) >= PROBE_ROWS:
+                state[k] = False
+                del rows_by_table[k]
+    for k in sorted(rows_by_table):
+        if state.get(k):
+            yield k, rows_by_table.pop(k)
+
+
+def check_backends(html_text: str) -> Dict[str, Any]:
+    """
+    Compara iter_tables() con lxml y con html.parser sobre el mismo documento.
+    {"ok", "tables", "rows"} o, sin lxml, {"ok": None, "skipped": ...}.
+    """
+    if not HAS_LXML:
+        return {"ok": None, "skipped": "lxml no está instalado"}
+    ref = list(iter_tables(html_text, "htmlparser"))
+    got = list(iter_tables(html_text, "lxml"))
+    out = {"ok": got == ref, "tables": len(ref), "rows": sum(len(rows) for _, rows in ref)}
+    if got != ref:
+        out["lxml"] = [(k, len(rows)) for k, rows in got]
+        out["htmlparser"] = [(k, len(rows)) for k, rows in ref]
+    return out
@@ -0,0 +1,233 @@
+# src/http_cache.py
+"""
+Caché HTTP persistente en disco (data/http_cache) para las exportaciones de las hojas.
+- Guarda por URL el cuerpo comprimido (gzip) + ETag / Last-Modified / hash del contenido.
+- conditional_headers(): cabeceras If-None-Match / If-Modified-Since para la petición.
+- Si el servidor responde 304 se sirve el cuerpo guardado sin volver a descargarlo.
+- cached_parse(): memoiza el resultado de parseo por hash de contenido, de modo que
+  si la hoja no ha cambiado no se vuelve a parsear. La clave incluye un hash del código
+  de los módulos de parseo (PARSER_MODULES): cualquier cambio en ellos invalida lo memoizado.
+- Caché negativa (negative.json): URLs candidatas que devolvieron 4xx o un cuerpo que
+  no es CSV se saltan durante NEGATIVE_TTL_HOURS.
+Variables de entorno:
+    HTTP_CACHE_DIR (default: data/http_cache)
+    HTTP_CACHE     (default: 1; 0 para desactivar)
+    NEGATIVE_TTL_HOURS (default: 24)
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Union
+
+import requests
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", os.path.join(BASE, "data", "http_cache"))
+PARSED_DIR = os.path.join(CACHE_DIR, "parsed")
+ENABLED = os.environ.get("HTTP_CACHE", "1") not in ("0", "false", "no")
+NEGATIVE_FILE = os.path.join(CACHE_DIR, "negative.json")
+NEGATIVE_TTL_HOURS = float(os.environ.get("NEGATIVE_TTL_HOURS", 24))
+
+_negative_lock = threading.Lock()
+_negative = None
+
+# subir para invalidar a mano los resultados memoizados (los cambios de código en
+# PARSER_MODULES ya los invalidan solos vía parser_fingerprint())
+PARSE_VERSION = 2
+PARSER_MODULES = ("scraper_mongo.py", "table_parser.py", "html_tables.py", "fechas.py")
+_fingerprint = None
+
+
+def set_enabled(flag: bool):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def content_hash(text: Union[str, bytes]) -> str:
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.sha256(text).hexdigest()
+
+
+def parser_fingerprint() -> str:
+    """sha1 (12 hex) de PARSE_VERSION + el código de PARSER_MODULES; se calcula una vez por proceso."""
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha1(str(PARSE_VERSION).encode("utf-8"))
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in PARSER_MODULES:
+            try:
+                with open(os.path.join(here, name), "rb") as f:
+                    h.update(f.read())
+            except OSError:
+                h.update(name.encode("utf-8"))
+        _fingerprint = h.hexdigest()[:12]
+    return _fingerprint
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def load_meta(url: str) -> Union[Dict[str, Any], None]:
+    if not ENABLED:
+        return None
+    path = os.path.join(CACHE_DIR, f"{_key(url)}.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def conditional_headers(url: str) -> Dict[str, str]:
+    meta = load_meta(url)
+    if not meta:
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def store(url: str, resp: requests.Response):
+    """Guarda una respuesta 200 (cuerpo gzip + metadatos)."""
+    if not ENABLED or resp is None or resp.status_code != 200:
+        return
+    key = _key(url)
+    body = resp.content
+    meta = {
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "encoding": resp.encoding,
+        "content_type": resp.headers.get("Content-Type"),
+        "sha256": content_hash(body),
+        "fetched_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    try:
+        _atomic_write(os.path.join(CACHE_DIR, f"{key}.body.gz"), gzip.compress(body))
+        _atomic_write(os.path.join(CACHE_DIR, f"{key}.json"),
+                      json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+    except Exception as e:
+        print(f"[http_cache] no se pudo guardar {url}: {e}")
+
+
+def cached_response(url: str, resp_304: requests.Response = None) -> Union[requests.Response, None]:
+    """Reconstruye una respuesta 200 a partir de lo guardado (tras un 304)."""
+    meta = load_meta(url)
+    if not meta:
+        return None
+    try:
+        with open(os.path.join(CACHE_DIR, f"{_key(url)}.body.gz"), "rb") as f:
+            body = gzip.decompress(f.read())
+    except Exception:
+        return None
+    resp = requests.Response()
+    resp.status_code = 200
+    resp.url = url
+    resp._content = body
+    resp.encoding = meta.get("encoding")
+    if resp_304 is not None:
+        resp.headers.update(resp_304.headers)
+    if meta.get("content_type"):
+        resp.headers["Content-Type"] = meta["content_type"]
+    resp.from_cache = True
+    return resp
+
+
+# ----------------- memoización de parseo por hash de contenido -------------
+def cached_parse(kind: str, text: str, juego_name: str,
+                 parse_fn: Callable[[str, str], List[dict]], variant: str = "") -> List[dict]:
+    """
+    Devuelve parse_fn(text, juego_name), reutilizando el resultado guardado si
+    ya se parseó exactamente el mismo contenido (mismo hash) con el mismo parser (mismo
+    parser_fingerprint()).
+    `variant` distingue parseos parciales del mismo contenido (p.ej. incremental desde una fecha).
+    """
+    if not ENABLED or not text:
+        return parse_fn(text, juego_name)
+    h = content_hash(f"{kind}:{parser_fingerprint()}:{juego_name}:{variant}:".encode("utf-8") + text.encode("utf-8"))
+    path = os.path.join(PARSED_DIR, f"{h}.json.gz")
+    if os.path.exists(path):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                res = json.load(f)
+            os.utime(path)
+            return res
+        except Exception:
+            pass
+    res = parse_fn(text, juego_name)
+    try:
+        _atomic_write(path, gzip.compress(json.dumps(res, ensure_ascii=False).encode("utf-8")))
+    except Exception as e:
+        print(f"[http_cache] no se pudo guardar parseo {kind}: {e}")
+    return res
+
+
+def prune_parsed(max_age_days: int = 30) -> int:
+    """Borra parseos memoizados que no se han usado en max_age_days. Devuelve nº borrados."""
+    if not os.path.isdir(PARSED_DIR):
+        return 0
+    limit = datetime.now().timestamp() - max_age_days * 86400
+    n = 0
+    for name in os.listdir(PARSED_DIR):
+        path = os.path.join(PARSED_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+                n += 1
+        except OSError:
+            continue
+    return n
+
+
+# ----------------- caché negativa de URLs muertas --------------------------
+def _load_negative() -> Dict[str, Dict[str, Any]]:
+    global _negative
+    if _negative is None:
+        try:
+            with open(NEGATIVE_FILE, "r", encoding="utf-8") as f:
+                _negative = json.load(f)
+        except Exception:
+            _negative = {}
+    return _negative
+
+
+def is_negative(url: str) -> bool:
+    """True si la URL falló hace menos de NEGATIVE_TTL_HOURS."""
+    if not ENABLED:
+        return False
+    with _negative_lock:
+        entry = _load_negative().get(url)
+    return bool(entry) and entry.get("until", 0) > datetime.now().timestamp()
+
+
+def mark_negative(url: str, reason: str):
+    if not ENABLED or NEGATIVE_TTL_HOURS <= 0:
+        return
+    now = datetime.now().timestamp()
+    with _negative_lock:
+        neg = _load_negative()
+        # de paso se purgan las entradas caducadas
+        for u in [u for u, e in neg.items() if e.get("until", 0) <= now]:
+            neg.pop(u, None)
+        neg[url] = {"reason": reason, "until": now + NEGATIVE_TTL_HOURS * 3600}
+        try:
+            _atomic_write(NEGATIVE_FILE, json.dumps(neg, ensure_ascii=False, indent=2).encode("utf-8"))
+        except Exception as e:
+            print(f"[http_cache] no se pudo guardar caché negativa: {e}")
@@ -0,0 +1,89 @@
+# src/http_fixtures.py
+"""
+Almacén de fixtures HTTP para grabar y reproducir scrapes sin red.
+- record(): guarda cada respuesta (status, cabeceras, cuerpo gzip) en un directorio.
+- replay(): devuelve la respuesta grabada para una URL (o None si no existe).
+El directorio lleva un index.json {url: clave} para poder listar lo grabado.
+Lo usa src/fetcher.py cuando se activa con set_mode() o con las variables de entorno:
+    FETCH_RECORD_DIR   graba todas las respuestas en ese directorio
+    FETCH_REPLAY_DIR   sirve las respuestas desde ese directorio (sin red)
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Dict, Union
+
+import requests
+
+_index_lock = threading.Lock()
+
+
+def _key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _index_path(directory: str) -> str:
+    return os.path.join(directory, "index.json")
+
+
+def load_index(directory: str) -> Dict[str, Any]:
+    try:
+        with open(_index_path(directory), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def record(directory: str, url: str, resp: requests.Response):
+    """Graba la respuesta efectiva (tras caché/304) de una URL."""
+    if resp is None:
+        return
+    key = _key(url)
+    os.makedirs(directory, exist_ok=True)
+    meta = {
+        "url": url,
+        "status_code": resp.status_code,
+        "encoding": resp.encoding,
+        "headers": {k: v for k, v in resp.headers.items()
+                    if k.lower() in ("content-type", "etag", "last-modified")},
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(directory, f"{key}.body.gz"), "wb") as f:
+        f.write(gzip.compress(resp.content or b""))
+    with open(os.path.join(directory, f"{key}.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    with _index_lock:
+        index = load_index(directory)
+        index[url] = {"key": key, "status_code": resp.status_code, "bytes": len(resp.content or b"")}
+        tmp = f"{_index_path(directory)}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, _index_path(directory))
+
+
+def replay(directory: str, url: str) -> Union[requests.Response, None]:
+    key = _key(url)
+    try:
+        with open(os.path.join(directory, f"{key}.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, f"{key}.body.gz"), "rb") as f:
+            body = gzip.decompress(f.read())
+    except Exception:
+        return None
+    resp = requests.Response()
+    resp.status_code = meta.get("status_code", 200)
+    resp.url = url
+    resp._content = body
+    resp.encoding = meta.get("encoding")
+    resp.headers.update(meta.get("headers") or {})
+    resp.from_cache = False
+    return resp
+
+
+def read_body(directory: str, url: str) -> Union[str, None]:
+    resp = replay(directory, url)
+    return resp.text if resp is not None else None
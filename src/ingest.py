@@ -0,0 +1,153 @@
+# src/ingest.py
+"""
+Construcción de documentos de Mongo para sorteos, común a scraper_mongo y etl.
+Documento: {_id: "YYYY-MM-DD:n1,n2,...", juego, fecha, numeros, complementario, reintegro, fuente}
+(sin fecha -> "no_fecha", sin números -> "no_nums").
+- docs_from_batch(): de un DrawBatch en una pasada en bloque: fechas ya en días (una
+  conversión por columna), _id concatenando columnas de cadenas y los -1 -> None en bloque.
+- docs_from_frame() / docs_from_dicts(): pasan primero a DrawBatch (fechas normalizadas
+  una vez por valor distinto) y luego igual.
+- iter_docs(): lo mismo por trozos, para fuentes en streaming.
+- doc_from_row(): la versión fila a fila de siempre (referencia del benchmark
+  `python -m src.bench docs` y para construir un documento suelto).
+"""
+
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src import fechas
+    from src.draws import DrawBatch, NO_FECHA
+except Exception:
+    import fechas
+    from draws import DrawBatch, NO_FECHA
+
+DOCS_CHUNK = 1000
+
+
+def doc_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normaliza fila/registro a documento de Mongo listo para insertar.
+    Se espera keys: juego, fecha (YYYY-MM-DD o parseable), n1..n6 OR 'numeros' list, complementario, reintegro, fuente
+    Genera _id = "YYYY-MM-DD:3,15,23,26,34,38"
+    """
+    nums = []
+    if "numeros" in row and row.get("numeros"):
+        nums = [int(x) for x in row.get("numeros")]
+    else:
+        for i in range(1, 7):
+            v = row.get(f"n{i}")
+            if v is not None and str(v).strip() != "":
+                try:
+                    nums.append(int(v))
+                except Exception:
+                    pass
+
+    fecha = row.get("fecha")
+    fecha_norm = None
+    if fecha:
+        try:
+            fecha_norm = fechas.normalizar_fecha_dayfirst(fecha)
+        except Exception:
+            fecha_norm = None
+
+    nums = [int(x) for x in nums][:6]
+    clave_nums = ",".join(str(x) for x in nums) if nums else "no_nums"
+    _id = f"{fecha_norm if fecha_norm else 'no_fecha'}:{clave_nums}"
+
+    return {
+        "_id": _id,
+        "juego": row.get("juego", ""),
+        "fecha": fecha_norm,
+        "numeros": nums,
+        "complementario": int(row.get("complementario")) if row.get("complementario") not in (None, "", "nan") else None,
+        "reintegro": int(row.get("reintegro")) if row.get("reintegro") not in (None, "", "nan") else None,
+        "fuente": row.get("fuente", ""),
+    }
+
+
+def _docs_rowwise(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    docs = []
+    for r in rows:
+        try:
+            docs.append(doc_from_row(r))
+        except Exception:
+            continue
+    return docs
+
+
+def _optional(col: np.ndarray) -> List[Union[int, None]]:
+    out = np.asarray(col).astype(object)
+    out[np.asarray(col) < 0] = None
+    return out.tolist()
+
+
+def docs_from_batch(batch: DrawBatch) -> List[Dict[str, Any]]:
+    """Documentos de todas las filas de `batch` (mismo resultado que doc_from_row fila a fila)."""
+    n = len(batch)
+    if not n:
+        return []
+    nums = np.asarray(batch.numeros).astype(np.int64)
+    present = nums >= 0  # los números que faltan están siempre a la derecha
+    # números pequeños: tabla número -> str y concatenación de columnas de objetos
+    tabla = np.array([str(i) for i in range(max(int(nums.max()), 0) + 1)], dtype=object)
+    strs = tabla[np.where(present, nums, 0)]
+    clave = strs[:, 0]
+    for j in range(1, nums.shape[1]):
+        clave = np.where(present[:, j], clave + "," + strs[:, j], clave)
+    clave = np.where(present[:, 0], clave, "no_nums")
+
+    dias = np.asarray(batch.fecha)
+    sin_fecha = dias == NO_FECHA
+    fecha = np.where(sin_fecha, 0, dias).astype("datetime64[D]").astype(str).astype(object)
+    ids = np.where(sin_fecha, "no_fecha", fecha) + ":" + clave
+    fecha[sin_fecha] = None
+
+    n_nums = present.sum(axis=1).tolist()
+    fuente = batch.fuente.tolist() if batch.fuente is not None else [""] * n
+    return [
+        {"_id": _id, "juego": juego, "fecha": f, "numeros": row[:k], "complementario": c, "reintegro": r, "fuente": fu}
+        for _id, juego, f, row, k, c, r, fu in zip(
+            ids.tolist(), np.asarray(batch.juego).tolist(), fecha.tolist(), nums.tolist(), n_nums,
+            _optional(batch.complementario), _optional(batch.reintegro), fuente)
+    ]
+
+
+def docs_from_frame(df: pd.DataFrame, juego: str = "") -> List[Dict[str, Any]]:
+    """DataFrame fecha, n1..n6[, complementario, reintegro, juego, fuente] (processed CSV)."""
+    return docs_from_batch(DrawBatch.from_frame(df, juego=juego))
+
+
+def docs_from_dicts(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Dicts del scraper ({juego, fecha, numeros, ...}) o filas n1..n6."""
+    rows = list(rows)
+    if not rows:
+        return []
+    try:
+        if "numeros" not in rows[0] and "n1" in rows[0]:
+            return docs_from_frame(pd.DataFrame(rows))
+        return docs_from_batch(DrawBatch.from_dicts(rows, normalize_fecha=True))
+    except (TypeError, ValueError):
+        # datos sucios (números no enteros...): fila a fila, descartando las que fallen
+        return _docs_rowwise(rows)
+
+
+def build_docs(data: Union[DrawBatch, pd.DataFrame, Iterable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    if isinstance(data, DrawBatch):
+        return docs_from_batch(data)
+    if isinstance(data, pd.DataFrame):
+        return docs_from_frame(data)
+    return docs_from_dicts(data)
+
+
+def iter_docs(rows: Iterable[Dict[str, Any]], chunk: int = DOCS_CHUNK) -> Iterator[Dict[str, Any]]:
+    """Como docs_from_dicts pero por trozos de `chunk` filas, sin materializar toda la entrada."""
+    it = iter(rows)
+    while True:
+        part = list(islice(it, chunk))
+        if not part:
+            return
+        yield from docs_from_dicts(part)
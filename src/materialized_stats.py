@@ -0,0 +1,354 @@
+# src/materialized_stats.py
+"""
+Estadísticas materializadas por juego en la colección stats_{prefix} (un documento de
+unos pocos KB, _id "numeros"), para que las features de predicción y los informes no
+recorran el histórico:
+    n_draws, fecha_min, fecha_max   sorteos con fecha contados
+    counts[49]                      apariciones de cada número (índice 0 = número 1)
+    last_seen[49] / last_idx[49]    fecha y posición (0..n_draws-1) de la última aparición
+    gap[49]                         sorteos desde la última aparición (0 = salió en el último)
+    windows {"K": [49]}             apariciones en los últimos K sorteos (STATS_WINDOWS)
+    last_draw                       números del último sorteo
+- on_upsert(): lo llama repository.MongoRepository después de cada upsert. Si lo escrito son
+  solo sorteos nuevos posteriores a fecha_max, se suman al documento (más una consulta de
+  los últimos max(K) sorteos para las ventanas): coste O(nuevos), no O(histórico).
+  Cualquier otra cosa (altas con fecha antigua, ediciones, documento ausente o escrito
+  a la vez por otro proceso) reconstruye.
+- deferred(): para cargas masivas (backfill por páginas): dentro del bloque los upserts no
+  tocan stats_{prefix} y al salir se reconstruye una sola vez si hubo escrituras.
+- rebuild(): recalcula desde el histórico y, con check=True, solo informa de las
+  diferencias con lo materializado (deriva del estado incremental).
+- window_features(): el vector de predict_sklearn.build_last_feature leído del documento.
+Otros escritores (db_2.insertar_historico) no lo actualizan: después, rebuild.
+Variables de entorno:
+    STATS_WINDOWS (default: 8,10,50,200) valores de K (8 = WINDOW_K de predict_sklearn)
+    STATS_INCREMENTAL (default: 1)       0 = no tocar stats_{prefix} en los upserts
+    STATS_MAX_NEW (default: 1000)        más sorteos nuevos que esto en un upsert -> rebuild
+    MONGO_URI, MONGO_DB (como src/etl.py)
+
+Uso:
+  python -m src.materialized_stats show --name primitiva
+  python -m src.materialized_stats rebuild --name primitiva --check   # solo informa de la deriva
+  python -m src.materialized_stats rebuild --name primitiva
+"""
+
+import os
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Union
+
+import numpy as np
+
+try:
+    from src import mongo_pool, mongo_queries
+    from src.draws import DrawBatch, NO_FECHA
+except Exception:
+    import mongo_pool
+    import mongo_queries
+    from draws import DrawBatch, NO_FECHA
+
+NUM_MAX = 49
+# 8 = predict_sklearn.WINDOW_K: sin él, FEATURES_SOURCE=stats nunca encuentra su ventana
+WINDOWS = [int(k) for k in os.environ.get("STATS_WINDOWS", "8,10,50,200").split(",") if k.strip()]
+INCREMENTAL = os.environ.get("STATS_INCREMENTAL", "1") != "0"
+MAX_NEW = int(os.environ.get("STATS_MAX_NEW", 1000))
+STATS_ID = "numeros"
+_deferred: Dict[str, Dict[str, Any]] = {}
+_deferred_lock = threading.Lock()
+_FIELDS = ("n_draws", "fecha_min", "fecha_max", "counts", "last_seen", "last_idx", "gap", "windows", "last_draw")
+
+
+def get_stats_collection(prefix: str):
+    return mongo_pool.get_collection(f"stats_{prefix}", mongo_queries.MONGO_DB, mongo_queries.MONGO_URI)
+
+
+# ------------------------------- cálculo -----------------------------------
+def _positions(batch: DrawBatch, num_max: int, offset: int = 0):
+    """(fila + offset, número - 1) de cada número válido del lote."""
+    nums = np.asarray(batch.numeros, dtype=np.int64)
+    valid = (nums >= 1) & (nums <= num_max)
+    rows = np.broadcast_to(np.arange(len(nums))[:, None], nums.shape)
+    return rows[valid] + offset, nums[valid] - 1
+
+
+def _window_counts(tail: DrawBatch, windows: List[int], num_max: int) -> Dict[str, List[int]]:
+    rows, cols = _positions(tail, num_max)
+    n = len(tail)
+    return {str(k): np.bincount(cols[rows >= n - k], minlength=num_max).tolist() for k in windows}
+
+
+def _finish(doc: Dict[str, Any], counts: np.ndarray, last_idx: np.ndarray, last_seen: List, tail: DrawBatch,
+            windows: List[int], num_max: int) -> Dict[str, Any]:
+    n = doc["n_draws"]
+    doc["counts"] = counts.tolist()
+    doc["last_idx"] = last_idx.tolist()
+    doc["last_seen"] = last_seen
+    doc["gap"] = [int(n - 1 - i) if i >= 0 else None for i in last_idx.tolist()]
+    doc["windows"] = _window_counts(tail, windows, num_max)
+    doc["last_draw"] = sorted(int(x) for x in tail.numeros[-1] if 1 <= x <= num_max) if len(tail) else []
+    doc["num_max"] = num_max
+    doc["updated_at"] = datetime.now()
+    return doc
+
+
+def _dated(batch: DrawBatch) -> DrawBatch:
+    return batch.take(np.flatnonzero(np.asarray(batch.fecha) != NO_FECHA)).sort_by_fecha(descending=False)
+
+
+def compute(batch: DrawBatch, windows: List[int] = None, num_max: int = NUM_MAX) -> Dict[str, Any]:
+    """Documento de estadísticas de todo `batch` (los sorteos sin fecha no cuentan)."""
+    windows = windows or WINDOWS
+    b = _dated(batch)
+    rows, cols = _positions(b, num_max)
+    last_idx = np.full(num_max, -1, dtype=np.int64)
+    np.maximum.at(last_idx, cols, rows)
+    isos = b.fechas_iso()
+    doc = {"_id": STATS_ID, "n_draws": len(b),
+           "fecha_min": isos[0] if isos else None, "fecha_max": isos[-1] if isos else None}
+    last_seen = [isos[i] if i >= 0 else None for i in last_idx.tolist()]
+    return _finish(doc, np.bincount(cols, minlength=num_max), last_idx, last_seen,
+                   b.take(np.arange(max(len(b) - max(windows), 0), len(b))), windows, num_max)
+
+
+def apply_new(doc: Dict[str, Any], new: DrawBatch, tail: DrawBatch, windows: List[int] = None) -> Dict[str, Any]:
+    """
+    `doc` más los sorteos `new` (todos posteriores a doc["fecha_max"]). `tail` son los
+    últimos max(K) sorteos ya con los nuevos (para las ventanas y el último sorteo).
+    """
+    windows = windows or WINDOWS
+    num_max = doc.get("num_max", NUM_MAX)
+    b = _dated(new)
+    rows, cols = _positions(b, num_max, offset=doc["n_draws"])
+    counts = np.asarray(doc["counts"], dtype=np.int64) + np.bincount(cols, minlength=num_max)
+    last_idx = np.asarray(doc["last_idx"], dtype=np.int64)
+    np.maximum.at(last_idx, cols, rows)
+    isos = b.fechas_iso()
+    last_seen = [isos[i - doc["n_draws"]] if i >= doc["n_draws"] else old
+                 for i, old in zip(last_idx.tolist(), doc["last_seen"])]
+    out = {"_id": STATS_ID, "n_draws": doc["n_draws"] + len(b),
+           "fecha_min": doc.get("fecha_min") or (isos[0] if isos else None),
+           "fecha_max": isos[-1] if isos else doc.get("fecha_max")}
+    return _finish(out, counts, last_idx, last_seen, _dated(tail), windows, num_max)
+
+
+def diff(stored: Dict[str, Any], fresh: Dict[str, Any]) -> Dict[str, Any]:
+    """{campo: nº de posiciones distintas (o el par de valores)} entre dos documentos."""
+    out = {}
+    for k in _FIELDS:
+        a, b = (stored or {}).get(k), fresh.get(k)
+        if k == "windows":
+            a = a or {}
+            for w in b:
+                n = sum(x != y for x, y in zip(a.get(w) or [None] * len(b[w]), b[w]))
+                if n:
+                    out[f"windows.{w}"] = n
+        elif isinstance(b, list) and k != "last_draw" and isinstance(a, list) and len(a) == len(b):
+            n = sum(x != y for x, y in zip(a, b))
+            if n:
+                out[k] = n
+        elif a != b:
+            out[k] = [a, b]
+    return out
+
+
+# -------------------------------- Mongo ------------------------------------
+def load(prefix: str) -> Union[Dict[str, Any], None]:
+    return get_stats_collection(prefix).find_one({"_id": STATS_ID})
+
+
+def rebuild(prefix: str, check: bool = False, windows: List[int] = None) -> Dict[str, Any]:
+    """Recalcula desde la colección de sorteos; con check=True no escribe, solo compara."""
+    fresh = compute(DrawBatch.from_dicts(mongo_queries.draws_between(prefix)), windows)
+    drift = diff(load(prefix), fresh)
+    if not check:
+        fresh["mode"] = "rebuild"
+        get_stats_collection(prefix).replace_one({"_id": STATS_ID}, fresh, upsert=True)
+    return {"ok": not drift, "n_draws": fresh["n_draws"], "fecha_max": fresh["fecha_max"], "drift": drift,
+            "written": not check}
+
+
+class Tracker:
+    """
+    Acompaña a un upsert: watch() deja pasar los documentos y se queda con los posteriores
+    a fecha_max; finish(resumen) actualiza stats_{prefix} (o reconstruye si no cuadra).
+    Si ya se sabe que habrá que reconstruir (sin documento, otras ventanas o más de
+    MAX_NEW sorteos nuevos) no se guarda nada: el upsert sigue en streaming.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.doc = load(prefix)
+        self.fecha_max = (self.doc or {}).get("fecha_max") or ""
+        self.nuevos: Dict[str, Dict[str, Any]] = {}
+        self.forced: Union[str, None] = None   # motivo de reconstrucción ya conocido
+        if self.doc is None or set(str(k) for k in WINDOWS) - set(self.doc.get("windows") or {}):
+            self.forced = "sin estadísticas previas o con otras ventanas"
+
+    def watch(self, docs: Iterable[Dict[str, Any]]):
+        for d in docs:
+            if self.forced is None:
+                fecha = d.get("fecha")
+                if isinstance(fecha, str) and fecha > self.fecha_max:
+                    self.nuevos[d["_id"]] = d
+                    if len(self.nuevos) > MAX_NEW:
+                        self.forced = f"más de {MAX_NEW} sorteos nuevos"
+                        self.nuevos.clear()
+            yield d
+
+    def _reason(self, summary: Dict[str, Any]) -> Union[str, None]:
+        if self.forced:
+            return self.forced
+        if not summary.get("ok"):
+            return "upsert con errores"
+        if summary.get("modified_count"):
+            return "sorteos existentes modificados"
+        # las altas tienen que ser exactamente los sorteos posteriores a fecha_max: un alta
+        # antigua o un "nuevo" que ya estaba en Mongo (stats atrasadas) obligan a reconstruir
+        if set(summary.get("upserted_ids") or ()) != set(self.nuevos):
+            return "altas distintas de los sorteos posteriores a la última fecha"
+        return None
+
+    def finish(self, summary: Dict[str, Any]) -> Union[Dict[str, Any], None]:
+        if not (summary.get("upserted_count") or summary.get("modified_count")):
+            return None
+        reason = self._reason(summary)
+        if reason is None:
+            tail = DrawBatch.from_dicts(mongo_queries.last_draws(self.prefix, max(WINDOWS)))
+            new = apply_new(self.doc, DrawBatch.from_dicts(self.nuevos.values()), tail)
+            new["mode"] = "incremental"
+            # solo si nadie lo cambió desde que se leyó
+            res = get_stats_collection(self.prefix).replace_one(
+                {"_id": STATS_ID, "n_draws": self.doc["n_draws"], "fecha_max": self.doc.get("fecha_max")}, new)
+            if res.matched_count:
+                return {"mode": "incremental", "added": len(self.nuevos), "n_draws": new["n_draws"]}
+            reason = "stats modificadas por otro proceso"
+        print(f"[stats] {self.prefix}: reconstrucción ({reason})")
+        res = rebuild(self.prefix)
+        return {"mode": "rebuild", "reason": reason, "n_draws": res["n_draws"]}
+
+
+class _Deferred:
+    """Sustituto de Tracker dentro de deferred(): solo cuenta las escrituras."""
+
+    def __init__(self, prefix: str, state: Dict[str, Any]):
+        self.prefix = prefix
+        self.state = state
+
+    def watch(self, docs: Iterable[Dict[str, Any]]):
+        return docs
+
+    def finish(self, summary: Dict[str, Any]) -> Union[Dict[str, Any], None]:
+        n = (summary.get("upserted_count") or 0) + (summary.get("modified_count") or 0)
+        if not n:
+            return None
+        with _deferred_lock:
+            self.state["writes"] += n
+        return {"mode": "deferred"}
+
+
+@contextmanager
+def deferred(prefix: str):
+    """
+    Los upserts de `prefix` dentro del bloque (de cualquier hilo de este proceso) no
+    actualizan stats_{prefix}; al salir, un único rebuild si hubo escrituras. Devuelve un
+    dict con writes y, tras el bloque, stats (resultado del rebuild).
+    """
+    state: Dict[str, Any] = {"writes": 0, "stats": None}
+    if not INCREMENTAL:
+        yield state
+        return
+    with _deferred_lock:
+        _deferred[prefix] = state
+    try:
+        yield state
+    finally:
+        with _deferred_lock:
+            _deferred.pop(prefix, None)
+        if state["writes"]:
+            try:
+                state["stats"] = rebuild(prefix)
+                print(f"[stats] {prefix}: reconstrucción tras {state['writes']} escrituras diferidas")
+            except Exception as e:
+                print(f"[stats] {prefix}: no se pudieron reconstruir ({e}); ejecuta 'rebuild'")
+                state["stats"] = {"mode": "error", "error": str(e)}
+
+
+def on_upsert(prefix: str):
+    """
+    Tracker para un upsert de `prefix`, o None si STATS_INCREMENTAL=0 o no se puede leer
+    stats_{prefix}. Dentro de deferred(prefix), uno que solo cuenta escrituras.
+    """
+    if not INCREMENTAL:
+        return None
+    with _deferred_lock:
+        state = _deferred.get(prefix)
+    if state is not None:
+        return _Deferred(prefix, state)
+    try:
+        return Tracker(prefix)
+    except Exception as e:
+        print(f"[stats] {prefix}: no se pudo leer stats_{prefix} ({e}); sin actualización incremental")
+        return None
+
+
+def finish_safely(tracker: Union[Tracker, None], summary: Dict[str, Any]) -> Dict[str, Any]:
+    """finish() sin que un fallo de las estadísticas haga fallar la carga (se añade al resumen)."""
+    try:
+        res = tracker.finish(summary) if tracker is not None else None
+    except Exception as e:
+        print(f"[stats] {tracker.prefix}: no se pudieron actualizar ({e}); ejecuta 'rebuild'")
+        res = {"mode": "error", "error": str(e)}
+    # los _id dados de alta solo hacen falta para finish(); no se arrastran en el resumen
+    summary.pop("upserted_ids", None)
+    if res:
+        summary["stats"] = res
+    return summary
+
+
+# ------------------------------- lectura -----------------------------------
+def window_features(prefix: str, window_k: int, num_max: int = NUM_MAX) -> Union[np.ndarray, None]:
+    """
+    Features como predict_sklearn.build_last_feature (counts de los últimos K + último
+    sorteo + idx_norm) desde stats_{prefix}; None si K no está materializado.
+    """
+    doc = load(prefix)
+    if not doc or str(window_k) not in (doc.get("windows") or {}):
+        return None
+    last = np.zeros(num_max, dtype=int)
+    for n in doc.get("last_draw") or []:
+        if 1 <= n <= num_max:
+            last[n - 1] = 1
+    counts = np.asarray(doc["windows"][str(window_k)][:num_max], dtype=int)
+    return np.concatenate([counts, last, np.array([1.0])])
+
+
+# ------------------------------- CLI -------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estadísticas materializadas en stats_<prefix>")
+    parser.add_argument("cmd", choices=["show", "rebuild"])
+    parser.add_argument("--name", default=os.environ.get("JUEGO", "primitiva"), help="prefijo de colección")
+    parser.add_argument("--check", action="store_true", help="rebuild: solo comparar, sin escribir")
+    parser.add_argument("--top", type=int, default=10, help="números a mostrar")
+    args = parser.parse_args()
+
+    if args.cmd == "rebuild":
+        res = rebuild(args.name, check=args.check)
+        estado = "sin deriva" if res["ok"] else f"DERIVA en {res['drift']}"
+        print(f"stats_{args.name}: {res['n_draws']} sorteos hasta {res['fecha_max']}, {estado}"
+              + ("" if res["written"] else " (no se ha escrito nada)"))
+    else:
+        doc = load(args.name)
+        if not doc:
+            print(f"stats_{args.name} vacía; ejecuta 'rebuild'.")
+        else:
+            counts = np.asarray(doc["counts"])
+            print(f"stats_{args.name}: {doc['n_draws']} sorteos {doc['fecha_min']}..{doc['fecha_max']} "
+                  f"({doc.get('mode')}, {doc.get('updated_at')})")
+            for i in np.argsort(-counts, kind="stable")[:args.top]:
+                print(f"  {i + 1:2d}: {counts[i]:5d} veces, última {doc['last_seen'][i]} (hace {doc['gap'][i]} sorteos)")
+            atrasados = sorted(range(len(counts)), key=lambda i: -(doc["gap"][i] if doc["gap"][i] is not None else 10**9))
+            print("Más atrasados:", [(i + 1, doc["gap"][i]) for i in atrasados[:args.top]])
+            for k, v in doc.get("windows", {}).items():
+                print(f"  últimos {k}: más frecuentes {[int(i) + 1 for i in np.argsort(-np.asarray(v), kind='stable')[:6]]}")
@@ -0,0 +1,124 @@
+# src/mongo_pool.py
+"""
+Registro de MongoClient compartidos por proceso (scraper, ETL y loaders).
+- Un cliente por URI (+ opciones), creado la primera vez que se pide y reutilizado
+  después: un único pool de conexiones por ejecución en lugar de un handshake y una
+  espera de server selection por cada get_collection().
+- connect=False: no se abre ninguna conexión hasta la primera operación.
+- ping()/healthy(): health check (cacheado HEALTH_INTERVAL_S segundos).
+- close_all() se registra con atexit; tras un fork se crean clientes nuevos.
+Variables de entorno:
+    MONGO_URI (default: mongodb://localhost:27017/)
+    MONGO_DB  (default: loterias)
+    MONGO_MAX_POOL_SIZE (default: 20)
+    MONGO_MIN_POOL_SIZE (default: 0)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS (default: 5000)
+    MONGO_CONNECT_TIMEOUT_MS (default: 5000)
+    MONGO_SOCKET_TIMEOUT_MS  (default: sin límite)
+    MONGO_HEALTH_INTERVAL_S  (default: 30)
+"""
+
+import os
+import time
+import atexit
+import threading
+from typing import Any, Dict, Tuple
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_URI = os.environ.get("MONGO_URI")
+MONGO_DB = os.environ.get("MONGO_DB", "loterias")
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 20))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+SOCKET_TIMEOUT_MS = os.environ.get("MONGO_SOCKET_TIMEOUT_MS")
+HEALTH_INTERVAL_S = float(os.environ.get("MONGO_HEALTH_INTERVAL_S", 30))
+
+_clients: Dict[Tuple, MongoClient] = {}
+_health: Dict[Tuple, float] = {}
+_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def _options(**overrides) -> Dict[str, Any]:
+    opts = {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+        "connect": False,
+    }
+    if SOCKET_TIMEOUT_MS:
+        opts["socketTimeoutMS"] = int(SOCKET_TIMEOUT_MS)
+    opts.update(overrides)
+    return opts
+
+
+def _key(uri: str, opts: Dict[str, Any]) -> Tuple:
+    return (uri or "",) + tuple(sorted(opts.items()))
+
+
+def get_client(uri: str = None, **options) -> MongoClient:
+    """Cliente compartido para `uri` (MONGO_URI por defecto). `options` se pasan a MongoClient."""
+    global _pid
+    uri = uri if uri is not None else MONGO_URI
+    opts = _options(**options)
+    key = _key(uri, opts)
+    with _lock:
+        if os.getpid() != _pid:
+            # proceso hijo: los clientes del padre no son seguros tras fork
+            _clients.clear()
+            _health.clear()
+            _pid = os.getpid()
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(uri, **opts)
+            _clients[key] = client
+        return client
+
+
+def get_db(db_name: str = None, uri: str = None):
+    return get_client(uri)[db_name or MONGO_DB]
+
+
+def get_collection(name: str, db_name: str = None, uri: str = None):
+    return get_db(db_name, uri)[name]
+
+
+def ping(uri: str = None) -> bool:
+    """True si el servidor responde a 'ping' (fuerza la conexión)."""
+    try:
+        get_client(uri).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+def healthy(uri: str = None) -> bool:
+    """Como ping(), pero un resultado correcto se reutiliza durante HEALTH_INTERVAL_S."""
+    key = _key(uri if uri is not None else MONGO_URI, _options())
+    now = time.monotonic()
+    if now - _health.get(key, float("-inf")) < HEALTH_INTERVAL_S:
+        return True
+    ok = ping(uri)
+    if ok:
+        _health[key] = now
+    else:
+        _health.pop(key, None)
+    return ok
+
+
+def close_all():
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
+        _health.clear()
+
+
+atexit.register(close_all)
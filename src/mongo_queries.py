@@ -0,0 +1,107 @@
+# src/mongo_queries.py
+"""
+Índices gestionados y consultas por fecha para las colecciones de sorteos.
+- ensure_indexes(coll): crea (idempotente, una vez por colección y proceso) los índices
+    fecha               rangos, orden por fecha y "últimos N"
+    juego_fecha         upserts de db_2 por {juego, fecha}
+    content_hash        sparse, detección de cambios (src/mongo_upsert.py)
+    last_modified       sparse, export incremental (src/etl.py)
+  Lo llama bulk_writer antes de cada carga, así que cualquier loader deja la colección indexada.
+- draws_between / last_draws / draws_since: consultas que usan esos índices y devuelven
+  solo los campos del sorteo, ordenados por fecha ascendente.
+Variables de entorno:
+    MONGO_URI, MONGO_DB, MONGO_COLL_BASE (como src/etl.py)
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+try:
+    from src import mongo_pool
+except Exception:
+    import mongo_pool
+
+MONGO_URI = os.environ.get("MONGO_URI")
+MONGO_DB = os.environ.get("MONGO_DB", "loterias")
+COLLECTION_BASE = os.environ.get("MONGO_COLL_BASE", "resultados_loterias")
+
+DRAW_PROJECTION = {"_id": 0, "juego": 1, "fecha": 1, "numeros": 1, "complementario": 1, "reintegro": 1, "fuente": 1}
+QUERY_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+# (nombre, claves, opciones)
+INDEXES: List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]] = [
+    ("fecha", [("fecha", ASCENDING)], {}),
+    ("juego_fecha", [("juego", ASCENDING), ("fecha", ASCENDING)], {}),
+    ("content_hash", [("content_hash", ASCENDING)], {"sparse": True}),
+    ("last_modified", [("last_modified", ASCENDING)], {"sparse": True}),
+]
+
+_ensured = set()
+_lock = threading.Lock()
+
+
+def get_collection(prefix: str):
+    return mongo_pool.get_collection(f"{COLLECTION_BASE}_{prefix}", MONGO_DB, MONGO_URI)
+
+
+def ensure_indexes(coll) -> List[str]:
+    """
+    Crea los índices de INDEXES si faltan (create_index no hace nada si ya existen).
+    Se recuerda por colección, así que llamarlo en cada carga no cuesta idas y vueltas.
+    Un índice con el mismo nombre pero otra definición se avisa y se deja como está.
+    """
+    key = (id(coll.database.client), coll.database.name, coll.name)
+    if key in _ensured:
+        return []
+    with _lock:
+        if key in _ensured:
+            return []
+        creados = []
+        for name, keys, opts in INDEXES:
+            try:
+                creados.append(coll.create_index(keys, name=name, **opts))
+            except OperationFailure as e:
+                print(f"[indexes] {coll.name}.{name}: {e}")
+        _ensured.add(key)
+        return creados
+
+
+def _find(prefix: str, query: Dict[str, Any], sort_dir: int = ASCENDING, limit: int = 0,
+          projection: Dict[str, Any] = None, batch_size: int = None):
+    coll = get_collection(prefix)
+    ensure_indexes(coll)
+    # el índice de fecha sirve a la vez para el filtro y para el orden (sin sort en memoria)
+    return coll.find(query, projection or DRAW_PROJECTION, sort=[("fecha", sort_dir)], limit=limit,
+                     batch_size=batch_size or QUERY_BATCH_SIZE)
+
+
+def _rango(desde: str = None, hasta: str = None, despues: str = None) -> Dict[str, Any]:
+    rango = {"$type": "string"}
+    if desde:
+        rango["$gte"] = desde
+    if despues:
+        rango["$gt"] = despues
+    if hasta:
+        rango["$lte"] = hasta
+    return {"fecha": rango}
+
+
+def draws_between(prefix: str, desde: str = None, hasta: str = None, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Sorteos con desde <= fecha <= hasta (YYYY-MM-DD; cualquiera de los dos puede faltar)."""
+    return _find(prefix, _rango(desde, hasta), **kwargs)
+
+
+def last_draws(prefix: str, n: int, hasta: str = None, **kwargs) -> List[Dict[str, Any]]:
+    """Los `n` sorteos más recientes (hasta `hasta` incluida), en orden ascendente."""
+    docs = list(_find(prefix, _rango(hasta=hasta), sort_dir=DESCENDING, limit=int(n), **kwargs))
+    docs.reverse()
+    return docs
+
+
+def draws_since(prefix: str, fecha: str, **kwargs) -> Iterator[Dict[str, Any]]:
+    """Sorteos estrictamente posteriores a `fecha` (marca de agua de una etapa incremental)."""
+    return _find(prefix, _rango(despues=fecha), **kwargs)
@@ -0,0 +1,158 @@
+# src/mongo_stats.py
+"""
+Estadísticas de sorteos calculadas dentro de Mongo (pipelines de agregación):
+$match por rango de fechas -> $unwind de `numeros` -> $group. Solo vuelven por la red
+los vectores de resultado (49 contadores, 49 fechas...), no el histórico.
+- number_counts(): apariciones de cada número en un rango de fechas y/o en los últimos N sorteos.
+- window_counts(): varios rangos en una sola consulta ($facet).
+- last_seen(): última fecha en la que salió cada número.
+- weekday_counts(): frecuencias por día de la semana (fila 0 = lunes, como pandas).
+- window_features(): el vector de features de predict_sklearn.build_last_feature
+  (counts de los últimos K sorteos + último sorteo + idx_norm) sin exportar nada.
+Las fechas se comparan como texto YYYY-MM-DD (el formato que guardan los loaders).
+Variables de entorno:
+    MONGO_URI, MONGO_DB, MONGO_COLL_BASE (como src/etl.py)
+
+Uso:
+  python -m src.mongo_stats --name primitiva --desde 2020-01-01 --hasta 2024-12-31
+  python -m src.mongo_stats --name bonoloto --last 50
+"""
+
+import os
+import argparse
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+try:
+    from src import mongo_queries
+except Exception:
+    import mongo_queries
+
+NUM_MAX = 49
+
+
+def get_collection(prefix: str):
+    # con los índices de src/mongo_queries.py ($match por fecha y "últimos N" sin escanear)
+    coll = mongo_queries.get_collection(prefix)
+    mongo_queries.ensure_indexes(coll)
+    return coll
+
+
+def _match(desde: str = None, hasta: str = None) -> Dict:
+    """$match por rango de fechas (ambos extremos incluidos); sin extremos, solo docs con fecha."""
+    rango = {"$type": "string"}
+    if desde:
+        rango["$gte"] = desde
+    if hasta:
+        rango["$lte"] = hasta
+    return {"$match": {"fecha": rango}}
+
+
+def _window(desde: str = None, hasta: str = None, last_n: int = None) -> List[Dict]:
+    stages = [_match(desde, hasta)]
+    if last_n:
+        stages += [{"$sort": {"fecha": -1}}, {"$limit": int(last_n)}]
+    return stages
+
+
+def _counts_stages() -> List[Dict]:
+    return [{"$unwind": "$numeros"}, {"$group": {"_id": "$numeros", "n": {"$sum": 1}}}]
+
+
+def _to_vector(rows, num_max: int) -> np.ndarray:
+    counts = np.zeros(num_max, dtype=int)
+    for r in rows:
+        n = r["_id"]
+        if isinstance(n, (int, float)) and 1 <= n <= num_max:
+            counts[int(n) - 1] = r["n"]
+    return counts
+
+
+def number_counts(prefix: str, desde: str = None, hasta: str = None, last_n: int = None,
+                  num_max: int = NUM_MAX) -> np.ndarray:
+    """Vector (num_max,) con las apariciones de cada número (índice 0 = número 1)."""
+    pipeline = _window(desde, hasta, last_n) + _counts_stages()
+    return _to_vector(get_collection(prefix).aggregate(pipeline), num_max)
+
+
+def window_counts(prefix: str, windows: Dict[str, Tuple[Union[str, None], Union[str, None]]],
+                  num_max: int = NUM_MAX) -> Dict[str, np.ndarray]:
+    """{nombre: (desde, hasta)} -> {nombre: vector de counts}, todos en una sola agregación."""
+    if not windows:
+        return {}
+    facets = {name: _window(desde, hasta) + _counts_stages() for name, (desde, hasta) in windows.items()}
+    res = next(get_collection(prefix).aggregate([{"$facet": facets}]), {})
+    return {name: _to_vector(res.get(name, []), num_max) for name in windows}
+
+
+def last_seen(prefix: str, desde: str = None, hasta: str = None, num_max: int = NUM_MAX) -> Dict[int, Union[str, None]]:
+    """{número: última fecha YYYY-MM-DD en la que salió} (None si no salió en el rango)."""
+    pipeline = [_match(desde, hasta), {"$unwind": "$numeros"},
+                {"$group": {"_id": "$numeros", "fecha": {"$max": "$fecha"}}}]
+    out = {n: None for n in range(1, num_max + 1)}
+    for r in get_collection(prefix).aggregate(pipeline):
+        if r["_id"] in out:
+            out[r["_id"]] = r["fecha"]
+    return out
+
+
+def weekday_counts(prefix: str, desde: str = None, hasta: str = None, num_max: int = NUM_MAX) -> np.ndarray:
+    """Matriz (7, num_max): fila = día de la semana (0 lunes ... 6 domingo), columna = número - 1."""
+    pipeline = [
+        _match(desde, hasta),
+        {"$project": {"numeros": 1, "dow": {"$isoDayOfWeek": {"$dateFromString": {
+            "dateString": "$fecha", "format": "%Y-%m-%d", "onError": None, "onNull": None}}}}},
+        {"$match": {"dow": {"$ne": None}}},
+        {"$unwind": "$numeros"},
+        {"$group": {"_id": {"dow": "$dow", "n": "$numeros"}, "n": {"$sum": 1}}},
+    ]
+    out = np.zeros((7, num_max), dtype=int)
+    for r in get_collection(prefix).aggregate(pipeline):
+        dow, n = r["_id"].get("dow"), r["_id"].get("n")
+        if isinstance(dow, int) and 1 <= dow <= 7 and isinstance(n, int) and 1 <= n <= num_max:
+            out[dow - 1, n - 1] = r["n"]
+    return out
+
+
+def window_features(prefix: str, window_k: int, num_max: int = NUM_MAX) -> np.ndarray:
+    """
+    Features del siguiente sorteo, iguales a las de predict_sklearn.build_last_feature:
+    counts de los últimos `window_k` sorteos + indicador del último + idx_norm (1.0).
+    Una agregación: los K sorteos más recientes y un $facet con counts y último sorteo.
+    """
+    pipeline = _window(last_n=window_k) + [{"$facet": {
+        "counts": _counts_stages(),
+        "last": [{"$limit": 1}, {"$project": {"_id": 0, "numeros": 1}}],
+    }}]
+    res = next(get_collection(prefix).aggregate(pipeline), {})
+    counts = _to_vector(res.get("counts", []), num_max)
+    last = np.zeros(num_max, dtype=int)
+    for d in res.get("last", []):
+        for n in d.get("numeros") or []:
+            if 1 <= n <= num_max:
+                last[n - 1] = 1
+    return np.concatenate([counts, last, np.array([1.0])])
+
+
+# ------------------------------- CLI -------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estadísticas de sorteos calculadas en Mongo")
+    parser.add_argument("--name", default=os.environ.get("JUEGO", "primitiva"), help="prefijo de colección")
+    parser.add_argument("--desde", default=None, help="fecha inicial YYYY-MM-DD (incluida)")
+    parser.add_argument("--hasta", default=None, help="fecha final YYYY-MM-DD (incluida)")
+    parser.add_argument("--last", type=int, default=None, help="solo los últimos N sorteos del rango")
+    parser.add_argument("--top", type=int, default=10, help="números a mostrar")
+    args = parser.parse_args()
+
+    counts = number_counts(args.name, args.desde, args.hasta, args.last)
+    vistos = last_seen(args.name, args.desde, args.hasta)
+    print(f"Números más frecuentes ({args.name}):")
+    for i in np.argsort(-counts, kind="stable")[:args.top]:
+        print(f"  {i + 1:2d}: {counts[i]:5d} veces, última {vistos[i + 1]}")
+    print("Menos frecuentes:", [int(i) + 1 for i in np.argsort(counts, kind="stable")[:args.top]])
+    dias = ["lun", "mar", "mié", "jue", "vie", "sáb", "dom"]
+    por_dia = weekday_counts(args.name, args.desde, args.hasta)
+    for d, fila in zip(dias, por_dia):
+        if fila.sum():
+            print(f"  {d}: más frecuente {int(np.argmax(fila)) + 1} ({fila.max()} veces), {fila.sum()} bolas")
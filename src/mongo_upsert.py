@@ -0,0 +1,114 @@
+# src/mongo_upsert.py
+"""
+Upsert con detección de cambios para las colecciones de sorteos.
+Cada documento lleva `content_hash` (sha1 de los campos con significado: juego, fecha,
+numeros, complementario, reintegro, fuente). Antes de escribir se leen en bloque
+(un $in por cada READ_CHUNK _ids) los hashes guardados y solo se escriben los
+documentos nuevos o cambiados:
+    $set         campos + content_hash + last_modified
+    $setOnInsert first_seen
+Un día sin sorteos nuevos no escribe nada.
+backfill_first_seen(): los documentos de antes de este módulo solo tienen inserted_at
+(que el loader antiguo reescribía en cada upsert); se les pone first_seen = inserted_at
+(o last_modified) una vez por colección y proceso, desde bulk_writer.write_docs.
+Variables de entorno:
+    UPSERT_READ_CHUNK (default: 1000)   _ids por consulta $in
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+HASH_FIELDS = ("juego", "fecha", "numeros", "complementario", "reintegro", "fuente")
+READ_CHUNK = int(os.environ.get("UPSERT_READ_CHUNK", 1000))
+
+_backfilled = set()
+_lock = threading.Lock()
+
+
+def content_hash(doc: Dict[str, Any]) -> str:
+    payload = json.dumps([doc.get(k) for k in HASH_FIELDS], ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def stored_hashes(coll, ids: List[str]) -> Dict[str, str]:
+    """{_id: content_hash} de los documentos ya guardados (None si no tienen hash)."""
+    out = {}
+    for i in range(0, len(ids), READ_CHUNK):
+        for d in coll.find({"_id": {"$in": ids[i:i + READ_CHUNK]}}, {"content_hash": 1}):
+            out[d["_id"]] = d.get("content_hash")
+    return out
+
+
+def changed_ops(coll, docs: Iterable[Dict[str, Any]], now: datetime = None) -> Tuple[List[UpdateOne], int]:
+    """(operaciones, nº de documentos sin cambios). Con _id repetido gana el último."""
+    by_id = {}
+    for d in docs:
+        by_id[d["_id"]] = d
+    if not by_id:
+        return [], 0
+    now = now or datetime.now()
+    stored = stored_hashes(coll, list(by_id))
+    ops = []
+    for _id, d in by_id.items():
+        h = content_hash(d)
+        if stored.get(_id) == h:
+            continue
+        fields = {k: v for k, v in d.items() if k != "_id"}
+        fields["content_hash"] = h
+        fields["last_modified"] = now
+        ops.append(UpdateOne({"_id": _id}, {"$set": fields, "$setOnInsert": {"first_seen": now}}, upsert=True))
+    return ops, len(by_id) - len(ops)
+
+
+def write_changed(coll, docs: Iterable[Dict[str, Any]], ordered: bool = False) -> Dict[str, Any]:
+    """
+    Escribe solo lo nuevo o cambiado. Devuelve el resumen habitual (n_ops, matched_count,
+    modified_count, upserted_count) más n_docs, unchanged y upserted_ids (los _id dados de alta). Los errores de Mongo se
+    propagan (src/bulk_writer.py decide si reintentar).
+    """
+    docs = list(docs)
+    summary = {"ok": True, "n_docs": len(docs), "n_ops": 0, "unchanged": 0,
+               "matched_count": 0, "modified_count": 0, "upserted_count": 0, "upserted_ids": []}
+    ops, summary["unchanged"] = changed_ops(coll, docs)
+    if not ops:
+        return summary
+    res = coll.bulk_write(ops, ordered=ordered)
+    summary["n_ops"] = len(ops)
+    summary["matched_count"] = getattr(res, "matched_count", 0) or 0
+    summary["modified_count"] = getattr(res, "modified_count", 0) or 0
+    summary["upserted_ids"] = list((getattr(res, "upserted_ids", None) or {}).values())
+    summary["upserted_count"] = len(summary["upserted_ids"])
+    return summary
+
+
+def backfill_first_seen(coll) -> int:
+    """
+    first_seen en los documentos que no lo tienen: inserted_at, si no last_modified, si no
+    la hora del servidor. Se recuerda por colección (como mongo_queries.ensure_indexes).
+    Devuelve el nº de documentos actualizados.
+    """
+    key = (id(coll.database.client), coll.database.name, coll.name)
+    if key in _backfilled:
+        return 0
+    with _lock:
+        if key in _backfilled:
+            return 0
+        n = 0
+        try:
+            res = coll.update_many(
+                {"first_seen": {"$exists": False}},
+                [{"$set": {"first_seen": {"$ifNull": ["$inserted_at", {"$ifNull": ["$last_modified", "$$NOW"]}]}}}])
+            n = res.modified_count
+            if n:
+                print(f"[upsert] {coll.name}: first_seen añadido a {n} documentos antiguos")
+        except OperationFailure as e:
+            print(f"[upsert] {coll.name}: no se pudo completar first_seen ({e})")
+        _backfilled.add(key)
+        return n
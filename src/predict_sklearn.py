@@ -51,6 +51,26 @@ def append_prediction(prediction, fecha_predecida, algoritmo, juego=None, path=P
         writer.writerow(row)
 
 def build_last_feature():
+    source = os.environ.get("FEATURES_SOURCE")
+    if source == "stats":
+        # vector ya materializado en stats_<juego> (src/materialized_stats.py): un documento
+        try:
+            from src import materialized_stats
+        except Exception:
+            import materialized_stats
+        feat = materialized_stats.window_features(os.environ.get("JUEGO", "primitiva"), WINDOW_K, NUM_MAX)
+        if feat is not None:
+            return feat.reshape(1, -1)
+        print(f"stats sin ventana K={WINDOW_K}; se calcula en Mongo")
+        source = "mongo"
+    if source == "mongo":
+        # counts/último sorteo calculados en Mongo (src/mongo_stats.py), sin export previo
+        try:
+            from src import mongo_stats
+        except Exception:
+            import mongo_stats
+        juego = os.environ.get("JUEGO", "primitiva")
+        return mongo_stats.window_features(juego, WINDOW_K, NUM_MAX).reshape(1, -1)
     df = load_processed_df()
     nums = df_to_numeros_list(df)
     prev = nums[-WINDOW_K:]
@@ -0,0 +1,437 @@
+# src/raw_store.py
+"""
+Capa raw de sorteos en segmentos JSONL comprimidos (sustituye al {prefix}_raw.json monolítico):
+    data/raw/{prefix}/manifest.json        lista ordenada de segmentos con su rango de fechas
+    data/raw/{prefix}/<ts>-<pid>.jsonl.gz  un documento por línea
+- Writer: escribe segmentos nuevos (cada SEGMENT_DOCS documentos se cierra uno) y al final
+  los añade al manifest de una vez (replace=True: sustituyen a todos los anteriores).
+  Una escritura cuesta O(datos nuevos); si falla no queda nada a medias en el manifest.
+- append_new(): solo los documentos con fecha posterior a la última guardada.
+- iter_docs() / read_batch(): lectura en streaming; con desde/hasta solo se abren los
+  segmentos cuyo rango de fechas se solapa.
+- drop_after(): quita lo posterior a una fecha (deshacer un append que no llegó a confirmarse).
+- compact(): junta segmentos pequeños consecutivos (sin reordenar ni deduplicar: la capa
+  raw guarda lo que llegó). Después de cada escritura se lanza en un hilo si hay al menos
+  COMPACT_MIN_SEGMENTS pequeños. Los ficheros sustituidos (compactación, replace,
+  drop_after) se borran en la escritura siguiente que retire otros, para no quitárselos
+  a un lector que aún los esté recorriendo.
+El manifest se reescribe siempre con .tmp + rename. Toda lectura-modificación-escritura del
+manifest (commit, drop_after, compact, append_new) va bajo un lock por prefijo que también
+es de fichero (flock sobre manifest.json.lock), porque el scraper y el ETL son procesos
+distintos que escriben el mismo store.
+Variables de entorno:
+    RAW_STORE_DIR          (default: data/raw)
+    RAW_SEGMENT_DOCS       (default: 1000)  documentos por segmento
+    RAW_COMPACT_MIN        (default: 8)     segmentos pequeños que disparan la compactación
+
+Uso:
+  python -m src.raw_store stats --name primitiva
+  python -m src.raw_store migrate --name primitiva    # importa data/raw/primitiva_raw.json(l)
+  python -m src.raw_store compact --name primitiva
+"""
+
+import os
+import gzip
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+try:
+    from src import fechas
+    from src.draws import DrawBatch
+except Exception:
+    import fechas
+    from draws import DrawBatch
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+STORE_DIR = os.environ.get("RAW_STORE_DIR", os.path.join(BASE, "data", "raw"))
+SEGMENT_DOCS = int(os.environ.get("RAW_SEGMENT_DOCS", 1000))
+COMPACT_MIN_SEGMENTS = int(os.environ.get("RAW_COMPACT_MIN", 8))
+SEGMENT_EXT = ".jsonl.gz"
+ORPHAN_AGE_S = 3600  # segmentos fuera del manifest más viejos que esto: escrituras abortadas
+
+try:
+    import fcntl
+except ImportError:   # Windows: solo el lock entre hilos
+    fcntl = None
+
+_locks: Dict[str, threading.RLock] = {}
+_depth: Dict[str, int] = {}
+_locks_guard = threading.Lock()
+_compacting = set()
+
+
+def _lock(prefix: str) -> threading.RLock:
+    with _locks_guard:
+        return _locks.setdefault(prefix, threading.RLock())
+
+
+@contextmanager
+def _locked(prefix: str):
+    """
+    Lock del store de `prefix` entre hilos y entre procesos. Reentrante en el mismo hilo:
+    el flock solo se toma en el nivel exterior (otro open() del mismo fichero se bloquearía).
+    """
+    with _lock(prefix):
+        outer = not _depth.get(prefix)
+        _depth[prefix] = _depth.get(prefix, 0) + 1
+        fd = None
+        try:
+            if outer and fcntl is not None:
+                os.makedirs(store_dir(prefix), exist_ok=True)
+                fd = os.open(manifest_path(prefix) + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+            _depth[prefix] -= 1
+
+
+def store_dir(prefix: str) -> str:
+    return os.path.join(STORE_DIR, prefix)
+
+
+def manifest_path(prefix: str) -> str:
+    return os.path.join(store_dir(prefix), "manifest.json")
+
+
+# ------------------------------ manifest -----------------------------------
+def load_manifest(prefix: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path(prefix), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"segments": [], "obsolete": []}
+
+
+def _save_manifest(prefix: str, manifest: Dict[str, Any]):
+    path = manifest_path(prefix)
+    tmp = f"{path}.tmp{os.getpid()}"
+    manifest["updated_at"] = datetime.now().isoformat(timespec="seconds")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def exists(prefix: str) -> bool:
+    return bool(load_manifest(prefix)["segments"])
+
+
+def fecha_max(prefix: str) -> Union[str, None]:
+    """Fecha más reciente guardada (YYYY-MM-DD), o None si el store está vacío."""
+    fechas = [s["fecha_max"] for s in load_manifest(prefix)["segments"] if s.get("fecha_max")]
+    return max(fechas) if fechas else None
+
+
+def stats(prefix: str) -> Dict[str, Any]:
+    segs = load_manifest(prefix)["segments"]
+    fechas_min = [s["fecha_min"] for s in segs if s.get("fecha_min")]
+    return {"segments": len(segs), "n_docs": sum(s["n_docs"] for s in segs),
+            "bytes": sum(s["bytes"] for s in segs),
+            "fecha_min": min(fechas_min) if fechas_min else None, "fecha_max": fecha_max(prefix),
+            "small_segments": sum(1 for s in segs if s["n_docs"] < SEGMENT_DOCS // 2)}
+
+
+# ------------------------------ escritura ----------------------------------
+def _write_segment(prefix: str, docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Escribe un segmento (fuera del manifest hasta que alguien lo confirme) y devuelve su entrada."""
+    d = store_dir(prefix)
+    os.makedirs(d, exist_ok=True)
+    name = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident() % 10000:04d}{SEGMENT_EXT}"
+    path = os.path.join(d, name)
+    fechas = [doc["fecha"] for doc in docs if isinstance(doc.get("fecha"), str)]
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json.dumps(doc, ensure_ascii=False, default=str))
+            f.write("\n")
+    os.replace(tmp, path)
+    return {"file": name, "n_docs": len(docs), "n_sin_fecha": len(docs) - len(fechas),
+            "fecha_min": min(fechas) if fechas else None, "fecha_max": max(fechas) if fechas else None,
+            "bytes": os.path.getsize(path)}
+
+
+def _retire(prefix: str, manifest: Dict[str, Any], names: List[str]):
+    """
+    Marca `names` como obsoletos y borra los que ya lo estaban (de una escritura anterior:
+    ningún lector que siga abierto puede estar usándolos). Se llama con el lock tomado,
+    después de guardar el manifest nuevo.
+    """
+    previos = manifest.get("obsolete", [])
+    manifest["obsolete"] = list(names)
+    _save_manifest(prefix, manifest)
+    _remove(prefix, previos)
+    return len(previos)
+
+
+def _remove(prefix: str, names: Iterable[str]):
+    for name in names:
+        try:
+            os.remove(os.path.join(store_dir(prefix), name))
+        except FileNotFoundError:
+            pass
+
+
+class Writer:
+    """
+    Acumula documentos y escribe un segmento cada `segment_docs`; commit() los añade al
+    manifest (o sustituye a todos con replace=True). Como context manager confirma al
+    salir sin error y, si no, borra los segmentos escritos.
+    """
+
+    def __init__(self, prefix: str, replace: bool = False, segment_docs: int = None, compact: bool = True):
+        self.prefix = prefix
+        self.replace = replace
+        self.segment_docs = segment_docs or SEGMENT_DOCS
+        self.compact = compact
+        self.n_docs = 0
+        self._buf: List[Dict[str, Any]] = []
+        self._segments: List[Dict[str, Any]] = []
+
+    def add(self, doc: Dict[str, Any]):
+        self._buf.append(doc)
+        self.n_docs += 1
+        if len(self._buf) >= self.segment_docs:
+            self._flush()
+
+    def extend(self, docs: Iterable[Dict[str, Any]]):
+        for doc in docs:
+            self.add(doc)
+
+    def _flush(self):
+        if self._buf:
+            self._segments.append(_write_segment(self.prefix, self._buf))
+            self._buf = []
+
+    def commit(self) -> Dict[str, Any]:
+        self._flush()
+        with _locked(self.prefix):
+            manifest = load_manifest(self.prefix)
+            if self.replace:
+                old = [s["file"] for s in manifest["segments"]]
+                manifest["segments"] = list(self._segments)
+                os.makedirs(store_dir(self.prefix), exist_ok=True)
+                _retire(self.prefix, manifest, old)
+            elif self._segments:
+                manifest["segments"].extend(self._segments)
+                _save_manifest(self.prefix, manifest)
+        summary = {"n_docs": self.n_docs, "segments": [s["file"] for s in self._segments]}
+        self._segments = []
+        if self.compact:
+            maybe_compact(self.prefix)
+        return summary
+
+    def abort(self):
+        _remove(self.prefix, [s["file"] for s in self._segments])
+        self._segments, self._buf = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def append(prefix: str, docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    with Writer(prefix) as w:
+        w.extend(docs)
+    return {"n_docs": w.n_docs}
+
+
+def append_new(prefix: str, docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Añade solo los documentos con fecha posterior a la más reciente del store."""
+    docs = list(docs)
+    # fecha_max y el commit bajo el mismo lock: dos procesos no añaden los mismos sorteos
+    with _locked(prefix):
+        ultima = fecha_max(prefix) or ""
+        nuevos = [d for d in docs if isinstance(d.get("fecha"), str) and d["fecha"] > ultima]
+        res = append(prefix, nuevos) if nuevos else {"n_docs": 0}
+    return {**res, "desde": ultima or None}
+
+
+def replace(prefix: str, docs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    with Writer(prefix, replace=True) as w:
+        w.extend(docs)
+    return {"n_docs": w.n_docs}
+
+
+# ------------------------------- lectura -----------------------------------
+def _overlaps(seg: Dict[str, Any], desde: str = None, hasta: str = None) -> bool:
+    if desde is None and hasta is None:
+        return True
+    if not seg.get("fecha_min"):
+        return False
+    return not ((desde and seg["fecha_max"] < desde) or (hasta and seg["fecha_min"] > hasta))
+
+
+def _read_segment(prefix: str, name: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(os.path.join(store_dir(prefix), name), "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_docs(prefix: str, desde: str = None, hasta: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    Documentos en el orden en que se guardaron. Con desde/hasta (YYYY-MM-DD, incluidos) se
+    saltan los segmentos fuera de rango y se omiten los documentos sin fecha.
+    """
+    for seg in load_manifest(prefix)["segments"]:
+        if not _overlaps(seg, desde, hasta):
+            continue
+        for doc in _read_segment(prefix, seg["file"]):
+            if desde is None and hasta is None:
+                yield doc
+                continue
+            fecha = doc.get("fecha")
+            if isinstance(fecha, str) and (not desde or fecha >= desde) and (not hasta or fecha <= hasta):
+                yield doc
+
+
+def read_batch(prefix: str, desde: str = None, hasta: str = None) -> DrawBatch:
+    return DrawBatch.from_dicts(iter_docs(prefix, desde, hasta), normalize_fecha=True)
+
+
+# ---------------------------- mantenimiento --------------------------------
+def drop_after(prefix: str, fecha: str) -> int:
+    """
+    Quita los documentos con fecha > `fecha` (los segmentos enteros se sacan del manifest;
+    uno a caballo se reescribe). Devuelve cuántos documentos se quitaron.
+    """
+    with _locked(prefix):
+        manifest = load_manifest(prefix)
+        keep, quitados, obsolete = [], 0, []
+        for seg in manifest["segments"]:
+            if not seg.get("fecha_max") or seg["fecha_max"] <= fecha:
+                keep.append(seg)
+                continue
+            obsolete.append(seg["file"])
+            docs = [] if seg["fecha_min"] > fecha else [
+                d for d in _read_segment(prefix, seg["file"])
+                if not isinstance(d.get("fecha"), str) or d["fecha"] <= fecha]
+            quitados += seg["n_docs"] - len(docs)
+            if docs:
+                keep.append(_write_segment(prefix, docs))
+        if obsolete:
+            manifest["segments"] = keep
+            _retire(prefix, manifest, obsolete)
+    return quitados
+
+
+def _runs(segments: List[Dict[str, Any]], small: int) -> List[List[int]]:
+    """Tramos de índices consecutivos de segmentos pequeños (al menos dos)."""
+    runs, cur = [], []
+    for i, seg in enumerate(segments):
+        if seg["n_docs"] < small:
+            cur.append(i)
+        else:
+            if len(cur) > 1:
+                runs.append(cur)
+            cur = []
+    if len(cur) > 1:
+        runs.append(cur)
+    return runs
+
+
+def compact(prefix: str, segment_docs: int = None) -> Dict[str, Any]:
+    """
+    Junta cada tramo de segmentos pequeños consecutivos en segmentos de hasta
+    `segment_docs` documentos, conservando el orden. Borra los ficheros que quedaron
+    obsoletos en la escritura anterior y los segmentos huérfanos de escrituras abortadas.
+    """
+    segment_docs = segment_docs or SEGMENT_DOCS
+    t0 = time.perf_counter()
+    with _locked(prefix):
+        manifest = load_manifest(prefix)
+        segments = manifest["segments"]
+        merged = []
+        for run in reversed(_runs(segments, segment_docs // 2)):
+            docs = [d for i in run for d in _read_segment(prefix, segments[i]["file"])]
+            nuevos = [_write_segment(prefix, docs[j:j + segment_docs]) for j in range(0, len(docs), segment_docs)]
+            merged.extend(segments[i]["file"] for i in run)
+            segments[run[0]:run[-1] + 1] = nuevos
+        borrados = _retire(prefix, manifest, merged)
+        vivos = {s["file"] for s in segments} | set(merged)
+        huerfanos = []
+        for name in os.listdir(store_dir(prefix)):
+            path = os.path.join(store_dir(prefix), name)
+            if SEGMENT_EXT in name and name not in vivos and time.time() - os.path.getmtime(path) > ORPHAN_AGE_S:
+                huerfanos.append(name)
+        _remove(prefix, huerfanos)
+    return {"merged_segments": len(merged), "segments": len(segments), "deleted_files": borrados + len(huerfanos),
+            "elapsed_s": round(time.perf_counter() - t0, 3)}
+
+
+def maybe_compact(prefix: str, background: bool = True):
+    """Compacta si hay COMPACT_MIN_SEGMENTS segmentos pequeños (en un hilo, uno por prefijo a la vez)."""
+    if stats(prefix)["small_segments"] < COMPACT_MIN_SEGMENTS:
+        return None
+    if not background:
+        return compact(prefix)
+    # comprobar y apuntar a la vez: dos commits seguidos no lanzan dos hilos
+    with _locks_guard:
+        if prefix in _compacting:
+            return None
+        _compacting.add(prefix)
+
+    def _run():
+        try:
+            res = compact(prefix)
+            print(f"[raw_store] {prefix}: compactados {res['merged_segments']} segmentos ({res['elapsed_s']}s)")
+        except Exception as e:
+            print(f"[raw_store] {prefix}: compactación fallida: {e}")
+        finally:
+            with _locks_guard:
+                _compacting.discard(prefix)
+
+    # no daemon: el proceso espera a que termine antes de salir
+    t = threading.Thread(target=_run, name=f"raw-compact-{prefix}")
+    t.start()
+    return t
+
+
+def _fecha_iso(doc: Dict[str, Any]) -> Dict[str, Any]:
+    fecha = doc.get("fecha")
+    if isinstance(fecha, str) and fecha:
+        doc["fecha"] = fechas.normalizar_fecha_dayfirst(fecha) or fecha
+    return doc
+
+
+def migrate(prefix: str, legacy_paths: List[str] = None) -> Dict[str, Any]:
+    """
+    Importa data/raw/{prefix}_raw.jsonl o _raw.json (el primero que exista) como contenido
+    del store, con las fechas pasadas a YYYY-MM-DD (los rangos del manifest comparan texto).
+    """
+    for path in legacy_paths or [os.path.join(STORE_DIR, f"{prefix}_raw.jsonl"),
+                                 os.path.join(STORE_DIR, f"{prefix}_raw.json")]:
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            data = (json.loads(ln) for ln in f if ln.strip()) if path.endswith(".jsonl") else json.load(f)
+            res = replace(prefix, (_fecha_iso(d) for d in data))
+        return {**res, "from": path}
+    return {"n_docs": 0, "from": None}
+
+
+# ------------------------------- CLI -------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store raw de sorteos en segmentos JSONL comprimidos")
+    parser.add_argument("cmd", choices=["stats", "migrate", "compact"])
+    parser.add_argument("--name", default=os.environ.get("JUEGO", "primitiva"), help="prefijo (primitiva, bonoloto...)")
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        print("Migración:", migrate(args.name))
+    elif args.cmd == "compact":
+        print("Compactación:", compact(args.name))
+    print("Store:", stats(args.name))
@@ -0,0 +1,342 @@
+# src/repository.py
+"""
+Acceso a los sorteos detrás de una interfaz común (DrawRepository), con tres backends:
+- mongo  : colección {MONGO_COLL_BASE}_{prefix}; consultas por fecha de src/mongo_queries.py
+           y escritura por lotes con detección de cambios de src/bulk_writer.py; cada upsert
+           mantiene también stats_{prefix} (src/materialized_stats.py).
+- file   : data/processed/{prefix}_processed.csv + snapshot .npz (memory-map, src/draws.py).
+- memory : un DrawBatch por prefijo en el proceso (benchmarks y pipelines sin base de datos).
+Las lecturas (read / between / last / since) devuelven DrawBatch ordenado por fecha
+ascendente; upsert() acepta DrawBatch, DataFrame o dicts del scraper y devuelve el resumen
+habitual (n_docs, unchanged, matched_count, modified_count, upserted_count).
+En file y memory un sorteo se identifica por (fecha, numeros), como el _id de Mongo; con
+claves repetidas gana la última fila y las filas sin fecha o sin números no se guardan.
+get_repository() elige backend: argumento > DRAW_BACKEND > default de quien llama
+(scraper y ETL escriben en 'mongo', los loaders de ML leen de 'file').
+Variables de entorno:
+    DRAW_BACKEND  (mongo | file | memory)
+    DRAW_FILE_DIR (default: data/processed)
+"""
+
+import os
+import threading
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Any, Dict, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src import draws, ingest
+    from src.draws import DrawBatch, NO_FECHA
+except Exception:
+    import draws
+    import ingest
+    from draws import DrawBatch, NO_FECHA
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+FILE_DIR = os.environ.get("DRAW_FILE_DIR", os.path.join(BASE, "data", "processed"))
+CSV_COLUMNS = ["juego", "fecha", "n1", "n2", "n3", "n4", "n5", "n6", "complementario", "reintegro", "fuente"]
+STREAM_BATCH_SIZE = 500
+_COUNT_KEYS = ("n_docs", "n_ops", "unchanged", "matched_count", "modified_count", "upserted_count")
+
+Draws = Union[DrawBatch, pd.DataFrame, Iterable[Dict[str, Any]]]
+
+
+def to_batch(data: Draws) -> DrawBatch:
+    """DrawBatch de cualquiera de las entradas de upsert() (fechas normalizadas a días)."""
+    if isinstance(data, DrawBatch):
+        return data
+    if isinstance(data, pd.DataFrame):
+        return DrawBatch.from_frame(data)
+    rows = list(data)
+    if rows and "numeros" not in rows[0] and "n1" in rows[0]:
+        return DrawBatch.from_frame(pd.DataFrame(rows))
+    return DrawBatch.from_dicts(rows, normalize_fecha=True)
+
+
+class DrawRepository(ABC):
+    """Interfaz común; los backends implementan between, last, since y upsert."""
+    name = ""
+
+    def read(self, prefix: str) -> DrawBatch:
+        """Todo el histórico de `prefix`."""
+        return self.between(prefix)
+
+    @abstractmethod
+    def between(self, prefix: str, desde: str = None, hasta: str = None) -> DrawBatch:
+        """Sorteos con desde <= fecha <= hasta (YYYY-MM-DD; cualquiera de los dos puede faltar)."""
+
+    @abstractmethod
+    def last(self, prefix: str, n: int, hasta: str = None) -> DrawBatch:
+        """Los `n` sorteos más recientes (hasta `hasta` incluida)."""
+
+    @abstractmethod
+    def since(self, prefix: str, fecha: str) -> DrawBatch:
+        """Sorteos estrictamente posteriores a `fecha`."""
+
+    def latest_fecha(self, prefix: str) -> Union[str, None]:
+        """Fecha del sorteo más reciente, o None si no hay ninguno."""
+        ultimo = self.last(prefix, 1)
+        return ultimo.fechas_iso()[0] if len(ultimo) else None
+
+    @abstractmethod
+    def upsert(self, prefix: str, data: Draws, ordered: bool = False, **kwargs) -> Dict[str, Any]:
+        """Alta o actualización de `data`; devuelve el resumen (ver el docstring del módulo)."""
+
+    def upsert_stream(self, prefix: str, rows: Iterable[Dict[str, Any]], batch_size: int = None,
+                      ordered: bool = False, **kwargs) -> Dict[str, Any]:
+        """upsert() por trozos de `batch_size` filas, sin materializar toda la entrada."""
+        batch_size = batch_size or STREAM_BATCH_SIZE
+        summary = {"ok": True, **{k: 0 for k in _COUNT_KEYS}}
+        it = iter(rows)
+        while True:
+            part = list(islice(it, batch_size))
+            if not part:
+                break
+            res = self.upsert(prefix, part, ordered=ordered, **kwargs)
+            if not res.get("ok") and res.get("reason") not in ("no_results", "no_ops"):
+                return res
+            for k in _COUNT_KEYS:
+                summary[k] += res.get(k) or 0
+        if not summary["n_docs"]:
+            return {"ok": False, "reason": "no_results"}
+        return summary
+
+
+# ------------------------------- mongo -------------------------------------
+class MongoRepository(DrawRepository):
+    name = "mongo"
+
+    def __init__(self):
+        # pymongo solo se importa si se usa este backend
+        try:
+            from src import mongo_queries, bulk_writer, materialized_stats
+        except Exception:
+            import mongo_queries
+            import bulk_writer
+            import materialized_stats
+        self._queries = mongo_queries
+        self._writer = bulk_writer
+        self._stats = materialized_stats
+
+    def between(self, prefix, desde=None, hasta=None):
+        return DrawBatch.from_dicts(self._queries.draws_between(prefix, desde, hasta))
+
+    def last(self, prefix, n, hasta=None):
+        return DrawBatch.from_dicts(self._queries.last_draws(prefix, n, hasta))
+
+    def since(self, prefix, fecha):
+        return DrawBatch.from_dicts(self._queries.draws_since(prefix, fecha))
+
+    def upsert(self, prefix, data, ordered=False, **kwargs):
+        if isinstance(data, (DrawBatch, pd.DataFrame, list)) and not len(data):
+            return {"ok": False, "reason": "no_results"}
+        docs = ingest.build_docs(data)
+        if not docs:
+            return {"ok": False, "reason": "no_ops"}
+        # stats_{prefix} se actualiza con los sorteos nuevos (src/materialized_stats.py)
+        tracker = self._stats.on_upsert(prefix)
+        if tracker is not None:
+            docs = tracker.watch(docs)
+        summary = self._writer.write_docs(self._queries.get_collection(prefix), docs, ordered=ordered, **kwargs)
+        return self._stats.finish_safely(tracker, summary)
+
+    def upsert_stream(self, prefix, rows, batch_size=None, ordered=False, **kwargs):
+        # bulk_writer ya escribe unos lotes mientras se construyen los siguientes
+        batch_size = batch_size or STREAM_BATCH_SIZE
+        docs = ingest.iter_docs(rows, batch_size)
+        tracker = self._stats.on_upsert(prefix)
+        if tracker is not None:
+            docs = tracker.watch(docs)
+        summary = self._writer.write_docs(self._queries.get_collection(prefix), docs,
+                                          ordered=ordered, batch_size=batch_size, **kwargs)
+        if not summary.get("n_docs") and summary.get("ok"):
+            return {"ok": False, "reason": "no_results"}
+        return self._stats.finish_safely(tracker, summary)
+
+
+# ------------------------- backends columnares ------------------------------
+def _key_view(batch: DrawBatch) -> np.ndarray:
+    """Clave (fecha, numeros) de cada fila como un valor void comparable en bloque."""
+    keys = np.ascontiguousarray(np.column_stack([np.asarray(batch.fecha, dtype=np.int64),
+                                                 np.asarray(batch.numeros, dtype=np.int64)]))
+    return keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+
+
+def _fuente(batch: DrawBatch) -> np.ndarray:
+    return batch.fuente if batch.fuente is not None else np.full(len(batch), "", dtype=object)
+
+
+def merge(old: DrawBatch, new: DrawBatch):
+    """
+    (resultado, resumen) de aplicar `new` sobre `old`: las claves nuevas se añaden, las
+    existentes se sustituyen si cambió algún campo. Resultado ordenado por fecha ascendente;
+    None si no cambia nada (no hace falta reescribir).
+    """
+    n_docs = len(new)
+    # con clave repetida gana la última fila, como en mongo_upsert.changed_ops
+    new = new.take(np.arange(len(new))[::-1]).dedupe()
+    new = new.take(np.arange(len(new))[::-1])
+    summary = {"ok": True, "n_docs": n_docs, "n_ops": 0, "unchanged": 0,
+               "matched_count": 0, "modified_count": 0, "upserted_count": 0}
+    if not len(new):
+        return None, summary
+
+    old_k, new_k = _key_view(old), _key_view(new)
+    order = np.argsort(old_k, kind="stable")
+    pos = np.minimum(np.searchsorted(old_k[order], new_k), max(len(old_k) - 1, 0))
+    hit = old_k[order][pos] == new_k if len(old_k) else np.zeros(len(new), dtype=bool)
+    j = order[pos[hit]]
+    same = ((old.complementario[j] == new.complementario[hit]) & (old.reintegro[j] == new.reintegro[hit])
+            & (old.juego[j] == new.juego[hit]) & (_fuente(old)[j] == _fuente(new)[hit]))
+
+    summary["matched_count"] = int(hit.sum())
+    summary["unchanged"] = int(same.sum())
+    summary["modified_count"] = summary["matched_count"] - summary["unchanged"]
+    summary["upserted_count"] = int((~hit).sum())
+    summary["n_ops"] = summary["modified_count"] + summary["upserted_count"]
+    if not summary["n_ops"]:
+        return None, summary
+    merged = DrawBatch.concat([new, old]).dedupe().sort_by_fecha(descending=False)
+    return merged, summary
+
+
+class _BatchRepository(DrawRepository):
+    """Backends que guardan el histórico entero como un DrawBatch ordenado por fecha."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self, prefix: str) -> DrawBatch:
+        """Histórico guardado de `prefix` (vacío si no hay)."""
+
+    @abstractmethod
+    def _store(self, prefix: str, batch: DrawBatch):
+        """Sustituye el histórico de `prefix` por `batch`."""
+
+    def between(self, prefix, desde=None, hasta=None):
+        batch = self.read(prefix)
+        mask = batch.fecha != NO_FECHA
+        if desde:
+            mask &= batch.fecha >= draws.fecha_to_days(desde)
+        if hasta:
+            mask &= batch.fecha <= draws.fecha_to_days(hasta)
+        return batch.take(np.flatnonzero(mask))
+
+    def read(self, prefix):
+        return self._load(prefix)
+
+    def last(self, prefix, n, hasta=None):
+        batch = self.between(prefix, hasta=hasta)
+        return batch.take(np.arange(max(len(batch) - int(n), 0), len(batch)))
+
+    def since(self, prefix, fecha):
+        return self.read(prefix).after(fecha)
+
+    def upsert(self, prefix, data, ordered=False, **kwargs):
+        new = to_batch(data)
+        if not len(new):
+            return {"ok": False, "reason": "no_results"}
+        with self._lock:
+            merged, summary = merge(self._load(prefix), new)
+            if merged is not None:
+                self._store(prefix, merged)
+        summary["backend"] = self.name
+        return summary
+
+
+class MemoryRepository(_BatchRepository):
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._data: Dict[str, DrawBatch] = {}
+
+    def _load(self, prefix):
+        return self._data.get(prefix, DrawBatch.empty())
+
+    def _store(self, prefix, batch):
+        self._data[prefix] = batch
+
+    def clear(self, prefix: str = None):
+        if prefix is None:
+            self._data.clear()
+        else:
+            self._data.pop(prefix, None)
+
+
+class FileRepository(_BatchRepository):
+    """
+    El processed CSV de siempre (lo que leen features.py y utils_ml) más su snapshot .npz;
+    las lecturas van al snapshot si está al día con el CSV.
+    """
+    name = "file"
+
+    def __init__(self, base_dir: str = None):
+        super().__init__()
+        self.base_dir = base_dir or FILE_DIR
+
+    def csv_path(self, prefix: str) -> str:
+        return os.path.join(self.base_dir, f"{prefix}_processed.csv")
+
+    def _load(self, prefix, missing_ok=True):
+        path = self.csv_path(prefix)
+        batch = draws.read_snapshot(path)
+        if batch is not None:
+            return batch
+        if not os.path.exists(path):
+            if missing_ok:
+                return DrawBatch.empty()
+            # mensaje útil para debugging
+            files = os.listdir(self.base_dir) if os.path.isdir(self.base_dir) else []
+            raise FileNotFoundError(
+                f"No se encontró el CSV procesado en '{path}'. "
+                f"Archivos disponibles en {self.base_dir}: {files}"
+            )
+        # fechas con la misma normalización que el ETL (YYYY-MM-DD o dd/mm/yyyy)
+        batch = DrawBatch.from_frame(pd.read_csv(path, dtype=str))
+        if len(batch) > 1 and (np.diff(batch.fecha.astype(np.int64)) < 0).any():
+            batch = batch.sort_by_fecha(descending=False)
+        try:
+            draws.write_snapshot(path, batch)
+        except Exception as e:
+            print("No se pudo escribir el snapshot:", e)
+        return batch
+
+    def read(self, prefix):
+        return self._load(prefix, missing_ok=False)
+
+    def _store(self, prefix, batch):
+        os.makedirs(self.base_dir, exist_ok=True)
+        path = self.csv_path(prefix)
+        df = batch.to_frame()
+        df["fuente"] = _fuente(batch)
+        tmp = f"{path}.tmp{os.getpid()}"
+        df.to_csv(tmp, index=False, columns=CSV_COLUMNS)
+        os.replace(tmp, path)
+        draws.write_snapshot(path, batch)
+
+
+# ------------------------------ selección ----------------------------------
+BACKENDS = {"mongo": MongoRepository, "file": FileRepository, "memory": MemoryRepository}
+_instances: Dict[str, DrawRepository] = {}
+_instances_lock = threading.Lock()
+
+
+def backend_name(backend: str = None, default: str = "mongo") -> str:
+    name = (backend or os.environ.get("DRAW_BACKEND") or default).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconocido '{name}' (opciones: {', '.join(BACKENDS)})")
+    return name
+
+
+def get_repository(backend: str = None, default: str = "mongo") -> DrawRepository:
+    """Repositorio del backend pedido (una instancia por proceso: memory comparte los datos)."""
+    name = backend_name(backend, default)
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
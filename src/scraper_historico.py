@@ -1,50 +1,228 @@
-import requests
-from bs4 import BeautifulSoup
+# src/scraper_historico.py
+"""
+Scraper de páginas históricas (una tabla de sorteos por página) y backfill reanudable.
+- obtener_todos_resultados(url): una página -> lista de sorteos.
+- backfill(): recorre una lista de páginas (p.ej. una por año) con un pool de hilos,
+  sube cada página a Mongo con el mismo upsert por lotes que src.scraper_mongo y
+  apunta las páginas terminadas en data/backfill_state.json; si se interrumpe, la
+  siguiente ejecución continúa por las que faltan.
+Variables de entorno:
+    BACKFILL_STATE_FILE (default: data/backfill_state.json)
+    BACKFILL_WORKERS    (default: 8)
+
+Uso:
+  python -m src.scraper_historico --url-template "https://.../primitiva/{anio}" --desde 1985 --hasta 2024
+  python -m src.scraper_historico --urls-file paginas.txt --name bonoloto --juego Bonoloto
+  python -m src.scraper_historico --url-template "..." --desde 1985 --restart   # ignora el checkpoint
+"""
+
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from typing import Any, Dict, List, Union
 
-def normalizar_fecha(fecha_str: str) -> str:
-    meses = {
-        "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
-        "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
-        "septiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
-    }
-    try:
-        partes = fecha_str.lower().replace(",", "").split()
-        dia = int(partes[1])
-        mes = meses[partes[2]]
-        anio = int(partes[3])
-        return datetime(anio, mes, dia).strftime("%Y-%m-%d")
-    except Exception:
-        return fecha_str
+from bs4 import BeautifulSoup
+
+try:
+    from src import fechas
+    from src.fetcher import fetch
+except Exception:
+    import fechas
+    from fetcher import fetch
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+STATE_FILE = os.environ.get("BACKFILL_STATE_FILE", os.path.join(BASE, "data", "backfill_state.json"))
+BACKFILL_WORKERS = int(os.environ.get("BACKFILL_WORKERS", 8))
+
+_state_lock = threading.Lock()
+
+
+def normalizar_fecha(fecha_str: str) -> Union[str, None]:
+    # "Lunes, 5 enero 2024" / "5 de enero de 2024" / dd/mm/yyyy...; None si no se reconoce
+    return fechas.normalizar_fecha(fecha_str)
 
-def parsear_fila(fila):
+def parsear_fila(fila, juego: str = "Primitiva"):
     columnas = fila.find_all("td")
     if not columnas or len(columnas) < 4:
         return None
-    fecha = normalizar_fecha(columnas[0].get_text(strip=True))
+    texto = columnas[0].get_text(strip=True)
+    fecha = normalizar_fecha(texto)
+    if fecha is None:
+        # Mongo ordena y filtra fecha como texto: la fila (nota, "sorteo extraordinario"...) no se guarda
+        print(f"[historico] fila descartada, fecha no reconocida: {texto!r}")
+        return None
     numeros = [int(x) for x in columnas[1].get_text(strip=True).split()]
     complementario = int(columnas[2].get_text(strip=True))
     reintegro = int(columnas[3].get_text(strip=True))
     return {
-        "juego": "Primitiva",
+        "juego": juego,
         "fecha": fecha,
         "numeros": numeros,
         "complementario": complementario,
         "reintegro": reintegro,
     }
 
+def parsear_pagina(html: str, juego: str = "Primitiva", saltar_errores: bool = False) -> List[dict]:
+    """Parsea cada fila una sola vez. Con saltar_errores, las filas con celdas no numéricas se ignoran."""
+    soup = BeautifulSoup(html, "html.parser")
+    filas = soup.find_all("tr")[1:]  # saltamos cabecera
+    resultados = []
+    for f in filas:
+        try:
+            r = parsear_fila(f, juego)
+        except ValueError:
+            if not saltar_errores:
+                raise
+            continue
+        if r:
+            resultados.append(r)
+    return resultados
+
 def obtener_todos_resultados(url: str):
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/115.0 Safari/537.36"
-        )
-    }
-    resp = requests.get(url, headers=headers, timeout=10)
+    resp = fetch(url, timeout=10)
+    if resp is None:
+        raise ConnectionError(f"no se pudo descargar {url}")
     resp.raise_for_status()
+    return parsear_pagina(resp.text)
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    filas = soup.find_all("tr")[1:]  # saltamos cabecera
-    resultados = [parsear_fila(f) for f in filas if parsear_fila(f)]
-    return resultados
+
+# ------------------------- checkpoint del backfill -------------------------
+def load_state() -> Dict[str, Any]:
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_state(state: Dict[str, Any]):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = f"{STATE_FILE}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+def marcar_pagina(prefix: str, url: str, **fields):
+    """Guarda el resultado de una página (done / error) en el checkpoint de `prefix`."""
+    with _state_lock:
+        state = load_state()
+        pages = state.setdefault(prefix, {})
+        pages[url] = {**fields, "at": datetime.now().isoformat(timespec="seconds")}
+        _save_state(state)
+
+
+def paginas_pendientes(prefix: str, urls: List[str]) -> List[str]:
+    pages = load_state().get(prefix, {})
+    return [u for u in urls if not pages.get(u, {}).get("done")]
+
+
+def reset_state(prefix: str):
+    with _state_lock:
+        state = load_state()
+        if state.pop(prefix, None) is not None:
+            _save_state(state)
+
+
+def paginas_por_anio(plantilla: str, desde: int, hasta: int) -> List[str]:
+    """URLs a partir de una plantilla con {anio}, de la más reciente a la más antigua."""
+    return [plantilla.format(anio=a) for a in range(hasta, desde - 1, -1)]
+
+
+# --------------------------------- backfill --------------------------------
+def _descargar_y_parsear(url: str, juego: str) -> List[dict]:
+    resp = fetch(url, timeout=15)
+    if resp is None:
+        raise ConnectionError("sin respuesta")
+    resp.raise_for_status()
+    return parsear_pagina(resp.text, juego, saltar_errores=True)
+
+
+def backfill(urls: List[str], prefix: str, juego: str = "Primitiva", workers: int = None,
+             to_mongo: bool = True, ordered: bool = False) -> Dict[str, Any]:
+    """
+    Descarga y parsea las páginas pendientes en paralelo. Cada página terminada se sube
+    a Mongo (upsert_to_mongo de src.scraper_mongo, un bulk_write por página mientras los
+    hilos siguen descargando) y solo entonces se marca como hecha en el checkpoint.
+    Las que fallen quedan pendientes para la próxima ejecución. stats_{prefix} se
+    reconstruye una sola vez al terminar (materialized_stats.deferred).
+    """
+    try:
+        from src.scraper_mongo import upsert_to_mongo, MONGO_URI
+        from src import mongo_pool, materialized_stats
+    except Exception:
+        from scraper_mongo import upsert_to_mongo, MONGO_URI
+        import mongo_pool
+        import materialized_stats
+
+    if to_mongo and not mongo_pool.healthy(MONGO_URI):
+        raise ConnectionError("Mongo no responde; el backfill no puede avanzar el checkpoint")
+    pendientes = paginas_pendientes(prefix, urls) if to_mongo else list(urls)
+    print(f"[backfill] {prefix}: {len(urls) - len(pendientes)} páginas ya hechas, {len(pendientes)} pendientes")
+    resumen = {"paginas_ok": 0, "paginas_error": 0, "filas": 0, "upserted": 0, "modified": 0}
+    if not pendientes:
+        return resumen
+
+    # las páginas llegan de la más reciente a la más antigua: sin diferir, cada una
+    # reconstruiría stats_{prefix}; así se reconstruye una vez al final
+    with materialized_stats.deferred(prefix) as stats:
+        with ThreadPoolExecutor(max_workers=workers or BACKFILL_WORKERS) as pool:
+            futures = {pool.submit(_descargar_y_parsear, u, juego): u for u in pendientes}
+            for fut in as_completed(futures):
+                url = futures[fut]
+                try:
+                    filas = fut.result()
+                except Exception as e:
+                    resumen["paginas_error"] += 1
+                    print(f"[backfill] error en {url}: {e}")
+                    if to_mongo:
+                        marcar_pagina(prefix, url, done=False, error=str(e))
+                    continue
+                resumen["filas"] += len(filas)
+                if to_mongo:
+                    res = upsert_to_mongo(filas, prefix=prefix, ordered=ordered) if filas else {"ok": True}
+                    if not res.get("ok"):
+                        resumen["paginas_error"] += 1
+                        print(f"[backfill] Mongo falló en {url}: {res.get('error') or res.get('reason')}")
+                        marcar_pagina(prefix, url, done=False, error=str(res.get("error") or res.get("reason")))
+                        continue
+                    resumen["upserted"] += res.get("upserted_count") or 0
+                    resumen["modified"] += res.get("modified_count") or 0
+                    marcar_pagina(prefix, url, done=True, rows=len(filas))
+                resumen["paginas_ok"] += 1
+                print(f"[backfill] {url}: {len(filas)} sorteos")
+    if stats["stats"]:
+        resumen["stats"] = stats["stats"]
+    return resumen
+
+
+# ------------------------------- CLI -------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill histórico reanudable -> Mongo")
+    src_group = parser.add_mutually_exclusive_group(required=True)
+    src_group.add_argument("--url-template", help="URL con {anio} (ej: https://.../resultados/{anio})")
+    src_group.add_argument("--urls-file", help="fichero con una URL por línea")
+    parser.add_argument("--desde", type=int, default=1985, help="primer año (con --url-template)")
+    parser.add_argument("--hasta", type=int, default=datetime.now().year, help="último año (con --url-template)")
+    parser.add_argument("--name", default="primitiva", help="prefijo de colección (y clave del checkpoint)")
+    parser.add_argument("--juego", default="Primitiva", help="valor del campo juego")
+    parser.add_argument("--workers", type=int, default=None, help=f"hilos de descarga (default {BACKFILL_WORKERS})")
+    parser.add_argument("--restart", action="store_true", help="olvidar el checkpoint y empezar de cero")
+    parser.add_argument("--no-mongo", action="store_true", help="solo descargar y parsear (sin checkpoint)")
+    parser.add_argument("--ordered", action="store_true", help="bulk_write ordered (más lento pero predecible).")
+    args = parser.parse_args()
+
+    if args.url_template:
+        urls = paginas_por_anio(args.url_template, args.desde, args.hasta)
+    else:
+        with open(args.urls_file, "r", encoding="utf-8") as f:
+            urls = [ln.strip() for ln in f if ln.strip() and not ln.startswith("#")]
+
+    if args.restart:
+        reset_state(args.name)
+    resumen = backfill(urls, args.name, juego=args.juego, workers=args.workers,
+                       to_mongo=not args.no_mongo, ordered=args.ordered)
+    print("Resumen backfill:", resumen)
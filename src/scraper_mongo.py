@@ -7,36 +7,66 @@ Refactor del scraper original: ahora inserta/actualiza directamente en MongoDB (
     MONGO_URI (default: mongodb://localhost:27017/)
     MONGO_DB  (default: loterias)
     MONGO_COLL_BASE (default: resultados_loterias)
+    UPSERT_BATCH_SIZE (default: 500)   documentos por bulk_write en el modo streaming
+    DRAW_BACKEND (default: mongo)      dónde se escriben los sorteos (src/repository.py: mongo | file | memory)
+- --save: el raw va a data/raw/{prefix}/ en segmentos JSONL comprimidos (solo los sorteos
+  posteriores a los ya guardados) y el processed CSV se reescribe.
+- Sin --save (o con --incremental) se usa el pipeline en streaming: cada hoja se sube
+  a Mongo por lotes en cuanto se parsea, sin acumular el histórico en memoria.
 
 Uso:
   python src/scraper_mongo.py --which 2        # extrae URL2 (bonoloto) y carga en Mongo
   python src/scraper_mongo.py --url "...+..." --save   # extrae varias urls, guarda archivos y carga en Mongo
   python src/scraper_mongo.py --which 1 --no-mongo      # extrae y solo guarda archivos (sin insertar en Mongo)
+  python src/scraper_mongo.py --which 2 --no-cache      # ignora la caché HTTP (data/http_cache)
+  python src/scraper_mongo.py --which 2 --incremental   # solo sorteos posteriores a la última fecha en Mongo
+  python src/scraper_mongo.py --which 2 --no-mongo --record data/fixtures/bonoloto   # graba las respuestas HTTP
+  python src/scraper_mongo.py --which 2 --no-mongo --replay data/fixtures/bonoloto   # las reproduce sin red
+  python src/scraper_mongo.py --which 2 --budget 120    # máximo 120 s por fuente (descargas + reintentos)
 
 """
 
 import os
 import re
-import json
+import csv
+import time
+import queue
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from io import StringIO
-from typing import List, Union, Dict, Any
-from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Union
 
-import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 load_dotenv()
+try:
+    from src.fetcher import Deadline, fetch, fetch_first, iter_fetch, set_mode as set_fetch_mode
+    from src import http_cache, table_parser, source_planner, fechas, html_tables
+    from src import draws, mongo_pool, mongo_queries, repository, raw_store
+    from src.draws import DrawBatch, as_batch, as_dicts
+except Exception:
+    from fetcher import Deadline, fetch, fetch_first, iter_fetch, set_mode as set_fetch_mode
+    import fechas
+    import http_cache
+    import table_parser
+    import source_planner
+    import html_tables
+    import draws
+    import mongo_pool
+    import mongo_queries
+    import repository
+    import raw_store
+    from draws import DrawBatch, as_batch, as_dicts
 # Mongo
-from pymongo import MongoClient, ReplaceOne
-from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.errors import PyMongoError
 
 # ----------------- CONFIG: ajusta estas URLs a tus hojas -------------------
 URL1 = os.environ.get("URL_SHEET_1",
     "https://docs.google.com/spreadsheets/u/0/d/1MVwwP3fsPK6Mcc3F0Fv1W6t92-PiTvfXjnZx0BAJOu0/pub?output=html&widget=true")
 URL2 = os.environ.get("URL_SHEET_2",
     "https://docs.google.com/spreadsheets/u/0/d/175SqVQ3E7PFZ0ebwr2o98Kb6YEAwSUykGFh6ascEfI0/pub?output=html&widget=true")
-HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0 Safari/537.36"}
 # -------------------------------------------------------------------------
 
 # Mongo config
@@ -44,65 +74,17 @@ MONGO_URI = os.environ.get("MONGO_URI")
 MONGO_DB = os.environ.get("MONGO_DB", "loterias")
 MONGO_COLL_BASE = os.environ.get("MONGO_COLL_BASE", "resultados_loterias")
 
+# pipeline en streaming: documentos por bulk_write y bloques en cola entre fuentes y Mongo
+UPSERT_BATCH_SIZE = int(os.environ.get("UPSERT_BATCH_SIZE", 500))
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 16))
+
 # local file paths (optional)
 BASE = os.path.join(os.path.dirname(__file__), "..")
-RAW_DIR = os.path.join(BASE, "data", "raw")
 PROC_DIR = os.path.join(BASE, "data", "processed")
 
-_MESES = {
-    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
-    "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
-    "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12
-}
-
 # -------------------- utilidades de fecha / parsing ----------------------
 def _normalizar_fecha(fecha_str: str) -> Union[str, None]:
-    if fecha_str is None:
-        return None
-    s = str(fecha_str).strip()
-    if not s:
-        return None
-    s = s.replace("\xa0", " ").replace(",", " ").strip()
-
-    for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d.%m.%Y"):
-        try:
-            dt = datetime.strptime(s, fmt)
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
-            pass
-
-    toks = s.lower().split()
-    for i in range(len(toks)):
-        if toks[i].isdigit() and i + 2 < len(toks):
-            try:
-                dia = int(toks[i])
-                mes = _MESES.get(toks[i + 1])
-                anio = int(re.sub(r'\D', '', toks[i + 2]))
-                if mes:
-                    return datetime(anio, mes, dia).strftime("%Y-%m-%d")
-            except Exception:
-                continue
-
-    if re.fullmatch(r'^\d{4,5}$', s):
-        try:
-            serial = int(s)
-            dt = datetime(1899, 12, 30) + timedelta(days=serial)
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
-            pass
-
-    m = re.search(r'(\d{1,2})\D+(enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre)\D+(\d{4})', s, re.IGNORECASE)
-    if m:
-        try:
-            dia = int(m.group(1))
-            mes = _MESES.get(m.group(2).lower())
-            anio = int(m.group(3))
-            if mes:
-                return datetime(anio, mes, dia).strftime("%Y-%m-%d")
-        except Exception:
-            pass
-
-    return None
+    return fechas.normalizar_fecha(fecha_str)
 
 
 def _extract_ints_from_text(text: str) -> List[int]:
@@ -185,9 +167,7 @@ def _parse_row_from_cells(cells: List[str], juego_name: str) -> Union[dict, None
     }
 
 # ------------------- obtener CSV desde puburl (varios gid) -----------------
-def _try_csv_from_puburl(url: str) -> Union[str, None]:
-    if not url:
-        return None
+def _csv_candidates(url: str) -> List[str]:
     candidates = []
     if "pubhtml" in url:
         candidates.append(url.replace("pubhtml?output=html", "pub?output=csv"))
@@ -201,64 +181,180 @@ def _try_csv_from_puburl(url: str) -> Union[str, None]:
         candidates.append(f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv")
         for gid in range(0, 8):
             candidates.append(f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}")
+    return candidates
 
-    for c in candidates:
-        try:
-            resp = requests.get(c, headers=HEADERS, timeout=15)
-            if resp.status_code == 200 and ("," in resp.text or "\n" in resp.text):
-                return resp.text
-        except Exception:
+
+def _try_csv_from_puburl(url: str, deadline: Deadline = None) -> Union[tuple, None]:
+    """
+    Lanza todas las candidatas en paralelo y devuelve (url, csv) de la primera válida en
+    orden de prioridad (pub > export > gid 0..7), no de la que antes responda.
+    Las candidatas muertas (4xx / no CSV) quedan en la caché negativa y no se vuelven a pedir.
+    """
+    if not url:
+        return None
+    return fetch_first(_csv_candidates(url), timeout=15, deadline=deadline)
+
+# ----------------- filas -> resultados (con corte incremental) -------------
+def _parse_rows(rows: Iterable[List[str]], juego_name: str, since: str = None) -> List[dict]:
+    """
+    Aplica _parse_row_from_cells a cada fila. Si se pasa `since` (YYYY-MM-DD) solo se
+    devuelven sorteos posteriores; en tablas ordenadas de más reciente a más antiguo
+    se deja de leer en cuanto aparece una fila anterior a `since`.
+    """
+    resultados = []
+    prev_fecha = None
+    for cells in rows:
+        parsed = _parse_row_from_cells(cells, juego_name)
+        if not parsed:
+            continue
+        fecha = parsed["fecha"]
+        if since and fecha <= since:
+            if prev_fecha is not None and fecha < prev_fecha:
+                break
+            prev_fecha = fecha
             continue
-    return None
+        prev_fecha = fecha
+        resultados.append(parsed)
+    return resultados
 
-# ----------------- parsear CSV (texto) a resultados -----------------------
-def _parse_csv_text(csv_text: str, juego_name: str) -> List[dict]:
+
+def _cut_since(resultados: List[dict], since: str = None) -> List[dict]:
+    """Mismo criterio de corte que _parse_rows, sobre resultados ya parseados en bloque."""
+    if not since:
+        return resultados
+    out = []
+    prev_fecha = None
+    for r in resultados:
+        fecha = r["fecha"]
+        if fecha <= since:
+            if prev_fecha is not None and fecha < prev_fecha:
+                break
+            prev_fecha = fecha
+            continue
+        prev_fecha = fecha
+        out.append(r)
+    return out
+
+
+def _df_rows(df) -> Iterable[List[str]]:
+    for _, row in df.iterrows():
+        yield ["" if v is None else str(v) for v in row.tolist()]
+
+
+def _parse_frame(df, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    """
+    Parser vectorizado (table_parser); si falla, parser fila a fila. Con `since` las filas
+    antiguas se descartan en el frame, tras leer la fecha y antes de construir los dicts.
+    """
     try:
-        import pandas as pd
-        df = pd.read_csv(StringIO(csv_text), sep=None, engine="python", encoding="utf-8")
-    except Exception:
+        res = table_parser.parse_frame(table_parser.as_str_frame(df), juego_name,
+                                       _parse_row_from_cells, source=source, since=since)
+        return _cut_since(res, since)
+    except Exception as e:
+        print(f"[warning] parser vectorizado falló ({source}): {e}; se usa el parser por fila")
+        return _parse_rows(_df_rows(df), juego_name, since)
+
+# ----------------- parsear CSV (texto) a resultados -----------------------
+def _read_csv_df(csv_text: str, as_str: bool = True):
+    """
+    Lee el CSV. Con as_str=True todas las celdas quedan como texto tal cual (para el
+    parser vectorizado) y el separador se detecta con csv.Sniffer + motor C.
+    """
+    import pandas as pd
+    if not as_str:
         try:
-            import pandas as pd
-            df = pd.read_csv(StringIO(csv_text), encoding="latin-1")
+            return pd.read_csv(StringIO(csv_text), sep=None, engine="python", encoding="utf-8")
         except Exception:
-            return []
+            return pd.read_csv(StringIO(csv_text), encoding="latin-1")
+    try:
+        sep = csv.Sniffer().sniff(csv_text[:8192], delimiters=",;\t|").delimiter
+        engine = "c"
+    except Exception:
+        sep, engine = None, "python"
+    return pd.read_csv(StringIO(csv_text), sep=sep, engine=engine, dtype=str, keep_default_na=False)
+
+
+def _parse_csv_text_rowwise(csv_text: str, juego_name: str, since: str = None) -> List[dict]:
+    """Parser original fila a fila (iterrows + _parse_row_from_cells). Se mantiene como referencia."""
+    try:
+        df = _read_csv_df(csv_text, as_str=False)
+    except Exception:
+        return []
+    return _parse_rows(_df_rows(df), juego_name, since)
+
 
+def _parse_csv_text_nocache(csv_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    try:
+        df = _read_csv_df(csv_text)
+    except Exception:
+        return _parse_csv_text_rowwise(csv_text, juego_name, since)
+    return _parse_frame(df, juego_name, since, source)
+
+
+def _parse_csv_text(csv_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    return http_cache.cached_parse("csv", csv_text, juego_name,
+                                   partial(_parse_csv_text_nocache, since=since, source=source),
+                                   variant=since or "")
+
+# ----------------- parsear todas las tablas HTML ---------------------------
+# _parse_html_fast: una sola pasada en streaming (html_tables) + parser vectorizado.
+# Las versiones pd.read_html / BeautifulSoup se mantienen como referencia (src/bench.py).
+def _parse_html_fast_nocache(html_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    import pandas as pd
     resultados = []
-    for _, row in df.iterrows():
-        cells = ["" if v is None else str(v) for v in row.tolist()]
-        parsed = _parse_row_from_cells(cells, juego_name)
-        if parsed:
-            resultados.append(parsed)
+    for k, rows in html_tables.iter_tables(html_text):
+        df = pd.DataFrame(rows, dtype=object).fillna("")
+        table_source = f"{source}#html{k}" if source else None
+        resultados.extend(_parse_frame(df, juego_name, since, table_source))
     return resultados
 
-# ----------------- parsear todas las tablas HTML (pandas + BS) -------------
-def _parse_html_tables_all(html_text: str, juego_name: str) -> List[dict]:
+
+def _parse_html_fast(html_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    return http_cache.cached_parse("html_fast", html_text, juego_name,
+                                   partial(_parse_html_fast_nocache, since=since, source=source),
+                                   variant=since or "")
+
+
+def _parse_html_pandas_nocache(html_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
     resultados = []
     try:
         import pandas as pd
         dfs = pd.read_html(StringIO(html_text))
-        for df in dfs:
-            for _, row in df.iterrows():
-                cells = ["" if v is None else str(v) for v in row.tolist()]
-                parsed = _parse_row_from_cells(cells, juego_name)
-                if parsed:
-                    resultados.append(parsed)
-        if resultados:
-            return resultados
     except Exception:
-        pass
+        return []
+    for k, df in enumerate(dfs):
+        table_source = f"{source}#table{k}" if source else None
+        resultados.extend(_parse_frame(df, juego_name, since, table_source))
+    return resultados
+
+
+def _soup_rows(table) -> Iterable[List[str]]:
+    for tr in table.find_all("tr"):
+        yield [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
+
 
+def _parse_html_soup_nocache(html_text: str, juego_name: str, since: str = None) -> List[dict]:
+    resultados = []
     soup = BeautifulSoup(html_text, "html.parser")
-    tables = soup.find_all("table")
-    for table in tables:
-        filas = table.find_all("tr")
-        for tr in filas:
-            cols = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
-            parsed = _parse_row_from_cells(cols, juego_name)
-            if parsed:
-                resultados.append(parsed)
+    for table in soup.find_all("table"):
+        resultados.extend(_parse_rows(_soup_rows(table), juego_name, since))
     return resultados
 
+
+def _parse_html_pandas(html_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    return http_cache.cached_parse("html_pandas", html_text, juego_name,
+                                   partial(_parse_html_pandas_nocache, since=since, source=source),
+                                   variant=since or "")
+
+
+def _parse_html_soup(html_text: str, juego_name: str, since: str = None) -> List[dict]:
+    return http_cache.cached_parse("html_soup", html_text, juego_name,
+                                   partial(_parse_html_soup_nocache, since=since), variant=since or "")
+
+
+def _parse_html_tables_all(html_text: str, juego_name: str, since: str = None, source: str = None) -> List[dict]:
+    return _parse_html_fast(html_text, juego_name, since, source)
+
 # --------------------- extraer resultados de UNA URL (todas sus hojas) -----
 def _extract_gids_from_html(html: str) -> List[str]:
     gids = set()
@@ -273,233 +369,170 @@ def _extract_gids_from_html(html: str) -> List[str]:
     return sorted(gids, key=int)
 
 
-def obtener_todos_resultados_single(url: str, juego_name: str) -> List[dict]:
-    if not url:
-        return []
-
-    combined_results: List[dict] = []
-    try:
-        resp_main = requests.get(url, headers=HEADERS, timeout=15)
-        resp_main.raise_for_status()
-        html_main = resp_main.text
-    except Exception:
-        html_main = None
-
-    try:
-        csv_text = _try_csv_from_puburl(url)
-        if csv_text:
-            res_csv = _parse_csv_text(csv_text, juego_name)
-            if res_csv:
-                combined_results.extend(res_csv)
-    except Exception:
-        pass
-
-    if html_main:
-        m = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
-        sheet_id = m.group(1) if m else None
+def _sheet_id(url: str) -> Union[str, None]:
+    m = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
+    return m.group(1) if m else None
 
-        gids = _extract_gids_from_html(html_main)
-        if not gids and sheet_id:
-            gids = [0,1]
 
-        if sheet_id:
-            tried = set()
-            for gid in gids:
-                if gid in tried:
-                    continue
-                tried.add(gid)
-                export_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
-                try:
-                    resp = requests.get(export_url, headers=HEADERS, timeout=12)
-                    if resp.status_code == 200 and ("," in resp.text or "\n" in resp.text):
-                        res_gid = _parse_csv_text(resp.text, juego_name)
-                        if res_gid:
-                            combined_results.extend(res_gid)
-                except Exception:
-                    continue
+def _new_stats(url: str) -> Dict[str, Any]:
+    return {"url": url, "rows": 0, "bytes": 0, "fetch_s": 0.0, "parse_s": 0.0, "error": None}
 
-    if html_main:
-        try:
-            import pandas as pd
-            from io import StringIO
-            dfs = pd.read_html(StringIO(html_main))
-            for df in dfs:
-                for _, row in df.iterrows():
-                    cells = ["" if v is None else str(v) for v in row.tolist()]
-                    parsed = _parse_row_from_cells(cells, juego_name)
-                    if parsed:
-                        combined_results.append(parsed)
-        except Exception:
-            pass
 
-    if html_main:
-        try:
-            soup = BeautifulSoup(html_main, "html.parser")
-            tables = soup.find_all("table")
-            for table in tables:
-                filas = table.find_all("tr")
-                for tr in filas:
-                    cols = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
-                    parsed = _parse_row_from_cells(cols, juego_name)
-                    if parsed:
-                        combined_results.append(parsed)
-        except Exception:
-            pass
-
-    if not combined_results:
-        try:
-            resp = requests.get(url, headers=HEADERS, timeout=15)
-            resp.raise_for_status()
-            html = resp.text
+def _timed(stats: Dict[str, Any], key: str, fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        stats[key] += time.perf_counter() - t0
+
+
+def _count_bytes(stats: Dict[str, Any], text: Union[str, None]):
+    if text:
+        stats["bytes"] += len(text.encode("utf-8"))
+
+
+def obtener_todos_resultados_single(url: str, juego_name: str, since: str = None,
+                                    stats: Dict[str, Any] = None, budget: float = None,
+                                    batch: bool = False,
+                                    emit: Callable[[List[dict]], None] = None) -> Union[List[dict], DrawBatch]:
+    """
+    Extrae todos los sorteos de una URL. Las estrategias (CSV export, exports por gid,
+    tablas de la página HTML) las ordena y corta source_planner: en cuanto una da un
+    histórico completo no se ejecutan las demás.
+    Con `since` (YYYY-MM-DD) solo devuelve sorteos de fecha posterior.
+    Si se pasa `stats` (ver _new_stats) se acumulan bytes y tiempos de descarga/parseo.
+    `budget`: segundos totales para esta fuente; al agotarse se devuelve lo ya leído.
+    Con batch=True devuelve un DrawBatch en lugar de la lista de dicts.
+    `emit`: se llama con cada bloque de filas en cuanto se parsea (una hoja/gid, una
+    página), antes de que terminen las demás descargas; ver stream_resultados().
+    """
+    if not url:
+        return []
+    if stats is None:
+        stats = _new_stats(url)
+    deadline = Deadline(budget)
+
+    def _emit(res: List[dict]) -> List[dict]:
+        if emit is not None and res:
+            emit(res)
+        return res
+
+    main = {}
+
+    def _html_main() -> Union[str, None]:
+        # la página principal se descarga una sola vez y solo si alguna estrategia la necesita
+        if "html" not in main:
+            resp_main = _timed(stats, "fetch_s", fetch, url, timeout=15, deadline=deadline)
+            main["html"] = resp_main.text if resp_main is not None and resp_main.ok else None
+            _count_bytes(stats, main["html"])
+        return main["html"]
+
+    def _strategy_csv():
+        first = _timed(stats, "fetch_s", _try_csv_from_puburl, url, deadline)
+        if not first:
+            return False, [], None
+        csv_url, csv_text = first
+        _count_bytes(stats, csv_text)
+        return True, _emit(_timed(stats, "parse_s", _parse_csv_text, csv_text, juego_name, since,
+                                  source=csv_url)), csv_url
+
+    def _strategy_gids():
+        sheet_id = _sheet_id(url)
+        if not sheet_id:
+            return False, [], None
+        html_main = _html_main()
+        known = source_planner.get_url_state(url).get("gids") or []
+        gids = _extract_gids_from_html(html_main) if html_main else []
+        gids = sorted(set(gids) | set(known), key=int)
+        if not gids:
+            gids = ["0", "1"]
+        export_urls = [f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}" for gid in gids]
+        # cada gid se parsea (y se emite) según llega, mientras siguen bajando los demás
+        per_gid = {}
+        fetched = iter_fetch(export_urls, timeout=12, deadline=deadline)
+        t0 = time.perf_counter()
+        for export_url, text in fetched:
+            stats["fetch_s"] += time.perf_counter() - t0
+            _count_bytes(stats, text)
             try:
-                import pandas as pd
-                from io import StringIO
-                dfs = pd.read_html(StringIO(html))
-                for df in dfs:
-                    for _, row in df.iterrows():
-                        cells = ["" if v is None else str(v) for v in row.tolist()]
-                        parsed = _parse_row_from_cells(cells, juego_name)
-                        if parsed:
-                            combined_results.append(parsed)
+                per_gid[export_url] = _emit(_timed(stats, "parse_s", _parse_csv_text, text, juego_name, since,
+                                                   source=export_url))
             except Exception:
-                soup = BeautifulSoup(html, "html.parser")
-                tables = soup.find_all("table")
-                for table in tables:
-                    filas = table.find_all("tr")
-                    for tr in filas:
-                        cols = [td.get_text(" ", strip=True) for td in tr.find_all(["td", "th"])]
-                        parsed = _parse_row_from_cells(cols, juego_name)
-                        if parsed:
-                            combined_results.append(parsed)
+                pass
+            t0 = time.perf_counter()
+        ok_urls = [u for u in export_urls if u in per_gid]
+        ok_gids = [u.rsplit("gid=", 1)[1] for u in ok_urls]
+        if ok_urls:
+            source_planner.update_url_state(url, gids=ok_gids)
+        return bool(per_gid), [r for u in ok_urls for r in per_gid[u]], "gids:" + ",".join(ok_gids)
+
+    def _strategy_html():
+        # la página se parsea una sola vez; el fallback de abajo reutiliza este intento
+        html_main = _html_main()
+        if not html_main:
+            return False, [], None
+        return True, _emit(_timed(stats, "parse_s", _parse_html_fast, html_main, juego_name, since, source=url)), url
+
+    combined_results = source_planner.run_plan(url, {
+        "csv": _strategy_csv,
+        "gids": _strategy_gids,
+        "html": _strategy_html,
+    }, since=since, deadline=deadline)
+
+    # solo reintentar si la página principal no se llegó a leer (si se leyó ya se parseó arriba)
+    if not combined_results and not main.get("html") and not deadline.expired():
+        try:
+            resp = _timed(stats, "fetch_s", fetch, url, timeout=15, deadline=deadline)
+            resp.raise_for_status()
+            _count_bytes(stats, resp.text)
+            combined_results.extend(_emit(_timed(stats, "parse_s", _parse_html_tables_all, resp.text, juego_name,
+                                                 since, source=url)))
         except Exception:
             pass
 
-    if combined_results:
-        unique = {}
-        for r in combined_results:
-            f = r.get("fecha")
-            nums = tuple(r.get("numeros", []))
-            if not f or not nums:
-                continue
-            key = (f, nums)
-            if key not in unique:
-                unique[key] = r
-        out = list(unique.values())
-        out.sort(key=lambda r: r.get("fecha", ""), reverse=True)
-        return out
-    return []
+    out = DrawBatch.from_dicts(combined_results).dedupe().sort_by_fecha()
+    return out if batch else out.to_dicts()
 
 # -------------------- deduplicación y combinación --------------------------
-def _deduplicate_resultados(resultados: List[dict]) -> List[dict]:
-    seen = {}
-    out = []
-    for r in resultados:
-        fecha = r.get("fecha")
-        nums = r.get("numeros", [])
-        if not fecha or not nums:
-            continue
-        key = (fecha, tuple(nums))
-        if key not in seen:
-            seen[key] = r
-            out.append(r)
-    out.sort(key=lambda r: r.get("fecha", ""), reverse=True)
-    return out
+def _deduplicate_resultados(resultados: Union[List[dict], DrawBatch]) -> Union[List[dict], DrawBatch]:
+    """Primera aparición de cada (fecha, numeros), de más reciente a más antiguo. Conserva el tipo de entrada."""
+    out = as_batch(resultados).dedupe().sort_by_fecha()
+    return out if isinstance(resultados, DrawBatch) else out.to_dicts()
 
-# ----------------- Mongo helpers (similar to etl._make_doc_for_mongo) ------
+# ----------------- Mongo helpers (lecturas/escrituras: src/repository.py) ---
 def get_client():
-    return MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    """Cliente compartido del proceso (src/mongo_pool.py)."""
+    return mongo_pool.get_client(MONGO_URI)
 
 
 def get_collection(prefix: str):
-    name = f"{MONGO_COLL_BASE}_{prefix}"
-    client = get_client()
-    return client[MONGO_DB][name]
+    return mongo_queries.get_collection(prefix)
 
 
-def _make_doc_for_mongo(row: Dict[str, Any]) -> Dict[str, Any]:
-    nums = []
-    if "numeros" in row and row.get("numeros"):
-        nums = [int(x) for x in row.get("numeros")]
-    else:
-        for i in range(1, 7):
-            k = f"n{i}"
-            v = row.get(k)
-            if v is not None and str(v).strip() != "":
-                try:
-                    nums.append(int(v))
-                except Exception:
-                    pass
+def get_watermark(prefix: str) -> Union[str, None]:
+    """Fecha (YYYY-MM-DD) del sorteo más reciente ya guardado (backend de DRAW_BACKEND), o None si no hay."""
+    return repository.get_repository().latest_fecha(prefix)
 
-    fecha = row.get("fecha")
-    fecha_norm = None
-    if fecha:
-        try:
-            if isinstance(fecha, datetime):
-                fecha_norm = fecha.strftime("%Y-%m-%d")
-            else:
-                import pandas as pd
-                dt = pd.to_datetime(str(fecha), dayfirst=True, errors='coerce')
-                if not pd.isna(dt):
-                    fecha_norm = dt.strftime("%Y-%m-%d")
-        except Exception:
-            fecha_norm = None
-
-    nums = [int(x) for x in nums][:6]
-    clave_nums = ",".join(str(x) for x in nums) if nums else "no_nums"
-    _id = f"{fecha_norm if fecha_norm else 'no_fecha'}:{clave_nums}"
-
-    doc = {
-        "_id": _id,
-        "juego": row.get("juego", ""),
-        "fecha": fecha_norm,
-        "numeros": nums,
-        "complementario": int(row.get("complementario")) if row.get("complementario") not in (None, "", "nan") else None,
-        "reintegro": int(row.get("reintegro")) if row.get("reintegro") not in (None, "", "nan") else None,
-        "fuente": row.get("fuente", ""),
-        "inserted_at": datetime.now()
-    }
-    return doc
 
 # --------------------- guardado raw + processed CSV (opcional) -----------
-def _norm_and_save(resultados: List[dict], prefix: str = "primitiva"):
-    os.makedirs(RAW_DIR, exist_ok=True)
+def _norm_and_save(resultados: Union[List[dict], DrawBatch], prefix: str = "primitiva"):
     os.makedirs(PROC_DIR, exist_ok=True)
-    raw_path = os.path.join(RAW_DIR, f"{prefix}_raw.json")
     proc_path = os.path.join(PROC_DIR, f"{prefix}_processed.csv")
-    with open(raw_path, "w", encoding="utf-8") as f:
-        json.dump(resultados, f, ensure_ascii=False, indent=2)
-    print("Guardado raw JSON en:", raw_path)
-
-    rows = []
-    for r in resultados:
-        fecha = r.get("fecha")
-        if not fecha:
-            continue
-        nums = r.get("numeros", [])
-        if not nums or len(nums) < 6:
-            continue
-        rows.append({
-            "juego": r.get("juego", prefix),
-            "fecha": fecha,
-            "n1": nums[0],
-            "n2": nums[1],
-            "n3": nums[2],
-            "n4": nums[3],
-            "n5": nums[4],
-            "n6": nums[5],
-            "complementario": r.get("complementario"),
-            "reintegro": r.get("reintegro")
-        })
+    # raw: solo lo posterior a lo ya guardado, en un segmento nuevo (src/raw_store.py)
+    res = raw_store.append_new(prefix, as_dicts(resultados))
+    print(f"Guardado raw en: {raw_store.store_dir(prefix)} ({res['n_docs']} sorteos nuevos"
+          + (f" desde {res['desde']})" if res["desde"] else ")"))
+
+    batch = as_batch(resultados)
+    # solo filas con fecha y los 6 números
+    batch = batch.take((batch.fecha != draws.NO_FECHA) & (batch.numeros[:, 5] >= 0))
     try:
-        import pandas as pd
-        df = pd.DataFrame(rows)
+        df = batch.to_frame()
         if df.empty:
             print("No hay filas válidas para guardar en CSV.")
             return
-        df['fecha'] = pd.to_datetime(df['fecha'], dayfirst=True, errors='coerce')
-        df = df[~df['fecha'].isna()].copy()
-        df['fecha'] = df['fecha'].dt.strftime('%Y-%m-%d')
-        df = df.sort_values('fecha').reset_index(drop=True)
+        df['juego'] = df['juego'].replace("", prefix)
+        df = df.sort_values('fecha', kind='stable').reset_index(drop=True)
         cols = ["juego", "fecha", "n1", "n2", "n3", "n4", "n5", "n6", "complementario", "reintegro"]
         df.to_csv(proc_path, index=False, columns=cols)
         print("Guardado processed CSV en:", proc_path)
@@ -507,7 +540,8 @@ def _norm_and_save(resultados: List[dict], prefix: str = "primitiva"):
         print("No se pudo guardar CSV (pandas requerido):", e)
 
 # ------------------ interfaz principal: varias URLs / alias ---------------
-def obtener_todos_resultados(urls: Union[str, List[str]] = None, juego: str = None) -> List[dict]:
+def _resolve_sources(urls: Union[str, List[str]], juego: str = None) -> List[tuple]:
+    """[(alias_o_url, url_real, juego_name)] a partir de '1', '2', 'url' o 'a+b+c'."""
     if urls is None:
         urls = "1"
     if isinstance(urls, str) and "+" in urls:
@@ -515,7 +549,7 @@ def obtener_todos_resultados(urls: Union[str, List[str]] = None, juego: str = No
     if isinstance(urls, str):
         urls = [urls]
 
-    all_results = []
+    sources = []
     for u in urls:
         actual_url = u
         if isinstance(u, str) and u.strip() in ("1", "2"):
@@ -523,43 +557,187 @@ def obtener_todos_resultados(urls: Union[str, List[str]] = None, juego: str = No
         juego_name = juego
         if juego_name is None:
             juego_name = "primitiva" if str(u).strip() == "1" else "bonoloto" if str(u).strip() == "2" else "primitiva"
+        sources.append((u, actual_url, juego_name))
+    return sources
+
+
+def _print_source_report(report: List[Dict[str, Any]]):
+    print(f"{'fuente':<60} {'filas':>7} {'nuevas':>7} {'KB':>9} {'fetch s':>8} {'parse s':>8}  estado")
+    for st in report:
+        url = st["url"] if len(st["url"]) <= 60 else st["url"][:57] + "..."
+        estado = st["error"] or "ok"
+        print(f"{url:<60} {st['rows']:>7} {st.get('new', 0):>7} {st['bytes'] / 1024:>9.1f} "
+              f"{st['fetch_s']:>8.2f} {st['parse_s']:>8.2f}  {estado}")
+
+
+def obtener_todos_resultados(urls: Union[str, List[str]] = None, juego: str = None, since: str = None,
+                             source_timeout: float = None, report: List[Dict[str, Any]] = None,
+                             budget: float = None, batch: bool = False) -> Union[List[dict], DrawBatch]:
+    """
+    Extrae de una o varias fuentes ('a+b+c') en paralelo (un hilo por fuente) y va
+    fusionando los resultados según terminan, deduplicando por (fecha, numeros).
+    Ante duplicados se queda el registro de la fuente que aparece antes en la lista,
+    así el resultado no depende de qué espejo responde primero.
+    source_timeout: segundos máximos de espera total; las fuentes que no hayan
+    terminado se descartan (estado 'timeout') en lugar de bloquear al resto.
+    report: si se pasa una lista, se rellena con las métricas por fuente.
+    budget: segundos de presupuesto por fuente (descargas, reintentos y estrategias);
+    una fuente lenta devuelve lo que tenga al agotarlo.
+    batch: devolver un DrawBatch (columnar) en lugar de la lista de dicts.
+    """
+    sources = _resolve_sources(urls, juego)
+    stats_list = [_new_stats(actual_url) for _, actual_url, _ in sources]
+    batches: Dict[int, DrawBatch] = {}
+    seen = set()
+
+    def _merge(prio: int, res: DrawBatch) -> int:
+        batches[prio] = res
+        keys = set(zip(res.fecha.tolist(), map(tuple, res.numeros.tolist())))
+        nuevas = len(keys - seen)
+        seen.update(keys)
+        return nuevas
+
+    pool = ThreadPoolExecutor(max_workers=max(1, len(sources)))
+    try:
+        futures = {
+            pool.submit(obtener_todos_resultados_single, actual_url, juego_name, since, stats_list[i], budget, True): i
+            for i, (_, actual_url, juego_name) in enumerate(sources)
+        }
         try:
-            res = obtener_todos_resultados_single(actual_url, juego_name)
-            if res:
-                all_results.extend(res)
+            for fut in as_completed(futures, timeout=source_timeout):
+                i = futures[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    stats_list[i]["error"] = str(e)
+                    print(f"[warning] fallo extrayendo {sources[i][1]}: {e}")
+                    continue
+                stats_list[i]["rows"] = len(res)
+                stats_list[i]["new"] = _merge(i, res)
+        except FuturesTimeout:
+            for fut, i in futures.items():
+                if not fut.done():
+                    stats_list[i]["error"] = "timeout"
+                    print(f"[warning] {sources[i][1]} no terminó en {source_timeout}s; se descarta")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if report is not None:
+        report.extend(stats_list)
+    # concatenar por prioridad: dedupe() se queda con la primera aparición (la fuente anterior)
+    combined = DrawBatch.concat([batches[i] for i in sorted(batches)]).dedupe().sort_by_fecha()
+    return combined if batch else combined.to_dicts()
+
+def stream_resultados(urls: Union[str, List[str]] = None, juego: str = None, since: str = None,
+                      source_timeout: float = None, report: List[Dict[str, Any]] = None,
+                      budget: float = None, queue_size: int = STREAM_QUEUE_SIZE) -> Iterator[dict]:
+    """
+    Versión en streaming de obtener_todos_resultados: genera los sorteos según se
+    parsea cada hoja/gid de cada fuente, sin acumular el histórico. La cola entre
+    las fuentes y el consumidor está acotada (queue_size bloques), así que si el
+    consumidor (Mongo) va más lento las descargas esperan en lugar de llenar memoria.
+    Deduplica con un conjunto de claves (fecha, numeros). Si una fuente anterior en la
+    lista trae un sorteo ya emitido por otra, se vuelve a emitir (el upsert lo
+    reemplaza), así el estado final coincide con el de obtener_todos_resultados.
+    """
+    sources = _resolve_sources(urls, juego)
+    stats_list = [_new_stats(actual_url) for _, actual_url, _ in sources]
+    for st in stats_list:
+        st["new"] = 0
+    q: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    done_marker = object()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _run(i: int, actual_url: str, juego_name: str):
+        try:
+            res = obtener_todos_resultados_single(actual_url, juego_name, since, stats_list[i], budget,
+                                                  emit=lambda rows: _put((i, rows)))
+            stats_list[i]["rows"] = len(res)
         except Exception as e:
+            stats_list[i]["error"] = str(e)
             print(f"[warning] fallo extrayendo {actual_url}: {e}")
-    combined = _deduplicate_resultados(all_results)
-    return combined
+        finally:
+            _put((i, done_marker))
+
+    seen: Dict[tuple, int] = {}
+    pending = set(range(len(sources)))
+    end = time.monotonic() + source_timeout if source_timeout else None
+    pool = ThreadPoolExecutor(max_workers=max(1, len(sources)))
+    try:
+        for i, (_, actual_url, juego_name) in enumerate(sources):
+            pool.submit(_run, i, actual_url, juego_name)
+        while pending:
+            try:
+                i, rows = q.get(timeout=None if end is None else max(0.0, end - time.monotonic()))
+            except queue.Empty:
+                for i in pending:
+                    stats_list[i]["error"] = "timeout"
+                    print(f"[warning] {sources[i][1]} no terminó en {source_timeout}s; se descarta")
+                break
+            if rows is done_marker:
+                pending.discard(i)
+                continue
+            for r in rows:
+                fecha = r.get("fecha")
+                nums = r.get("numeros")
+                if not fecha or not nums:
+                    continue
+                key = (fecha, tuple(nums))
+                prev = seen.get(key)
+                if prev is None:
+                    stats_list[i]["new"] += 1
+                if prev is None or i < prev:
+                    seen[key] = i
+                    yield r
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        if report is not None:
+            report.extend(stats_list)
 
 # ------------------ upsert to mongo -------------------------------------
-def upsert_to_mongo(resultados: List[dict], prefix: str = "primitiva", ordered: bool = False) -> Dict[str, Any]:
-    if not resultados:
-        return {"ok": False, "reason": "no_results"}
-    ops = []
-    for r in resultados:
-        try:
-            doc = _make_doc_for_mongo(r)
-        except Exception:
-            continue
-        ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
-    if not ops:
-        return {"ok": False, "reason": "no_ops"}
-    coll = get_collection(prefix)
+def _checkpoint_key(prefix: str, resultados: Union[List[dict], DrawBatch]) -> Union[str, None]:
+    """
+    Clave de checkpoint por contenido: la misma entrada (mismo contenido y orden) sigue tras
+    el último lote confirmado. None (sin checkpoint) si los datos no caben en un DrawBatch.
+    """
     try:
-        res = coll.bulk_write(ops, ordered=ordered)
-        summary = {
-            "ok": True,
-            "n_ops": len(ops),
-            "matched_count": getattr(res, "matched_count", None),
-            "modified_count": getattr(res, "modified_count", None),
-            "upserted_count": len(getattr(res, "upserted_ids", {}) or {})
-        }
-        return summary
-    except BulkWriteError as bwe:
-        return {"ok": False, "error": bwe.details}
-    except PyMongoError as e:
-        return {"ok": False, "error": str(e)}
+        batch = as_batch(resultados)
+    except (TypeError, ValueError):
+        return None
+    return f"upsert:{prefix}@{len(batch)}:{batch.digest()}"
+
+
+def upsert_to_mongo(resultados: Union[List[dict], DrawBatch], prefix: str = "primitiva", ordered: bool = False) -> Dict[str, Any]:
+    """
+    Upsert con detección de cambios en el repositorio de sorteos (src/repository.py; Mongo
+    salvo DRAW_BACKEND): solo se escriben sorteos nuevos o modificados, en Mongo en lotes
+    concurrentes con reintentos (src/bulk_writer.py) y con checkpoint por contenido.
+    """
+    if not len(resultados):
+        return {"ok": False, "reason": "no_results"}
+    return repository.get_repository().upsert(prefix, resultados, ordered=ordered, label="upsert",
+                                              checkpoint=_checkpoint_key(prefix, resultados))
+
+
+def upsert_stream(resultados: Iterable[dict], prefix: str = "primitiva", ordered: bool = False,
+                  batch_size: int = UPSERT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Upsert por lotes de `batch_size` documentos a medida que llegan los resultados
+    (p.ej. de stream_resultados). En Mongo, bulk_writer escribe varios lotes a la vez
+    mientras se preparan los siguientes y nunca retiene más de 2*BULK_WORKERS lotes, así
+    que la memoria no depende del histórico.
+    """
+    return repository.get_repository().upsert_stream(prefix, resultados, batch_size=batch_size,
+                                                     ordered=ordered, label="stream")
 
 # ------------------------------- CLI -------------------------------------
 if __name__ == "__main__":
@@ -571,7 +749,21 @@ if __name__ == "__main__":
     parser.add_argument("--no-mongo", action="store_true", help="no insertar en Mongo (solo guardar ficheros si --save)")
     parser.add_argument("--save", action="store_true", help="guardar raw JSON y processed CSV (en data/...)")
     parser.add_argument("--ordered", action="store_true", help="bulk_write ordered (más lento pero predecible).")
+    parser.add_argument("--no-cache", action="store_true", help="no usar la caché HTTP de data/http_cache (descarga y parsea todo).")
+    parser.add_argument("--incremental", action="store_true", help="solo sorteos posteriores a la última fecha ya guardada en Mongo.")
+    fixtures = parser.add_mutually_exclusive_group()
+    fixtures.add_argument("--record", metavar="DIR", default=None, help="grabar todas las respuestas HTTP en DIR (fixtures).")
+    fixtures.add_argument("--replay", metavar="DIR", default=None, help="reproducir las respuestas grabadas en DIR, sin red.")
+    parser.add_argument("--source-timeout", type=float, default=None, help="segundos máximos por ejecución; las fuentes que no terminen se descartan.")
+    parser.add_argument("--budget", type=float, default=None, help="segundos de presupuesto por fuente (descargas, reintentos y estrategias).")
     args = parser.parse_args()
+    if args.budget and args.source_timeout is None:
+        # margen para el parseo de lo ya descargado al agotarse el presupuesto
+        args.source_timeout = args.budget * 1.1 + 5
+    if args.no_cache or args.replay:
+        http_cache.set_enabled(False)
+    if args.record or args.replay:
+        set_fetch_mode(record_dir=args.record, replay_dir=args.replay)
 
     if not args.which and not args.url:
         print("Selecciona el juego a extraer:")
@@ -593,19 +785,53 @@ if __name__ == "__main__":
         else:
             prefix = "primitiva"
 
+    if not args.no_mongo and repository.backend_name() == "mongo" and not mongo_pool.healthy(MONGO_URI):
+        # mejor saberlo ahora que tras un timeout de server selection por cada lote
+        print("Mongo no responde; se continúa como --no-mongo.")
+        args.no_mongo = True
+
+    since = None
+    if args.incremental:
+        if args.no_mongo:
+            print("--incremental requiere Mongo para leer la última fecha; se hace extracción completa.")
+        else:
+            try:
+                since = get_watermark(prefix)
+                print(f"Modo incremental: última fecha en '{MONGO_COLL_BASE}_{prefix}':", since)
+            except PyMongoError as e:
+                print("No se pudo leer la última fecha de Mongo; se hace extracción completa:", e)
+
     print("Leyendo:", urls_arg)
-    todos = obtener_todos_resultados(urls_arg, juego=prefix)
-    print("Filas obtenidas:", len(todos))
-    if todos:
-        print("Último:", todos[0])
-
-    # por defecto insertamos en Mongo (salvo --no-mongo)
-    if not args.no_mongo:
-        print(f"Insertando {len(todos)} resultados en Mongo colección '{MONGO_COLL_BASE}_{prefix}' ...")
-        res = upsert_to_mongo(todos, prefix=prefix, ordered=args.ordered)
+    report = []
+    if not args.no_mongo and (not args.save or since):
+        # solo Mongo: pipeline en streaming (descarga -> parseo -> dedupe -> upsert por lotes)
+        print(f"Insertando en streaming en Mongo colección '{MONGO_COLL_BASE}_{prefix}' (lotes de {UPSERT_BATCH_SIZE}) ...")
+        res = upsert_stream(stream_resultados(urls_arg, juego=prefix, since=since, source_timeout=args.source_timeout,
+                                              report=report, budget=args.budget),
+                            prefix=prefix, ordered=args.ordered)
+        _print_source_report(report)
         print("Resultado Mongo:", res)
+        if args.save:
+            # los ficheros deben contener todo el histórico, no solo los sorteos nuevos
+            print("--incremental: no se reescriben los ficheros locales; regenéralos con 'python -m src.etl'.")
     else:
-        print("--no-mongo: no se insertará en Mongo.")
+        todos = obtener_todos_resultados(urls_arg, juego=prefix, since=since,
+                                         source_timeout=args.source_timeout, report=report, budget=args.budget,
+                                         batch=True)
+        _print_source_report(report)
+        print("Filas obtenidas:", len(todos), f"({todos.nbytes / 1024:.1f} KB en columnas)")
+        if len(todos):
+            print("Último:", todos[0].to_dict())
+
+        # por defecto insertamos en Mongo (salvo --no-mongo)
+        if not args.no_mongo:
+            print(f"Insertando {len(todos)} resultados en Mongo colección '{MONGO_COLL_BASE}_{prefix}' ...")
+            res = upsert_to_mongo(todos, prefix=prefix, ordered=args.ordered)
+            print("Resultado Mongo:", res)
+        else:
+            print("--no-mongo: no se insertará en Mongo.")
+
+        if args.save:
+            _norm_and_save(todos, prefix=prefix)
 
-    if args.save:
-        _norm_and_save(todos, prefix=prefix)
+    http_cache.prune_parsed()
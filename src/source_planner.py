@@ -0,0 +1,175 @@
+# src/source_planner.py
+"""
+Planificador de estrategias de extracción por URL.
+Cada URL de hoja se puede leer de varias formas (CSV export, exports por gid,
+tablas de la página HTML). El planner:
+- ordena las estrategias poniendo primero la que ganó en la última ejecución,
+- las ejecuta en orden y para en cuanto una devuelve un histórico completo y coherente,
+- persiste la estrategia ganadora, la fuente concreta que leyó (URL / gids), los gids
+  descubiertos y los tiempos en data/scraper_state.json.
+Variables de entorno:
+    SCRAPER_STATE_FILE (default: data/scraper_state.json)
+"""
+
+import os
+import json
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+STATE_FILE = os.environ.get("SCRAPER_STATE_FILE", os.path.join(BASE, "data", "scraper_state.json"))
+
+DEFAULT_ORDER = ["csv", "gids", "html"]
+
+_state_lock = threading.Lock()
+
+
+# ---------------------------- estado persistido ----------------------------
+def load_state() -> Dict[str, Any]:
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def get_url_state(url: str) -> Dict[str, Any]:
+    return load_state().get(url, {})
+
+
+def update_url_state(url: str, **fields):
+    """Actualiza (merge) el estado de una URL y lo guarda de forma atómica."""
+    with _state_lock:
+        state = load_state()
+        entry = state.get(url, {})
+        entry.update(fields)
+        entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        state[url] = entry
+        try:
+            os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+            tmp = f"{STATE_FILE}.tmp{os.getpid()}.{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, STATE_FILE)
+        except Exception as e:
+            print(f"[planner] no se pudo guardar estado de {url}: {e}")
+
+
+def rank_strategies(url: str, available: List[str] = None) -> List[str]:
+    order = list(available or DEFAULT_ORDER)
+    best = get_url_state(url).get("strategy")
+    if best in order:
+        order.remove(best)
+        order.insert(0, best)
+    return order
+
+
+# --------------------------- calidad del resultado -------------------------
+def _keys(resultados: List[dict]) -> set:
+    return {(r.get("fecha"), tuple(r.get("numeros", []))) for r in resultados if r.get("fecha")}
+
+
+def _n_fechas(resultados: List[dict]) -> int:
+    return len({r.get("fecha") for r in resultados if r.get("fecha")})
+
+
+def is_consistent(resultados: List[dict], max_conflicts: float = 0.01) -> bool:
+    """6 números distintos y positivos por sorteo y (casi) nunca dos combinaciones en la misma fecha."""
+    if not resultados:
+        return False
+    for r in resultados:
+        nums = r.get("numeros") or []
+        if len(nums) != 6 or len(set(nums)) != 6 or min(nums) < 1:
+            return False
+    per_date = Counter(f for f, _ in _keys(resultados))
+    conflicts = sum(1 for c in per_date.values() if c > 1)
+    return conflicts <= max_conflicts * len(per_date)
+
+
+def is_complete(resultados: List[dict], url_state: Dict[str, Any], since: str = None,
+                source: str = None) -> bool:
+    """
+    Completo = coherente y, en extracción total, al menos tantos sorteos y tan recientes
+    como en la última ejecución buena. En modo incremental basta con que la fuente se lea;
+    un resultado vacío ("nada nuevo") solo cuenta si viene de la misma fuente (`source`)
+    que ganó la última extracción total, no de otra pestaña o export.
+    """
+    if since:
+        if not resultados:
+            return bool(source) and source == url_state.get("source")
+        return is_consistent(resultados)
+    if not is_consistent(resultados):
+        return False
+    known = url_state.get("n_rows")
+    if not known:
+        return False
+    last = url_state.get("last_fecha") or ""
+    newest = max((r.get("fecha") or "" for r in resultados), default="")
+    return _n_fechas(resultados) >= known and newest >= last
+
+
+# ------------------------------- ejecución ---------------------------------
+def run_plan(url: str,
+             strategies: Dict[str, Callable[[], Tuple[bool, List[dict]]]],
+             since: str = None,
+             deadline=None) -> List[dict]:
+    """
+    Ejecuta las estrategias en orden de ranking. Cada estrategia devuelve
+    (fuente_leida, resultados, fuente): fuente identifica lo leído (URL del CSV, lista de
+    gids...) y se guarda junto a la estrategia ganadora de una extracción total. Para en la primera completa y devuelve la unión de lo
+    leído hasta ese momento; si ninguna lo es, se han ejecutado todas (comportamiento
+    original). Registra tiempos por estrategia.
+    `deadline` (fetcher.Deadline): si se agota no se lanzan más estrategias.
+    """
+    url_state = get_url_state(url)
+    order = rank_strategies(url, list(strategies))
+    timings = {}
+    per_strategy: Dict[str, List[dict]] = {}
+    sources: Dict[str, str] = {}
+    combined: List[dict] = []
+    winner = None
+    for name in order:
+        if deadline is not None and deadline.expired():
+            print(f"[planner] presupuesto agotado antes de {name}; se devuelve lo leído  {url}")
+            break
+        t0 = time.perf_counter()
+        try:
+            read_ok, res, source = strategies[name]()
+        except Exception as e:
+            print(f"[planner] {name} falló en {url}: {e}")
+            read_ok, res, source = False, [], None
+        dt = time.perf_counter() - t0
+        timings[name] = round(dt, 3)
+        print(f"[planner] {name:<9} filas={len(res):>6} t={dt:6.2f}s  {url}")
+        per_strategy[name] = res
+        sources[name] = source
+        combined.extend(res)
+        # en incremental no hay recuento con el que comparar: solo se confía en la ganadora conocida
+        trusted = not since or name == url_state.get("strategy")
+        if read_ok and trusted and is_complete(res, url_state, since, source):
+            winner = name
+            break
+
+    if winner is None and not since and combined:
+        # primera ejecución (o fuente degradada): la ganadora es la que cubre toda la unión
+        total = _n_fechas(combined)
+        for name in order:
+            if name in per_strategy and _n_fechas(per_strategy[name]) >= total and is_consistent(per_strategy[name]):
+                winner = name
+                break
+
+    # se conservan los tiempos de las estrategias que esta vez no hizo falta ejecutar
+    fields: Dict[str, Any] = {"timings": {**url_state.get("timings", {}), **timings}}
+    if winner:
+        fields["strategy"] = winner
+        if not since:
+            fields["source"] = sources.get(winner)
+        print(f"[planner] estrategia ganadora para {url}: {winner}")
+    if not since and combined:
+        fields["n_rows"] = _n_fechas(combined)
+        fields["last_fecha"] = max(r.get("fecha") or "" for r in combined)
+    update_url_state(url, **fields)
+    return combined
@@ -0,0 +1,263 @@
+# src/table_parser.py
+"""
+Parser vectorizado de tablas de sorteos (CSV export / pd.read_html).
+- infer_layout(): detecta una vez por tabla qué columna lleva la fecha y su formato.
+  El layout se cachea por fuente (URL / gid) en data/parser_layouts.json.
+- parse_frame(): extrae fecha, 6 números, complementario y reintegro de todas las
+  filas a la vez con operaciones str/regex de pandas. Las filas que no encajan en el
+  layout se delegan en el parser por fila del scraper (row_parser). Con `since`, las
+  filas que el corte incremental descartaría se quitan tras leer la fecha, antes de
+  extraer números y construir los dicts.
+La salida es idéntica a la de _parse_row_from_cells: lista de dicts
+{juego, fecha, numeros, complementario, reintegro} en el orden de la tabla.
+"""
+
+import os
+import json
+import threading
+from typing import Any, Callable, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src import fechas
+except Exception:
+    import fechas
+
+BASE = os.path.join(os.path.dirname(__file__), "..")
+LAYOUTS_FILE = os.environ.get("PARSER_LAYOUTS_FILE", os.path.join(BASE, "data", "parser_layouts.json"))
+
+SAMPLE_ROWS = 50
+MAX_NUM_COLS = 10  # mismas 10 columnas que mira _parse_row_from_cells tras la fecha
+
+# hasta 8 enteros: 6 números + complementario + reintegro
+_INTS_RE = r"^\D*(\d+)" + r"(?:\D+(\d+))?" * 7
+_PURE_NUM_RE = r"\d+(?:\.0+)?"
+_INT_CELL_RE = r"\d+"
+
+_layouts: Union[Dict[str, Dict[str, Any]], None] = None
+_layouts_lock = threading.Lock()
+
+
+# ----------------------- caché de layouts por fuente -----------------------
+def _load_layouts() -> Dict[str, Dict[str, Any]]:
+    global _layouts
+    if _layouts is None:
+        try:
+            with open(LAYOUTS_FILE, "r", encoding="utf-8") as f:
+                _layouts = json.load(f)
+        except Exception:
+            _layouts = {}
+    return _layouts
+
+
+def get_layout(source: str) -> Union[Dict[str, Any], None]:
+    if not source:
+        return None
+    with _layouts_lock:
+        return _load_layouts().get(source)
+
+
+def forget_layout(source: str):
+    with _layouts_lock:
+        _load_layouts().pop(source, None)
+
+
+def save_layout(source: str, layout: Dict[str, Any]):
+    if not source:
+        return
+    with _layouts_lock:
+        layouts = _load_layouts()
+        if layouts.get(source) == layout:
+            return
+        layouts[source] = layout
+        try:
+            os.makedirs(os.path.dirname(LAYOUTS_FILE), exist_ok=True)
+            tmp = f"{LAYOUTS_FILE}.tmp{os.getpid()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(layouts, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, LAYOUTS_FILE)
+        except Exception as e:
+            print(f"[table_parser] no se pudo guardar layout de {source}: {e}")
+
+
+# ----------------------------- utilidades ----------------------------------
+def as_str_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte todas las celdas a str igual que hace el parser por fila (NaN -> 'nan')."""
+    obj = df.astype(object)
+    obj = obj.where(obj.notna(), "nan")
+    out = obj.astype(str)
+    out.columns = range(out.shape[1])
+    return out.reset_index(drop=True)
+
+
+def infer_layout(sdf: pd.DataFrame) -> Union[Dict[str, Any], None]:
+    """
+    Mira las primeras SAMPLE_ROWS filas: la columna de fecha es la primera (de las 3
+    primeras) donde la mayoría de celdas no numéricas son fechas válidas.
+    """
+    sample = sdf.head(SAMPLE_ROWS)
+    if sample.empty:
+        return None
+    for i in range(min(3, sample.shape[1])):
+        col = sample[i]
+        candidates = col[~col.str.fullmatch(_PURE_NUM_RE)]
+        if candidates.empty:
+            continue
+        parsed = fechas.normalizar_serie(candidates)
+        if parsed.notna().sum() * 2 >= len(sample):
+            return {"fecha_idx": i, "fmt": fechas.detectar_formato(candidates),
+                    "int_cols": _count_int_cols(sample, i), "ncols": int(sdf.shape[1])}
+    return None
+
+
+def _count_int_cols(sample: pd.DataFrame, fecha_idx: int) -> int:
+    """Nº de columnas consecutivas tras la fecha que llevan un único entero (N1..N6, C, R)."""
+    k = 0
+    for j in range(fecha_idx + 1, min(sample.shape[1], fecha_idx + 9)):
+        if sample[j].str.fullmatch(_INT_CELL_RE).mean() < 0.5:
+            break
+        k += 1
+    return k if k >= 6 else 0
+
+
+def _extract_ints(s: pd.Series) -> pd.DataFrame:
+    """DataFrame (N, 8) con los primeros 8 enteros de cada celda (NaN si no hay)."""
+    return s.str.extract(_INTS_RE).astype("float64")
+
+
+# ------------------------------ parseo -------------------------------------
+def _since_mask(fechas_s: pd.Series, valid: np.ndarray, since: str) -> np.ndarray:
+    """
+    Filas que aún pueden dar sorteos posteriores a `since`, con el corte de
+    scraper_mongo._cut_since: fuera las de fecha <= since y, en tablas de más reciente a
+    más antigua, todo desde la primera fecha <= since que baja respecto a la anterior.
+    """
+    keep = np.ones(len(fechas_s), dtype=bool)
+    pos = np.flatnonzero(valid)
+    if not len(pos):
+        return keep
+    fv = fechas_s.to_numpy(dtype=object)[pos].astype(str)
+    old = fv <= since
+    keep[pos[old]] = False
+    brk = np.flatnonzero(old[1:] & (fv[1:] < fv[:-1]))
+    if len(brk):
+        keep[pos[brk[0] + 1]:] = False
+    return keep
+
+
+def parse_frame(sdf: pd.DataFrame, juego_name: str,
+                row_parser: Callable[[List[str], str], Union[dict, None]],
+                source: str = None, since: str = None) -> List[dict]:
+    """
+    Parsea una tabla completa (DataFrame de str, ver as_str_frame) en bloque.
+    `source` identifica la tabla (URL de export/gid) para reutilizar su layout.
+    `since` (YYYY-MM-DD) descarta pronto las filas que no pueden ser posteriores; quien
+    llama sigue aplicando su corte exacto sobre el resultado (filas resueltas por row_parser).
+    """
+    n = len(sdf)
+    if n == 0:
+        return []
+    ncols = sdf.shape[1]
+
+    layout = get_layout(source)
+    cached = bool(layout) and layout.get("ncols") == ncols
+    if not cached:
+        layout = infer_layout(sdf)
+        if layout is None:
+            return _fallback(sdf, range(n), juego_name, row_parser)
+        save_layout(source, layout)
+    fi = layout["fecha_idx"]
+
+    # 1) fecha en la columna del layout; las anteriores no deben poder ser fechas
+    ok = ~sdf[fi].str.fullmatch(_PURE_NUM_RE)
+    for j in range(fi):
+        prev = sdf[j]
+        ok &= prev.str.fullmatch(_PURE_NUM_RE) | ~prev.str.contains(r"\d", regex=True)
+    fechas_s = fechas.normalizar_serie(sdf[fi], layout.get("fmt"))
+    ok &= fechas_s.notna()
+    expected = n
+    if since:
+        if cached and ok.sum() * 2 < n:
+            forget_layout(source)
+            return parse_frame(sdf, juego_name, row_parser, source=source, since=since)
+        keep = _since_mask(fechas_s, ok.to_numpy(), since)
+        if not keep.all():
+            sdf = sdf[keep].reset_index(drop=True)
+            fechas_s = fechas_s[keep].reset_index(drop=True)
+            ok = ok[keep].reset_index(drop=True)
+            n = len(sdf)
+            if n == 0:
+                return []
+        # filas con fecha posterior a since: son las que deberían encajar en el layout
+        expected = int(ok.sum())
+
+    # 2) números: primero la celda siguiente a la fecha; si no trae 6, concatenar las siguientes
+    ints = np.full((n, 8), np.nan)
+    if fi + 1 < ncols:
+        first = _extract_ints(sdf[fi + 1]).to_numpy(dtype=float)
+        use_first = ~np.isnan(first[:, 5])
+        ints[use_first] = first[use_first]
+        rest = ~use_first
+        k = layout.get("int_cols") or 0
+        if k and rest.any():
+            # layout N1..N6[,C[,R]] en columnas: lectura directa si la fila encaja exactamente
+            direct = rest.copy()
+            for j in range(fi + 1, fi + 1 + k):
+                direct &= sdf[j].str.fullmatch(_INT_CELL_RE).to_numpy()
+            for j in range(fi + 1 + k, min(ncols, fi + 1 + MAX_NUM_COLS)):
+                direct &= ~sdf[j].str.contains(r"\d", regex=True).to_numpy()
+            if direct.any():
+                cols = list(range(fi + 1, fi + 1 + k))
+                ints[direct, :k] = sdf.loc[direct, cols].astype("float64").to_numpy()
+            rest &= ~direct
+        if rest.any():
+            joined = sdf.loc[rest, fi + 1]
+            for j in range(fi + 2, min(ncols, fi + 1 + MAX_NUM_COLS)):
+                joined = joined + " " + sdf.loc[rest, j]
+            ints[rest] = _extract_ints(joined).to_numpy(dtype=float)
+    ok &= ~np.isnan(ints[:, 5])
+    ok = ok.to_numpy()
+
+    # si el layout cacheado ya no encaja con la mayoría de filas, re-inferir una vez
+    if cached and ok.sum() * 2 < expected:
+        forget_layout(source)
+        return parse_frame(sdf, juego_name, row_parser, source=source, since=since)
+
+    out: List[Union[dict, None]] = [None] * n
+    good = np.flatnonzero(ok)
+    fechas_l = fechas_s.to_numpy()[good].tolist()
+    nums_l = ints[good, :6].astype(np.int64).tolist()
+    comp_l = _nullable_ints(ints[good, 6])
+    reint_l = _nullable_ints(ints[good, 7])
+    for i, f, nums, c, r in zip(good.tolist(), fechas_l, nums_l, comp_l, reint_l):
+        out[i] = {
+            "juego": juego_name,
+            "fecha": f,
+            "numeros": nums,
+            "complementario": c,
+            "reintegro": r,
+        }
+    bad = np.flatnonzero(~ok)
+    if len(bad):
+        for i, parsed in zip(bad, _fallback(sdf, bad, juego_name, row_parser, keep_none=True)):
+            out[i] = parsed
+    return [r for r in out if r]
+
+
+def _nullable_ints(arr: np.ndarray) -> List[Union[int, None]]:
+    vals = np.nan_to_num(arr, nan=0).astype(np.int64).tolist()
+    return [None if m else v for v, m in zip(vals, np.isnan(arr).tolist())]
+
+
+def _fallback(sdf: pd.DataFrame, idx, juego_name: str,
+              row_parser: Callable[[List[str], str], Union[dict, None]],
+              keep_none: bool = False) -> List[Union[dict, None]]:
+    rows = sdf.to_numpy()
+    res = []
+    for i in idx:
+        parsed = row_parser(list(rows[i]), juego_name)
+        if parsed or keep_none:
+            res.append(parsed)
+    return res
@@ -2,6 +2,12 @@ import os
 import numpy as np
 import pandas as pd
 
+try:
+    from src import draws, repository
+except Exception:
+    import draws
+    import repository
+
 BASE = os.path.join(os.path.dirname(__file__), '..')
 def _processed_csv_for(prefix: str | None = None) -> str:
     """
@@ -20,25 +26,38 @@ def load_processed_df():
     return df  """""
 
 
+def _frame_from_batch(batch) -> pd.DataFrame:
+    """DataFrame como el del CSV (n1..n6 int, float con NaN si faltan; fecha datetime64)."""
+    def _ints(a):
+        v = np.asarray(a, dtype=np.int64)
+        return np.where(v < 0, np.nan, v) if (v < 0).any() else v
+
+    fecha = np.asarray(batch.fecha).astype("datetime64[D]")
+    fecha[np.asarray(batch.fecha) == draws.NO_FECHA] = np.datetime64("NaT")
+    data = {"juego": batch.juego, "fecha": fecha.astype("datetime64[ns]")}
+    for i in range(6):
+        data[f"n{i + 1}"] = _ints(batch.numeros[:, i])
+    data["complementario"] = _ints(batch.complementario)
+    data["reintegro"] = _ints(batch.reintegro)
+    if batch.fuente is not None:
+        data["fuente"] = batch.fuente
+    return pd.DataFrame(data)
+
+
 def load_processed_df(prefix: str | None = None) -> pd.DataFrame:
     """
-    Carga el CSV procesado correspondiente al 'prefix' (o a la var de entorno JUEGO si no se pasa).
+    Carga los sorteos del 'prefix' (o de la var de entorno JUEGO si no se pasa).
     Devuelve DataFrame con columna 'fecha' parseada y ordenado ascendantemente por fecha.
+    Se leen del repositorio de sorteos (src/repository.py), por defecto el backend 'file':
+    el snapshot binario del ETL ({prefix}_processed.npz, memory-map, sin parsear texto ni
+    fechas) si está al día con el CSV procesado, y si no el CSV (dejando escrito el snapshot).
+    Con DRAW_BACKEND=mongo|memory se leen de ahí.
     """
-    path = _processed_csv_for(prefix)
-    if not os.path.exists(path):
-        # mensaje útil para debugging
-        files = []
-        proc_dir = os.path.join(BASE, "data", "processed")
-        if os.path.isdir(proc_dir):
-            files = os.listdir(proc_dir)
-        raise FileNotFoundError(
-            f"No se encontró el CSV procesado en '{path}'. "
-            f"Archivos disponibles en data/processed: {files}"
-        )
-
-    df = pd.read_csv(path, parse_dates=["fecha"], dayfirst=True)
-    df = df.sort_values("fecha").reset_index(drop=True)
+    p = prefix or os.environ.get("JUEGO") or "primitiva"
+    batch = repository.get_repository(default="file").read(p)
+    df = _frame_from_batch(batch)
+    if not df["fecha"].is_monotonic_increasing:
+        df = df.sort_values("fecha", kind="stable").reset_index(drop=True)
     return df
 
 #------------ funciones auxiliares para features.py y train_sklearn.py